@@ -1,23 +1,396 @@
-from typing import Dict, Any, Iterator, Optional
-from collections import abc
-from types import FunctionType
+from typing import Dict, Any, Callable, Collection, FrozenSet, Iterator, List, Mapping, NamedTuple, Optional, Tuple, Union
+from collections import OrderedDict, abc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import CodeType, FrameType, FunctionType, MappingProxyType, TracebackType
+import bisect
+import dis
 import inspect
+import threading
+import weakref
+
+
+# This is used to cache the variable names of each code object, so they are worked out once per function instead of once per frame.
+_code_vars: "weakref.WeakKeyDictionary[CodeType, Tuple[FrozenSet[str], FrozenSet[str]]]" = weakref.WeakKeyDictionary()
+
+
+def code_vars(code: CodeType) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """This is used to get the variable names of a function that matter to its dynamic scope.
+
+    Args:
+        code (CodeType): The code object of the function.
+
+    Returns:
+        Tuple[FrozenSet[str], FrozenSet[str]]: The free variables (defined in a parent scope), and the local variables that are unbound in a frame until they are assigned.
+    """
+    try:
+        return _code_vars[code]
+    except KeyError:
+        free_vars = frozenset(code.co_freevars)
+        local_vars = frozenset(code.co_varnames + code.co_cellvars) - free_vars
+        _code_vars[code] = (free_vars, local_vars)
+        return free_vars, local_vars
+
+
+def _parameters(code: CodeType) -> Tuple[str, ...]:
+    """This is used to get the parameter names of a function, which are bound as soon as it is called.
+
+    Args:
+        code (CodeType): The code object of the function.
+
+    Returns:
+        Tuple[str, ...]: The names of the parameters, including *args and **kwargs.
+    """
+    count = code.co_argcount + code.co_kwonlyargcount
+    count += bool(code.co_flags & inspect.CO_VARARGS) + bool(code.co_flags & inspect.CO_VARKEYWORDS)
+    return code.co_varnames[:count]
+
+
+# These are the instructions that never go on to the next one.
+_NO_FALLTHROUGH = frozenset({
+    "RETURN_VALUE", "RETURN_CONST", "RAISE_VARARGS", "RERAISE",
+    "JUMP_FORWARD", "JUMP_BACKWARD", "JUMP_BACKWARD_NO_INTERRUPT", "JUMP_ABSOLUTE", "JUMP", "JUMP_NO_INTERRUPT",
+})
+# These are the instructions that bind and unbind locals and cell variables.
+_STORES = frozenset({"STORE_FAST", "STORE_DEREF", "STORE_FAST_STORE_FAST"})
+_DELETES = frozenset({"DELETE_FAST", "DELETE_DEREF", "LOAD_FAST_AND_CLEAR"})
+_JUMPS = frozenset(dis.hasjrel + dis.hasjabs)
+
+# This is used to cache the result of _binding_states for each code object.
+_code_states: "weakref.WeakKeyDictionary[CodeType, Optional[Tuple[List[int], List[Tuple[FrozenSet[str], FrozenSet[str]]]]]]" = weakref.WeakKeyDictionary()
+
+
+def _binding_states(code: CodeType) -> Optional[Tuple[List[int], List[Tuple[FrozenSet[str], FrozenSet[str]]]]]:
+    """This is used to work out, from the bytecode of a function, which of its late locals (see ResolutionPlan) may be bound and which must be bound when each instruction starts. It is worked out once per function.
+
+    Args:
+        code (CodeType): The code object of the function.
+
+    Returns:
+        Optional[Tuple[List[int], List[Tuple[FrozenSet[str], FrozenSet[str]]]]]: The offsets of the instructions, in order, and the names that may and must be bound at each of them (both empty for an instruction that is never reached), or None if the bytecode cannot be analysed.
+    """
+    try:
+        return _code_states[code]
+    except KeyError:
+        pass
+    late_vars = code_vars(code)[1].difference(_parameters(code))
+    bytecode = dis.Bytecode(code)
+    # Without an exception table (before Python 3.11), the handlers cannot be found.
+    entries = getattr(bytecode, "exception_entries", None)
+    states: Optional[Tuple[List[int], List[Tuple[FrozenSet[str], FrozenSet[str]]]]] = None
+    if entries is not None:
+        instructions = list(bytecode)
+        offsets = [instruction.offset for instruction in instructions]
+        index = {offset: position for position, offset in enumerate(offsets)}
+        handlers: Dict[int, List[int]] = {}
+        for entry in entries:
+            for position in range(bisect.bisect_left(offsets, entry.start), bisect.bisect_left(offsets, entry.end)):
+                handlers.setdefault(position, []).append(index[entry.target])
+        # Each instruction gets the names that may be bound (on some path to it) and must be bound (on every path).
+        reached: Dict[int, Tuple[FrozenSet[str], FrozenSet[str]]] = {0: (frozenset(), frozenset())}
+        work = [0]
+        while work:
+            position = work.pop()
+            instruction = instructions[position]
+            may, must = reached[position]
+            names = instruction.argval if isinstance(instruction.argval, tuple) else (instruction.argval,)
+            if instruction.opname in _STORES:
+                stored = late_vars.intersection(names)
+                after = (may | stored, must | stored)
+            elif instruction.opname in _DELETES:
+                after = (may.difference(names), must.difference(names))
+            else:
+                after = (may, must)
+            successors = []
+            if instruction.opname not in _NO_FALLTHROUGH and position + 1 < len(instructions):
+                successors.append((position + 1, after))
+            if instruction.opcode in _JUMPS:
+                successors.append((index[instruction.argval], after))
+            # An exception can be raised before or after the instruction has its effect.
+            for handler in handlers.get(position, ()):
+                successors.append((handler, (may | after[0], must & after[1])))
+            for successor, (successor_may, successor_must) in successors:
+                previous = reached.get(successor)
+                state = (
+                    (successor_may, successor_must) if previous is None
+                    else (previous[0] | successor_may, previous[1] & successor_must)
+                )
+                if state != previous:
+                    reached[successor] = state
+                    work.append(successor)
+        empty = (frozenset(), frozenset())
+        states = (offsets, [reached.get(position, empty) for position in range(len(offsets))])
+    _code_states[code] = states
+    return states
+
+
+class ResolutionPlan(object):
+    """This class is used to remember where the names of a call path can be bound. A call path is the sequence of code objects of the frames on the stack, innermost first, and the frames of a call path always declare the same names.
+
+    The late locals of a function are its declared locals that are not parameters, the only ones it can leave unbound when it calls out. When the plan knows where each frame of the call path was (its instruction offsets), it tells from the bytecode which late locals are bound there, so a lazy scope only has to read the frames where that depends on the path the function took.
+
+    Args:
+        codes (Tuple[CodeType, ...]): The code objects of the call path.
+        offsets (Optional[Tuple[int, ...]]): The offset (f_lasti) each frame of the call path was at.
+    """
+
+    def __init__(self, codes: Tuple[CodeType, ...], offsets: Optional[Tuple[int, ...]] = None):
+        self.codes = codes
+        # These are the depths of module and class bodies, whose locals are a plain dictionary that can hold any name.
+        self.dynamic_depths = frozenset(
+            depth for depth, code in enumerate(codes) if not code.co_flags & inspect.CO_OPTIMIZED
+        )
+        # For each depth, these are the late locals that cannot be bound yet, and the ones that have to be read from the frame to tell.
+        unbound_vars = []
+        checked_vars = []
+        for depth, code in enumerate(codes):
+            late_vars = frozenset() if depth in self.dynamic_depths else code_vars(code)[1].difference(_parameters(code))
+            states = _binding_states(code) if late_vars and offsets is not None else None
+            if states is None:
+                unbound_vars.append(frozenset())
+                checked_vars.append(late_vars)
+                continue
+            # The frame is in the middle of the instruction that starts at or before its offset.
+            instruction_offsets, instruction_states = states
+            may, must = instruction_states[bisect.bisect_right(instruction_offsets, offsets[depth]) - 1]
+            unbound_vars.append(late_vars - may)
+            checked_vars.append((late_vars & may) - must)
+        self.unbound_vars: Tuple[FrozenSet[str], ...] = tuple(unbound_vars)
+        self.checked_vars: Tuple[FrozenSet[str], ...] = tuple(checked_vars)
+        # These are the only frames a lazy scope reads when it is made.
+        self.checked_depths: Tuple[int, ...] = tuple(depth for depth, names in enumerate(checked_vars) if names)
+        # This is used to cache the candidates of each name that was looked up on this call path.
+        self.candidates_by_name: Dict[str, Tuple[Tuple[int, bool], ...]] = {}
+
+    def bindings(self, frames: List[FrameType]) -> Dict[int, FrozenSet[str]]:
+        """This is used to record what a lazy scope cannot tell from the plan: whether the late locals whose binding depends on the path a function took are bound right now. Only the frames at checked_depths are read.
+
+        Args:
+            frames (List[FrameType]): The frames of the call path, innermost first.
+
+        Returns:
+            Dict[int, FrozenSet[str]]: The checked late locals that are not bound yet, by depth.
+        """
+        return {depth: self.checked_vars[depth].difference(frames[depth].f_locals) for depth in self.checked_depths}
+
+    def candidates(self, key: str) -> Tuple[Tuple[int, bool], ...]:
+        """This is used to get the frames that can bind a name, innermost first.
+
+        Args:
+            key (str): The name to look up.
+
+        Returns:
+            Tuple[Tuple[int, bool], ...]: The depth of each of those frames, and whether the frame leaves the name unbound when its locals do not have it.
+        """
+        try:
+            return self.candidates_by_name[key]
+        except KeyError:
+            candidates = []
+            for depth, code in enumerate(self.codes):
+                free_vars, declared_vars = code_vars(code)
+                # A free variable is defined in the parent scope, so this frame does not count.
+                if key in free_vars:
+                    continue
+                if key in declared_vars:
+                    candidates.append((depth, True))
+                elif depth in self.dynamic_depths:
+                    candidates.append((depth, False))
+            self.candidates_by_name[key] = tuple(candidates)
+            return self.candidates_by_name[key]
+
+
+class PlanCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class PlanCache(object):
+    """This class is used to keep the resolution plans of the most recently used call paths.
+
+    Args:
+        maxsize (int): The number of call paths to keep; the least recently used one is dropped to make room.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        # Plans are keyed by the ids of their code objects, which the plans keep alive so the ids cannot be reused, and the offsets of the frames.
+        self.plans: "OrderedDict[Tuple[Tuple[int, ...], Tuple[int, ...]], ResolutionPlan]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, codes: Tuple[CodeType, ...], offsets: Optional[Tuple[int, ...]] = None) -> ResolutionPlan:
+        """This is used to get the plan of a call path, making it if the call path is not cached.
+
+        Args:
+            codes (Tuple[CodeType, ...]): The code objects of the call path.
+            offsets (Optional[Tuple[int, ...]]): The offset (f_lasti) each frame of the call path is at.
+
+        Returns:
+            ResolutionPlan: The plan of the call path.
+        """
+        key = (tuple(map(id, codes)), offsets)
+        with self.lock:
+            plan = self.plans.get(key)
+            if plan is not None:
+                self.hits += 1
+                self.plans.move_to_end(key)
+                return plan
+            self.misses += 1
+        plan = ResolutionPlan(codes, offsets)
+        with self.lock:
+            self.plans[key] = plan
+            while len(self.plans) > self.maxsize:
+                self.plans.popitem(last=False)
+        return plan
+
+    def info(self) -> PlanCacheInfo:
+        """This is used to get the hit and miss statistics of the cache, like functools.lru_cache does."""
+        with self.lock:
+            return PlanCacheInfo(self.hits, self.misses, self.maxsize, len(self.plans))
+
+    def clear(self) -> None:
+        with self.lock:
+            self.plans.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# This is the cache used by lazy scopes.
+plan_cache = PlanCache()
+
+
+# This is the table of the dynamic variables that are bound explicitly with bind(). Every thread and every asyncio task sees its own value of the context variable, and the table itself is never changed, only replaced, so a scope can keep the table it was made with.
+_dynamic_vars: ContextVar[Mapping[str, Any]] = ContextVar("dynamic_vars", default=MappingProxyType({}))
+
+
+@contextmanager
+def bind(**bindings: Any) -> Iterator[None]:
+    """This is used to bind dynamic variables explicitly (shallow binding). The new values replace the previous ones in a central table on entry, and the previous values are put back on exit, so looking a variable up never walks the stack. It can be used as a context manager or as a decorator.
+
+    Args:
+        **bindings (Any): The names and values of the variables to bind.
+    """
+    # The token remembers the previous table, which is put back even if the block raises.
+    token = _dynamic_vars.set(MappingProxyType({**_dynamic_vars.get(), **bindings}))
+    try:
+        yield
+    finally:
+        _dynamic_vars.reset(token)
+
+
+def lookup(key: str) -> Any:
+    """This is used to get the value of a dynamic variable that was bound with bind(). It costs one dictionary read, whatever the depth of the stack.
+
+    Args:
+        key (str): The name of the variable.
+
+    Returns:
+        Any: The value of the innermost binding of the variable.
+    """
+    try:
+        return _dynamic_vars.get()[key]
+    except KeyError:
+        raise NameError(f"Name '{key}' is not defined.") from None
+
+
+def dynamic_vars() -> Mapping[str, Any]:
+    """This is used to get the read-only table of every dynamic variable that is bound with bind() right now. Hot loops can keep the table and read it directly, as it does not change while the bindings are in place.
+
+    Returns:
+        Mapping[str, Any]: The names and values of the bound variables.
+    """
+    return _dynamic_vars.get()
+
+
+class _WeakValue(weakref.ref):
+    """This class is used to tell the weak references a scope made to its values apart from weak references that are values themselves."""
+
+
+# This is kept by a memory-safe scope in place of a value it must not keep, so the name still hides the bindings of outer frames.
+_DROPPED = object()
+
+
+def _snapshot_value(value: Any, weak: bool) -> Any:
+    """This is used to decide how a memory-safe scope keeps a value.
+
+    Args:
+        value (Any): The value of a variable.
+        weak (bool): Whether to keep a weak reference to the value when the value supports it.
+
+    Returns:
+        Any: What to keep: the value, a weak reference to it, or _DROPPED when the value is not kept at all.
+    """
+    # Frames, and tracebacks and exceptions (which reference the frames they went through), would keep the stack alive.
+    if isinstance(value, (FrameType, TracebackType)) or (
+        isinstance(value, BaseException) and value.__traceback__ is not None
+    ):
+        return _DROPPED
+    if weak:
+        try:
+            return _WeakValue(value)
+        except TypeError:
+            # Values like numbers, strings, lists and dictionaries cannot be weakly referenced, so they are kept as they are.
+            pass
+    return value
 
 
 class DynamicScope(abc.Mapping):
     """This class is used to create a dynamic scope for a function. It is used to get the local variables of the function and the variables that are defined in the parent scope. It is also used to check if a variable is defined in the local scope or not.
 
+    The variables bound with bind() when the scope is made are found as well, unless a frame binds the same name.
+
+    A memory-safe scope (see get_dynamic_re) only keeps the names that `keep` accepts, and may keep weak references to the values, so it does not keep large objects of unrelated frames alive. It never keeps frames, tracebacks or exceptions with a traceback; their names still hide the bindings of outer frames, and looking them up raises ReferenceError, as does looking up a value that was garbage collected.
+
+    A lazy scope holds the frames instead of a copy of their locals. It only records which locals of the functions are bound when it is made, reading just the frames where the bytecode cannot tell (see ResolutionPlan.bindings), so it raises NameError and UnboundLocalError exactly where an eager scope would, even after the functions bound more names. Module and class bodies are not read up front, so the names they bind after the scope was made are seen. Each name is resolved when it is first looked up, by reading only the frames that can bind it (see ResolutionPlan), and the result is cached, so the scope sees the values the frames hold when a name is first looked up. Iterating over a lazy scope or taking its length copies every frame, like an eager scope does up front.
+
     Args:
         abc (Mapping): This was the predefined class that was mentioned in the assignment.
     """
 
-    def __init__(self, local_vars: Dict[str, Optional[Any]]):
+    def __init__(
+        self,
+        local_vars: Dict[str, Optional[Any]],
+        frames: Optional[List[FrameType]] = None,
+        plan: Optional[ResolutionPlan] = None,
+        bound_vars: Optional[Mapping[str, Any]] = None,
+        keep: Optional[Callable[[str], bool]] = None,
+        weak: bool = False,
+        bindings: Optional[Dict[int, FrozenSet[str]]] = None,
+    ):
         # This is the dictionary that will be used to store the local variables of the function.
         self.env_vars: Dict[str, Optional[Any]] = local_vars
-        # This is the list that will be used to store the variables that are not defined (unbound) in the local scope.
-        self.unbound_vars: list[str] = []
+        # This is the set that will be used to store the variables that are not defined (unbound) in the local scope.
+        self.unbound_vars: set[str] = set()
+        # These are the frames that were not copied yet (innermost first), for a lazy scope.
+        self.frames: Optional[List[FrameType]] = frames
+        # This is the plan that tells a lazy scope which of its frames can bind each name.
+        self.plan: Optional[ResolutionPlan] = plan
+        # These are the locals the frames of a lazy scope had not bound yet when it was made, as returned by ResolutionPlan.bindings.
+        self.bindings: Optional[Dict[int, FrozenSet[str]]] = bindings
+        # This is used to remember the names a lazy scope did not find in any frame.
+        self.undefined_vars: set[str] = set()
+        # These are the variables that were bound with bind(), used when no frame binds a name.
+        self.bound_vars: Mapping[str, Any] = bound_vars if bound_vars is not None else MappingProxyType({})
+        # This is used to choose the names a memory-safe scope keeps, all of them when None.
+        self.keep: Optional[Callable[[str], bool]] = keep
+        # This is used to tell if a memory-safe scope keeps weak references to the values.
+        self.weak: bool = weak
+        # A memory-safe scope only keeps what it is allowed to from the variables bound with bind().
+        if keep is not None or weak:
+            self.bound_vars = self.snapshot(self.bound_vars)
 
     def __getitem__(self, key):
+        # A lazy scope looks for the name in its frames the first time it is asked for.
+        if (
+            self.frames is not None
+            and key not in self.env_vars
+            and key not in self.unbound_vars
+            and key not in self.undefined_vars
+        ):
+            self.resolve(key)
         # This is used to check if the variable was unbound at any point in time when building the scope list.
         if key in self.unbound_vars:
             raise UnboundLocalError(
@@ -25,10 +398,25 @@ class DynamicScope(abc.Mapping):
             )
         # This is used to check if the variable is defined in the parent scope or not.
         try:
-            return self.env_vars[key]
-        # This is used to raise an error if the variable is not defined in the local scope or the parent scope.
+            value = self.env_vars[key]
         except KeyError:
-            raise NameError(f"Name '{key}' is not defined.")
+            # If no frame binds the name, then it may be a variable that was bound with bind().
+            try:
+                value = self.bound_vars[key]
+            # This is used to raise an error if the variable is not defined in the local scope or the parent scope.
+            except KeyError:
+                raise NameError(f"Name '{key}' is not defined.")
+        # A memory-safe scope may only hold a weak reference to the value.
+        if type(value) is _WeakValue:
+            value = value()
+            if value is None:
+                raise ReferenceError(f"The value of '{key}' was garbage collected.")
+        # The name is bound, but to a value the scope did not keep.
+        elif value is _DROPPED:
+            raise ReferenceError(
+                f"The value of '{key}' was not kept, since it is a frame, a traceback or an exception with a traceback."
+            )
+        return value
 
     def __setitem__(self, key, value):
         # Per the assignment, if the variable is already defined in the local scope, then it should not be updated.
@@ -37,47 +425,168 @@ class DynamicScope(abc.Mapping):
 
     def __iter__(self):
         # This is used to iterate over the local variables of the function.
-        return iter(self.env_vars)
+        self.materialize()
+        # The variables bound with bind() come after the ones of the frames, unless a frame binds the same name.
+        yield from self.env_vars
+        yield from (key for key in self.bound_vars if key not in self.env_vars)
 
     def __len__(self):
         # This is used to get the length of the local variables of the function.
-        return len(self.env_vars)
+        self.materialize()
+        return len(self.env_vars) + sum(key not in self.env_vars for key in self.bound_vars)
+
+    def add_frame(self, frame: FrameType, depth: Optional[int] = None) -> None:
+        """This is used to add the variables of a frame to the scope. Frames must be added innermost first.
+
+        Args:
+            frame (FrameType): The frame of one of the functions on the stack.
+            depth (Optional[int]): The position of the frame in a lazy scope, whose frames may have bound names since the scope was made.
+        """
+        # Get the local variables, free variables, and unbound variables of the function that is calling this function.
+        local_vars = frame.f_locals
+        # The names bound after a lazy scope was made are left out, as an eager scope would not have seen them.
+        if depth is not None and self.bindings is not None:
+            local_vars = {var_name: value for var_name, value in local_vars.items() if self.was_bound(depth, var_name)}
+        free_vars, unbound_vars = code_vars(frame.f_code)
+        # A memory-safe scope only copies what it is allowed to keep.
+        if self.keep is not None or self.weak:
+            if self.keep is not None:
+                unbound_vars = frozenset(filter(self.keep, unbound_vars))
+            # A local that is bound but not kept must not be reported as unbound.
+            declared_vars = unbound_vars.intersection(local_vars)
+            local_vars = self.snapshot(local_vars)
+            unbound_vars = unbound_vars - declared_vars
+
+        # If a local variable is not defined yet (it is assigned after the call was made), then it is unbound.
+        self.unbound_vars.update(unbound_vars.difference(local_vars))
+
+        env_vars = self.env_vars
+        for var_name, value in local_vars.items():
+            # If the variable is not defined in the parent scope, and it is defined in the local scope.
+            if var_name not in free_vars:
+                # Add the variable to the local variables of the function, unless an inner frame already defined it.
+                env_vars.setdefault(var_name, value)
+
+    def snapshot(self, variables: Mapping[str, Any]) -> Dict[str, Any]:
+        """This is used to copy the variables a memory-safe scope is allowed to keep, the way it keeps them.
+
+        Args:
+            variables (Mapping[str, Any]): The names and values of the variables.
+
+        Returns:
+            Dict[str, Any]: The names and values (or weak references to the values) to keep.
+        """
+        kept = {}
+        for var_name, value in variables.items():
+            if self.keep is not None and not self.keep(var_name):
+                continue
+            kept[var_name] = _snapshot_value(value, self.weak)
+        return kept
 
+    def materialize(self) -> None:
+        """This is used to turn a lazy scope into an eager one by copying the variables of every frame it holds."""
+        if self.frames is None:
+            return
+        frames, self.frames = self.frames, None
+        for depth, frame in enumerate(frames):
+            self.add_frame(frame, depth)
 
-def get_dynamic_re() -> DynamicScope:
+    def was_bound(self, depth: int, key: str) -> bool:
+        """This is used to tell if a frame of a lazy scope had a name bound when the scope was made.
+
+        Args:
+            depth (int): The position of the frame, innermost first.
+            key (str): The name to check.
+
+        Returns:
+            bool: False if the frame bound the name only after the scope was made, True otherwise.
+        """
+        if self.bindings is None or self.plan is None:
+            return True
+        if key in self.plan.unbound_vars[depth]:
+            return False
+        if key in self.plan.checked_vars[depth]:
+            return key not in self.bindings[depth]
+        return True
+
+    def resolve(self, key: str) -> None:
+        """This is used to look up a name in the frames of a lazy scope, with the same result as an eager scope. The result is cached in env_vars or unbound_vars, or in undefined_vars when no frame has the name.
+
+        Args:
+            key (str): The name to look up.
+        """
+        if self.plan is None:
+            self.plan = ResolutionPlan(tuple(frame.f_code for frame in self.frames))
+        found = False
+        value = None
+        # Only the frames that can bind the name are read.
+        for depth, declared in self.plan.candidates(key):
+            # Once the name is found, the outer frames only matter if they leave a local of that name unbound.
+            if found and not declared:
+                continue
+            frame = self.frames[depth]
+            local_vars = frame.f_locals
+            if key in local_vars and self.was_bound(depth, key):
+                if not found:
+                    found, value = True, local_vars[key]
+            elif declared:
+                # An eager scope reports a name that is unbound in any frame as unbound, even if another frame binds it.
+                self.unbound_vars.add(key)
+                return
+        if found:
+            self.env_vars[key] = value
+        else:
+            self.undefined_vars.add(key)
+
+
+def get_dynamic_re(
+    max_depth: Optional[int] = None,
+    stop_frame: Optional[FrameType] = None,
+    lazy: bool = False,
+    keep: Optional[Union[Collection[str], Callable[[str], bool]]] = None,
+    weak: bool = False,
+) -> DynamicScope:
     """This is the required function that will be used to get the dynamic scope of the function that is calling this function.
 
+    Args:
+        max_depth (Optional[int]): The number of frames to look at, starting with the caller. All of them when None.
+        stop_frame (Optional[FrameType]): The last frame to look at; the frames that called it are left out.
+        lazy (bool): Whether to return a lazy scope, which reads the frames when names are looked up instead of copying them now.
+        keep (Optional[Union[Collection[str], Callable[[str], bool]]]): The names to keep, or a function that tells if a name should be kept. A scope with `keep` or `weak` is memory-safe: it keeps no frames and nothing it was not asked for, so it cannot be lazy.
+        weak (bool): Whether to keep weak references to the values that support them instead of the values.
+
     Returns:
         DynamicScope: The class that was defined above. It is used to get the local variables of the function and the variables that are defined in the parent scope. It is also used to check if a variable is defined in the local scope or not.
     """
-    ds = DynamicScope({})
+    if keep is not None and not callable(keep):
+        keep = frozenset(keep).__contains__
+    if lazy and (keep is not None or weak):
+        raise ValueError("A lazy scope holds its frames, so it cannot be memory-safe.")
 
-    # Get the stack information of the function that is calling this function.
-    stack_info = inspect.stack()
-    # Remove the first element of the stack information because it is the function that is calling this function.
-    stack_info.pop(0)
+    # Walk the frames of the callers through f_back, starting with the function that is calling this function.
+    # Unlike inspect.stack(), this never reads the source lines of the frames from disk.
+    frames = []
+    frame = inspect.currentframe().f_back
+    # A lazy scope also needs the instruction each frame is at, to tell which of its locals are bound.
+    offsets = []
+    try:
+        while frame is not None and (max_depth is None or len(frames) < max_depth):
+            frames.append(frame)
+            if lazy:
+                offsets.append(frame.f_lasti)
+            if frame is stop_frame:
+                break
+            frame = frame.f_back
+    finally:
+        # Frames reference their locals, so drop them as soon as possible to avoid reference cycles.
+        del frame
 
-    for frame_info in stack_info:
-        # Get the local variables, free variables, and unbound variables of the function that is calling this function.
-        local_vars = frame_info.frame.f_locals
-        free_vars = list(frame_info.frame.f_code.co_freevars)
-        unbound_vars = list(frame_info.frame.f_code.co_varnames) + list(
-            frame_info.frame.f_code.co_cellvars
-        )
-
-        for unbound_var in unbound_vars:
-            # If the variable is defined in the local scope (after a call is made to the variable), then it is unbound.
-            if (
-                unbound_var not in free_vars
-                and unbound_var not in local_vars
-                and unbound_var not in ds.unbound_vars
-            ):
-                # Add the unbound variable to the list of unbound variables.
-                ds.unbound_vars.append(unbound_var)
-
-        for var_name in local_vars:
-            # If the variable is not defined in the parent scope, and it is defined in the local scope.
-            if var_name not in free_vars:
-                # Add the variable to the local variables of the function.
-                ds[var_name] = local_vars[var_name]
-    return ds
+    # The variables bound with bind() are kept as they are now, like the values of the frames.
+    bound_vars = _dynamic_vars.get()
+    if not lazy:
+        ds = DynamicScope({}, frames, bound_vars=bound_vars, keep=keep, weak=weak)
+        ds.materialize()
+        return ds
+    plan = plan_cache.get(tuple(frame.f_code for frame in frames), tuple(offsets))
+    # The values are read when the names are looked up, but which names are bound is recorded now.
+    return DynamicScope({}, frames, plan, bound_vars, bindings=plan.bindings(frames))
@@ -0,0 +1,208 @@
+import argparse
+import itertools
+import json
+import math
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from dynamic_scope import get_dynamic_re
+
+"""
+Benchmarks for get_dynamic_re and DynamicScope lookups.
+
+    python -m dynamic_scope.benchmark
+    python -m dynamic_scope.benchmark --depths 10 100 1000 5000 --widths 1 100 --save baseline.json
+    python -m dynamic_scope.benchmark --compare baseline.json
+
+Every case builds a stack of `depth` frames of one recursive function with
+`width` locals, a `cells` fraction of which are captured by a closure (and so
+are cell variables), then captures the dynamic scope at the bottom and looks
+up `lookups` names in it, alternating between a local of the bottom frame and
+a name only bound by the function that started the recursion. Each case is
+timed eagerly and lazily (get_dynamic_re(lazy=True)); the time is the best of
+`repeat` rounds per capture, and the allocations are the peak number of bytes
+allocated by one capture and its lookups, as seen by tracemalloc.
+
+--save writes the results to a JSON file and --compare reports every case
+that got slower than the saved baseline by more than --tolerance. For every
+width, cell fraction, lookup count and mode, the time is also fitted to
+depth^k: k stays close to 1 when the frame walk scales linearly, and a k
+above 1.5 is reported as quadratic behaviour.
+"""
+
+DEFAULT_DEPTHS = (10, 100, 1000, 5000)
+DEFAULT_WIDTHS = (1, 10, 100)
+DEFAULT_CELLS = (0.0, 0.5)
+DEFAULT_LOOKUPS = (1, 10)
+MODES = ("eager", "lazy")
+# Time exponents above this are reported as quadratic.
+QUADRATIC_EXPONENT = 1.5
+
+
+class Case(NamedTuple):
+    depth: int
+    width: int
+    cells: float
+    lookups: int
+    mode: str
+
+    @property
+    def name(self) -> str:
+        return f"depth={self.depth} width={self.width} cells={self.cells:g} lookups={self.lookups} {self.mode}"
+
+
+class Result(NamedTuple):
+    case: Case
+    # Best time of one capture and its lookups, in seconds.
+    seconds: float
+    # Peak bytes allocated by one capture and its lookups.
+    peak_bytes: int
+
+
+def make_frame_function(width: int, cells: float) -> Callable:
+    """This is used to make a recursive function with `width` locals, `cells` of them (as a fraction) captured by a closure."""
+    names = [f"local_{index}" for index in range(width)]
+    captured = names[: round(width * cells)]
+    lines = ["def frame(depth, bottom):"]
+    lines += [f"    {name} = depth" for name in names]
+    if captured:
+        lines += ["    def closure():", f"        return ({', '.join(captured)},)"]
+    lines += ["    if depth == 0:", "        return bottom()", "    return frame(depth - 1, bottom)"]
+    namespace: Dict[str, Callable] = {}
+    exec("\n".join(lines), namespace)
+    return namespace["frame"]
+
+
+def run_case(case: Case, iterations: int, repeat: int) -> Result:
+    frame = make_frame_function(case.width, case.cells)
+    lazy = case.mode == "lazy"
+    names = ["local_0", "anchor"] if case.width else ["anchor"]
+
+    def capture() -> None:
+        scope = get_dynamic_re(lazy=lazy)
+        for index in range(case.lookups):
+            scope[names[index % len(names)]]
+
+    def bottom() -> Tuple[float, int]:
+        best = math.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                capture()
+            best = min(best, (time.perf_counter() - start) / iterations)
+        tracemalloc.start()
+        try:
+            capture()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return best, peak
+
+    def start() -> Tuple[float, int]:
+        # The name looked up far away: only this frame binds it.
+        anchor = case.depth
+        return frame(case.depth - 1, bottom)
+
+    recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(recursion_limit, case.depth + 1000))
+    try:
+        seconds, peak_bytes = start()
+    finally:
+        sys.setrecursionlimit(recursion_limit)
+    return Result(case, seconds, peak_bytes)
+
+
+def cases(
+    depths=DEFAULT_DEPTHS, widths=DEFAULT_WIDTHS, cells=DEFAULT_CELLS, lookups=DEFAULT_LOOKUPS, modes=MODES
+) -> List[Case]:
+    return [Case(*values) for values in itertools.product(depths, widths, cells, lookups, modes)]
+
+
+def fit_exponent(sizes: List[int], values: List[float]) -> float:
+    """Fits values ~ c * size^k by least squares on a log-log scale and returns k."""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(value) for value in values]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread
+
+
+def depth_exponents(results: List[Result]) -> Dict[Tuple, float]:
+    """Returns the time exponent over depth of every (width, cells, lookups, mode) measured at two depths or more."""
+    series: Dict[Tuple, List[Result]] = {}
+    for result in results:
+        case = result.case
+        series.setdefault((case.width, case.cells, case.lookups, case.mode), []).append(result)
+    return {
+        key: fit_exponent([result.case.depth for result in group], [result.seconds for result in group])
+        for key, group in series.items()
+        if len({result.case.depth for result in group}) > 1
+    }
+
+
+def save_results(results: List[Result], path: str) -> None:
+    with open(path, "w") as f:
+        json.dump([{**result.case._asdict(), "seconds": result.seconds, "peak_bytes": result.peak_bytes} for result in results], f, indent=1)
+
+
+def load_results(path: str) -> List[Result]:
+    with open(path) as f:
+        records = json.load(f)
+    return [
+        Result(Case(record["depth"], record["width"], record["cells"], record["lookups"], record["mode"]), record["seconds"], record["peak_bytes"])
+        for record in records
+    ]
+
+
+def regressions(results: List[Result], baseline: List[Result], tolerance: float) -> List[Tuple[Result, Result]]:
+    """Returns (result, baseline result) for every case that got slower than `tolerance` times its baseline."""
+    baseline_by_case = {result.case: result for result in baseline}
+    return [
+        (result, baseline_by_case[result.case])
+        for result in results
+        if result.case in baseline_by_case and result.seconds > baseline_by_case[result.case].seconds * tolerance
+    ]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m dynamic_scope.benchmark", description="Time get_dynamic_re over a grid of stacks.")
+    parser.add_argument("--depths", type=int, nargs="+", default=DEFAULT_DEPTHS)
+    parser.add_argument("--widths", type=int, nargs="+", default=DEFAULT_WIDTHS, help="locals per frame")
+    parser.add_argument("--cells", type=float, nargs="+", default=DEFAULT_CELLS, help="fractions of the locals captured by a closure")
+    parser.add_argument("--lookups", type=int, nargs="+", default=DEFAULT_LOOKUPS, help="lookups per capture")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--iterations", type=int, default=10, help="captures per round")
+    parser.add_argument("--repeat", type=int, default=3, help="rounds per case; the best one counts")
+    parser.add_argument("--save", default=None, help="write the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="compare with the results saved in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="slowdown over the baseline reported as a regression")
+    args = parser.parse_args(argv)
+    if any(depth < 1 for depth in args.depths):
+        parser.error("depths must be at least 1")
+    if any(not 0 <= cells <= 1 for cells in args.cells):
+        parser.error("cell fractions must be between 0 and 1")
+
+    results = []
+    for case in cases(args.depths, args.widths, args.cells, args.lookups, args.modes):
+        result = run_case(case, args.iterations, args.repeat)
+        results.append(result)
+        print(f"{case.name:>52}: {result.seconds * 1e6:12.1f} us {result.peak_bytes / 1024:10.1f} KiB")
+
+    failed = False
+    for (width, cells, lookups, mode), exponent in sorted(depth_exponents(results).items()):
+        quadratic = exponent > QUADRATIC_EXPONENT
+        failed |= quadratic
+        print(f"width={width} cells={cells:g} lookups={lookups} {mode}: time ~ depth^{exponent:.2f}{'  QUADRATIC' if quadratic else ''}")
+    if args.compare:
+        for result, base in regressions(results, load_results(args.compare), args.tolerance):
+            failed = True
+            print(f"regression: {result.case.name}: {base.seconds * 1e6:.1f} us -> {result.seconds * 1e6:.1f} us")
+    if args.save:
+        save_results(results, args.save)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
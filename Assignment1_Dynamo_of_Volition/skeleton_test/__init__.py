@@ -1,5 +1,12 @@
-from dynamic_scope import get_dynamic_re
+from types import FrameType
+
+from dynamic_scope import PlanCache, _code_vars, bind, code_vars, dynamic_vars, get_dynamic_re, lookup, plan_cache
+from dynamic_scope.benchmark import Case, cases, depth_exponents, fit_exponent, regressions, run_case
 from typing import Any
+import gc
+import inspect
+import threading
+import time
 import unittest
 
 
@@ -68,3 +75,344 @@ class Test_get_dynamic_re(unittest.TestCase):
                           "Your reference environment had the incorrect value for a variable.")
         self.assertEquals(
             dre["e"], "inner3_e", "Your reference environment had the incorrect value for a variable.")
+
+
+class Test_get_dynamic_re_limits(unittest.TestCase):
+    def test_max_depth(self):
+        def outer():
+            a = "outer_a"
+            return inner()
+
+        def inner():
+            b = "inner_b"
+            return get_dynamic_re(max_depth=1)
+        dre = outer()
+        self.assertEqual(dre["b"], "inner_b")
+        with self.assertRaises(NameError):
+            dre["a"]
+
+    def test_stop_frame(self):
+        def outer():
+            a = "outer_a"
+            return inner(inspect.currentframe())
+
+        def inner(stop):
+            b = "inner_b"
+            return get_dynamic_re(stop_frame=stop)
+        test_local = "test_local"
+        dre = outer()
+        self.assertEqual((dre["a"], dre["b"]), ("outer_a", "inner_b"))
+        with self.assertRaises(NameError):
+            dre["test_local"]
+
+
+class Test_get_dynamic_re_lazy(unittest.TestCase):
+    def test_lazy_matches_eager(self):
+        def outer():
+            a = "outer_a"
+            b = "outer_b"
+            late = inner()
+            return late
+
+        def inner():
+            a = "inner_a"
+
+            def closure():
+                return a
+            return get_dynamic_re(), get_dynamic_re(lazy=True)
+
+        eager, lazy = outer()
+        self.assertEqual(lazy.env_vars, {})
+        # A lazy scope reads the frames when it is used, by which time outer has bound late, but it still reports late as unbound.
+        for name in ("a", "b", "closure", "late", "non_existent_variable"):
+            for scope in (eager, lazy):
+                try:
+                    result = (scope[name], None)
+                except (UnboundLocalError, NameError) as e:
+                    result = (None, type(e))
+                if scope is eager:
+                    expected = result
+            self.assertEqual(result, expected, name)
+        self.assertEqual(lazy.undefined_vars, {"non_existent_variable"})
+
+        # Iterating copies the frames, leaving out what they bound since the scope was made.
+        self.assertTrue({"a", "b", "closure"} <= set(lazy))
+        self.assertEqual(set(eager), set(lazy))
+        self.assertEqual(len(lazy), len(lazy.env_vars))
+        self.assertIsNone(lazy.frames)
+
+
+class Test_code_vars(unittest.TestCase):
+    def test_code_vars_cache(self):
+        def make():
+            captured = "captured"
+
+            def function(parameter):
+                print(captured)
+                late = parameter
+                return late
+            return function
+        function = make()
+        self.assertEqual(code_vars(function.__code__), (frozenset({"captured"}), frozenset({"parameter", "late"})))
+        self.assertIn(function.__code__, _code_vars)
+
+        # The cache does not keep code objects alive.
+        namespace = {}
+        exec(compile("def compiled(x):\n    y = x\n    return y\n", "<test>", "exec"), namespace)
+        self.assertEqual(code_vars(namespace["compiled"].__code__), (frozenset(), frozenset({"x", "y"})))
+        size = len(_code_vars)
+        del namespace
+        gc.collect()
+        self.assertEqual(len(_code_vars), size - 1)
+
+    def test_unbound_vars(self):
+        def outer(lazy):
+            dre = get_dynamic_re(lazy=lazy)
+            late = "late"
+            return dre
+        self.assertIn("late", outer(False).unbound_vars)
+        # A lazy scope reads the frame after late was bound, and still reports it as unbound.
+        for lazy in (False, True):
+            self.assertRaises(UnboundLocalError, lambda: outer(lazy)["late"])
+
+
+class Test_resolution_plans(unittest.TestCase):
+    def test_plan_cache_hits_on_the_same_call_path(self):
+        def outer():
+            a = "outer_a"
+            return [inner() for _ in range(3)]
+
+        def inner():
+            b = "inner_b"
+            return get_dynamic_re(lazy=True)
+
+        plan_cache.clear()
+        scopes = outer()
+        self.assertEqual((plan_cache.info().hits, plan_cache.info().misses), (2, 1))
+        self.assertIs(scopes[0].plan, scopes[2].plan)
+        for scope in scopes:
+            self.assertEqual((scope["a"], scope["b"]), ("outer_a", "inner_b"))
+            # Names of the module frames at the bottom of the stack are found as well.
+            self.assertEqual(scope["__name__"], get_dynamic_re()["__name__"])
+            self.assertRaises(NameError, lambda: scope["non_existent_variable"])
+        # Neither inner nor the list comprehension can bind a, so outer is the first candidate; module frames can bind any name.
+        depths = [depth for depth, _ in scopes[0].plan.candidates("a")]
+        self.assertEqual(depths[0], 2)
+        self.assertTrue(set(depths[1:]) <= scopes[0].plan.dynamic_depths)
+
+    def test_plan_cache_evicts_least_recently_used(self):
+        cache = PlanCache(maxsize=2)
+        codes = [compile(str(n), "<test>", "eval") for n in range(3)]
+        for code in (codes[0], codes[1], codes[0], codes[2], codes[1]):
+            cache.get((code,))
+        self.assertEqual(cache.info(), (1, 4, 2, 2))
+        self.assertEqual(list(cache.plans), [((id(codes[2]),), None), ((id(codes[1]),), None)])
+
+    def test_plan_reads_only_frames_the_bytecode_cannot_decide(self):
+        def branchy(flag):
+            if flag:
+                maybe = "bound"
+            late = get_dynamic_re(lazy=True)
+            after = "after"
+            return late
+
+        def straight():
+            early = "early"
+            scope = get_dynamic_re(lazy=True)
+            later = "later"
+            return scope
+
+        scope = straight()
+        # Which locals of straight are bound is clear from its bytecode, so no frame had to be read.
+        self.assertEqual((scope.plan.unbound_vars[0], scope.plan.checked_vars[0]), ({"scope", "later"}, frozenset()))
+        self.assertNotIn(0, scope.plan.checked_depths)
+        self.assertNotIn(0, scope.bindings)
+        self.assertEqual(scope["early"], "early")
+        self.assertRaises(UnboundLocalError, lambda: scope["later"])
+        for flag in (True, False):
+            scope = branchy(flag)
+            # Whether maybe is bound depends on the branch taken, so only that name is read from the frame.
+            self.assertEqual(scope.plan.checked_vars[0], {"maybe"})
+            self.assertIn(0, scope.plan.checked_depths)
+            if flag:
+                self.assertEqual(scope["maybe"], "bound")
+            else:
+                self.assertRaises(UnboundLocalError, lambda: scope["maybe"])
+            self.assertRaises(UnboundLocalError, lambda: scope["after"])
+
+    def test_plan_cache_hit_is_cheaper_than_miss(self):
+        def recurse(depth):
+            if depth:
+                local = depth
+                return recurse(depth - 1)
+            return timed()
+
+        def timed():
+            # The plan of a call path also depends on where its frames are, so every capture is made from the same place.
+            seconds = {True: float("inf"), False: float("inf")}
+            for _ in range(5):
+                for clear in (True, False):
+                    if clear:
+                        plan_cache.clear()
+                    start = time.perf_counter()
+                    get_dynamic_re(lazy=True)
+                    seconds[clear] = min(seconds[clear], time.perf_counter() - start)
+            return seconds[False], seconds[True]
+
+        hit, miss = recurse(200)
+        self.assertLess(hit, miss)
+
+
+class Test_benchmark(unittest.TestCase):
+    def test_benchmark_grid(self):
+        results = [run_case(case, iterations=1, repeat=1) for case in cases([10, 40], [3], [0.5], [2], ["lazy"])]
+        self.assertEqual([result.case for result in results], [Case(10, 3, 0.5, 2, "lazy"), Case(40, 3, 0.5, 2, "lazy")])
+        self.assertTrue(all(result.seconds > 0 and result.peak_bytes > 0 for result in results))
+        self.assertEqual(list(depth_exponents(results)), [(3, 0.5, 2, "lazy")])
+
+        self.assertAlmostEqual(fit_exponent([10, 100, 1000], [1, 100, 10000]), 2.0)
+        slower = [results[0]._replace(seconds=results[0].seconds * 2), results[1]]
+        self.assertEqual(regressions(slower, results, 1.5), [(slower[0], results[0])])
+
+
+class Test_bind(unittest.TestCase):
+    def test_bind_saves_and_restores(self):
+        @bind(level="decorated")
+        def decorated():
+            return lookup("level")
+
+        self.assertRaises(NameError, lambda: lookup("level"))
+        with bind(level="outer", color="red"):
+            with bind(level="inner"):
+                self.assertEqual((lookup("level"), lookup("color")), ("inner", "red"))
+                self.assertEqual(decorated(), "decorated")
+                self.assertEqual(lookup("level"), "inner")
+            self.assertEqual(dict(dynamic_vars()), {"level": "outer", "color": "red"})
+            try:
+                with bind(level="failed"):
+                    raise ValueError
+            except ValueError:
+                pass
+            self.assertEqual(lookup("level"), "outer")
+        self.assertEqual(dict(dynamic_vars()), {})
+
+    def test_bind_is_per_thread(self):
+        seen = []
+
+        def worker():
+            seen.append(dict(dynamic_vars()))
+            with bind(level="thread"):
+                seen.append(lookup("level"))
+
+        with bind(level="main"):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join()
+            self.assertEqual(lookup("level"), "main")
+        self.assertEqual(seen, [{}, "thread"])
+
+    def test_dynamic_scope_sees_bound_variables(self):
+        def outer():
+            shadowed = "frame"
+            return inner()
+
+        def inner():
+            return get_dynamic_re(), get_dynamic_re(lazy=True)
+
+        with bind(shadowed="bound", only_bound=1):
+            scopes = outer()
+        for scope in scopes:
+            # The frames take precedence, and the bindings are the ones in place when the scope was made.
+            self.assertEqual((scope["shadowed"], scope["only_bound"]), ("frame", 1))
+            self.assertEqual(list(scope).count("shadowed"), 1)
+            self.assertIn("only_bound", list(scope))
+            self.assertEqual(len(scope), len(list(scope)))
+            self.assertRaises(NameError, lambda: scope["non_existent_variable"])
+
+
+class Big(object):
+    """A stand-in for a large object, such as a request buffer, that can be weakly referenced."""
+
+
+class Test_get_dynamic_re_snapshots(unittest.TestCase):
+    def live_frames(self, *functions):
+        gc.collect()
+        codes = {function.__code__ for function in functions}
+        return [obj for obj in gc.get_objects() if isinstance(obj, FrameType) and obj.f_code in codes]
+
+    def test_keep_and_weak(self):
+        def outer(**options):
+            buffer = Big()
+            small = "small"
+            try:
+                raise ValueError
+            except ValueError as error:
+                failure = error
+            frame = inspect.currentframe()
+            return inner(options), buffer
+
+        def inner(options):
+            later = None
+            scope = get_dynamic_re(**options)
+            later = "assigned"
+            return scope
+
+        self.assertEqual(get_dynamic_re(keep=lambda name: name.startswith("__n"))["__name__"], get_dynamic_re()["__name__"])
+        # Reading the locals of a frame leaves a copy of them on the frame until they are read again, so the weak scope is made first.
+        with bind(setting=Big(), other=1):
+            weak = outer(weak=True)[0]
+            kept, big = outer(keep=["small", "buffer", "later", "setting"])
+        # The frame of outer and the exception it caught reference each other until the cycle is collected.
+        gc.collect()
+        # Only the allowed names are kept.
+        self.assertEqual(set(kept), {"small", "buffer", "later", "setting"})
+        self.assertIs(kept["buffer"], big)
+        self.assertRaises(NameError, lambda: kept["other"])
+        # Frames, tracebacks and exceptions with a traceback are never kept.
+        self.assertEqual((weak["small"], weak["later"]), ("small", None))
+        self.assertRaises(ReferenceError, lambda: weak["frame"])
+        self.assertRaises(ReferenceError, lambda: weak["failure"])
+        # Large objects of the stack are not kept alive by a weak scope.
+        self.assertRaises(ReferenceError, lambda: weak["buffer"])
+        self.assertIs(weak["setting"], kept["setting"])
+        del kept
+        self.assertRaises(ReferenceError, lambda: weak["setting"])
+        self.assertRaises(ValueError, lambda: get_dynamic_re(lazy=True, weak=True))
+
+    def test_dropped_values_still_shadow(self):
+        def outer():
+            x = 5
+            return inner()
+
+        def inner():
+            try:
+                raise ValueError
+            except ValueError as error:
+                x = error
+            return get_dynamic_re(weak=True), get_dynamic_re(keep=["x"])
+
+        # The exception of inner is not kept, but its x still hides the x of outer.
+        for scope in outer():
+            self.assertRaises(ReferenceError, lambda: scope["x"])
+            self.assertIn("x", list(scope))
+
+    def test_no_frames_are_retained(self):
+        def outer(**options):
+            frame = inspect.currentframe()
+            try:
+                raise ValueError
+            except ValueError as error:
+                failure = error
+            return inner(options)
+
+        def inner(options):
+            return get_dynamic_re(**options)
+
+        # A lazy scope holds the frames, and so does an eager scope of a stack that has frames in its locals.
+        for options in ({"lazy": True}, {}):
+            scope = outer(**options)
+            self.assertNotEqual(self.live_frames(outer, inner), [])
+            del scope
+        scopes = [outer(keep=["frame", "failure"]), outer(weak=True)]
+        self.assertEqual(self.live_frames(outer, inner), [])
+        self.assertEqual(set(scopes[0]), {"frame", "failure"})
@@ -1,6 +1,16 @@
+from stimpl.batch import *
+from stimpl.cache import *
+from stimpl.checkpoint import *
+from stimpl.cost import *
 from stimpl.errors import *
 from stimpl.expression import *
+from stimpl.jit import *
+from stimpl.memory import *
+from stimpl.metrics import *
+from stimpl.parallel import *
 from stimpl.runtime import *
 from stimpl.robustness import *
+from stimpl.serialize import *
+from stimpl.specialize import *
 from stimpl.test import *
 from stimpl.types import *
\ No newline at end of file
@@ -0,0 +1,114 @@
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from stimpl.cost import Cost, estimate_cost
+from stimpl.expression import Expr
+from stimpl.runtime import run_stimpl
+from stimpl.types import Type
+import stimpl.metrics as metrics
+
+"""
+Batch scheduling.
+
+A BatchScheduler admits programs with submit() and runs everything admitted
+with run(). Admission estimates the cost of each program (see stimpl.cost)
+and rejects runaway programs, and programs estimated above `max_work`,
+before they take a worker. run() then starts the cheapest programs first,
+so a few huge programs no longer hold up the many small ones queued behind
+them. Consecutive cheap programs are packed into chunks of about
+`chunk_work` estimated nodes, so that tiny programs do not each pay for a
+round trip to a worker.
+
+The metrics recorded by the workers (see stimpl.metrics) are added to those
+of the process calling run().
+"""
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, cost: Cost, reason: str):
+        super().__init__(reason)
+        self.cost = cost
+
+
+class BatchResult(NamedTuple):
+    # Position of the program in submission order.
+    index: int
+    # Position of the program in the order the scheduler started it.
+    position: int
+    value: Any
+    value_type: Optional[Type]
+    output: str
+    error: Optional[str]
+    cost: Cost
+    elapsed: float
+
+
+def _run_chunk(chunk: List[tuple]) -> Tuple[List[BatchResult], metrics.Metrics]:
+    """Runs a chunk and returns its results with the metrics recorded while running it."""
+    before = metrics.snapshot()
+    results = []
+    for index, position, program, cost in chunk:
+        output = io.StringIO()
+        start = time.perf_counter()
+        value = value_type = error = None
+        try:
+            with redirect_stdout(output):
+                value, value_type, _ = run_stimpl(program)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        results.append(BatchResult(index, position, value, value_type, output.getvalue(), error, cost, time.perf_counter() - start))
+    return results, metrics.snapshot() - before
+
+
+class BatchScheduler(object):
+    def __init__(self, workers: Optional[int] = None, max_work: Optional[float] = None, chunk_work: float = 2000):
+        # workers=1 runs the batch in this process.
+        self.workers = workers
+        self.max_work = max_work
+        self.chunk_work = chunk_work
+        self.pending: List[tuple] = []
+        self.submitted = 0
+
+    def submit(self, program: Expr) -> int:
+        """Admits `program` and returns its index, or raises AdmissionRejected."""
+        cost = estimate_cost(program)
+        if cost.runaway:
+            raise AdmissionRejected(cost, "Program has a loop that never ends.")
+        if self.max_work is not None and cost.work > self.max_work:
+            raise AdmissionRejected(cost, f"Program is estimated at {cost.work:.0f} nodes, over the limit of {self.max_work:.0f}.")
+        index = self.submitted
+        self.submitted += 1
+        self.pending.append((index, program, cost))
+        return index
+
+    def schedule(self) -> List[List[tuple]]:
+        """Takes the pending programs and orders them shortest job first, packed into chunks."""
+        jobs = sorted(self.pending, key=lambda job: (job[2].work, job[0]))
+        self.pending = []
+        chunks, chunk, chunk_work = [], [], 0.0
+        for position, (index, program, cost) in enumerate(jobs):
+            if chunk and chunk_work + cost.work > self.chunk_work:
+                chunks.append(chunk)
+                chunk, chunk_work = [], 0.0
+            chunk.append((index, position, program, cost))
+            chunk_work += cost.work
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def run(self) -> List[BatchResult]:
+        """Runs every pending program and returns the results in submission order."""
+        chunks = self.schedule()
+        results = []
+        if self.workers == 1:
+            for chunk in chunks:
+                results.extend(_run_chunk(chunk)[0])
+        else:
+            with ProcessPoolExecutor(self.workers) as pool:
+                for chunk_results, chunk_metrics in pool.map(_run_chunk, chunks):
+                    results.extend(chunk_results)
+                    metrics.merge(chunk_metrics)
+        return sorted(results, key=lambda result: result.index)
@@ -0,0 +1,76 @@
+import argparse
+import time
+from typing import Callable, Dict, List
+
+from stimpl.errors import *
+from stimpl.expression import *
+from stimpl.runtime import run_stimpl
+
+"""
+Micro-benchmarks for the interpreter.
+
+    python -m stimpl.benchmark                  # every benchmark
+    python -m stimpl.benchmark errors-unread --iterations 50000
+
+Each benchmark runs a workload `iterations` times and reports the best of
+`repeat` rounds in microseconds per iteration.
+"""
+
+# Small programs that fail the way fuzzers and robustness suites make them fail.
+FAILING_PROGRAMS: List[Expr] = [
+    Add(IntLiteral(1), StringLiteral("a")),
+    Subtract(StringLiteral("a"), StringLiteral("b")),
+    Lt(FloatingPointLiteral(1.0), IntLiteral(1)),
+    And(IntLiteral(1), IntLiteral(0)),
+    Not(StringLiteral("")),
+    If(IntLiteral(1), Ren(), Ren()),
+    Divide(IntLiteral(1), Subtract(IntLiteral(2), IntLiteral(2))),
+    Program(Assign(Variable("x"), IntLiteral(1)), Assign(Variable("x"), BooleanLiteral(True))),
+    Program(Assign(Variable("x"), IntLiteral(1)), Add(Variable("x"), Variable("y"))),
+]
+
+
+def bench_errors(iterations: int, read_message: bool) -> None:
+    programs = FAILING_PROGRAMS
+    for index in range(iterations):
+        try:
+            run_stimpl(programs[index % len(programs)])
+        except InterpError as e:
+            if read_message:
+                str(e)
+
+
+BENCHMARKS: Dict[str, Callable[[int], None]] = {
+    # Errors that are caught and dropped, as a robustness suite expecting them does.
+    "errors-unread": lambda iterations: bench_errors(iterations, False),
+    # Errors whose message is formatted, as when they are reported.
+    "errors-read": lambda iterations: bench_errors(iterations, True),
+}
+
+
+def run_benchmark(name: str, iterations: int, repeat: int = 5) -> float:
+    """Returns the best time of `repeat` rounds, in microseconds per iteration."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        BENCHMARKS[name](iterations)
+        best = min(best, time.perf_counter() - start)
+    return best / iterations * 1e6
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m stimpl.benchmark", description="Time interpreter workloads.")
+    parser.add_argument("benchmarks", nargs="*", help=f"benchmarks to run: {', '.join(sorted(BENCHMARKS))} (default: all)")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        print(f"{name:>24}: {run_benchmark(name, args.iterations, args.repeat):8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
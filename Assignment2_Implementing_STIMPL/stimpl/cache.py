@@ -0,0 +1,213 @@
+import hashlib
+import os
+import pickle
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from stimpl.expression import *
+from stimpl.runtime import EmptyState, state_bindings, state_from_bindings
+
+"""
+Content-addressed result cache for pure programs.
+
+A program without Print always produces the same (value, type, final_state),
+so its result can be keyed on a structural hash of the tree. run_stimpl
+consults the cache when one is passed to it.
+"""
+
+
+def structural_hash(expression: Expr) -> Optional[str]:
+    """Returns a hash that is equal for structurally equal trees.
+
+    A lazy subtree read from a file is hashed by where it is stored, so hashing
+    does not load it. A lazy subtree with no source is hashed by its contents,
+    or makes the tree unhashable (None) while it is unloaded.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    stack = [expression]
+    while stack:
+        node = stack.pop()
+        # Node kinds have a fixed arity except for Program and Sequence, so a pre-order
+        # listing plus the length of those is enough to identify the tree.
+        match node:
+            case Lazy(source=source) if source is not None:
+                digest.update(f"Lazy:{source!r};".encode())
+                continue
+            case Lazy(node=None):
+                return None
+            case Lazy():
+                pass
+            case Literal(literal=l):
+                digest.update(f"{type(node).__name__}:{l!r};".encode())
+            case Variable(variable_name=variable_name):
+                digest.update(f"Variable:{variable_name!r};".encode())
+            case Program(exprs=exprs) | Sequence(exprs=exprs):
+                digest.update(f"{type(node).__name__}:{len(exprs)};".encode())
+            case _:
+                digest.update(f"{type(node).__name__};".encode())
+        stack.extend(reversed(children(node)))
+    return digest.hexdigest()
+
+
+def program_key(program: Expr) -> Optional[str]:
+    """Returns the structural hash of a program, or None if it is not pure (it contains a Print).
+
+    Only the loaded parts of a lazy program can be checked for Print; see run_stimpl.
+    """
+    if any(isinstance(node, Print) for node in walk(program)):
+        return None
+    return structural_hash(program)
+
+
+def result_bytes(result: Tuple[Any, Any, Any]) -> int:
+    """Approximate bytes held by a run result: shallow sizes of the value and of every binding of the state chain."""
+    value, _, state = result
+    size = sys.getsizeof(value)
+    while not isinstance(state, EmptyState):
+        size += sys.getsizeof(state) + sys.getsizeof(state.__dict__) + sys.getsizeof(state.value)
+        size += sys.getsizeof(state.value[0])
+        state = state.next_state
+    return size
+
+
+class ResultCache(object):
+    """Bounded LRU cache of run results with an optional on-disk tier.
+
+    Entries are evicted (least recently used first) once together they hold
+    more than `max_bytes` bytes, as estimated by result_bytes, once there are
+    more than `max_entries` of them, if that is set, or once they are older
+    than `max_age` seconds. A result larger than the whole budget is not kept
+    in memory at all. When `directory` is set, results are also written there
+    and memory misses fall back to it; the directory keeps at most
+    `max_disk_entries` results.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_entries: Optional[int] = None,
+        max_age: Optional[float] = None,
+        directory: Optional[str] = None,
+        max_disk_entries: Optional[int] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        self.entries: "OrderedDict[str, Tuple[float, int, Tuple[Any, Any, Any]]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, program: Expr) -> Optional[str]:
+        return program_key(program)
+
+    def get(self, key: str) -> Optional[Tuple[Any, Any, Any]]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            stored_at, _, result = entry
+            if self.max_age is None or time.time() - stored_at <= self.max_age:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return result
+            self.forget(key)
+            self.evictions += 1
+        result = self.read_disk(key)
+        if result is not None:
+            self.disk_hits += 1
+            self.hits += 1
+            self.remember(key, result)
+            return result
+        self.misses += 1
+        return None
+
+    def put(self, key: str, result: Tuple[Any, Any, Any]) -> None:
+        self.remember(key, result)
+        self.write_disk(key, result)
+
+    def remember(self, key: str, result: Tuple[Any, Any, Any]) -> None:
+        if key in self.entries:
+            self.forget(key)
+        size = result_bytes(result)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (time.time(), size, result)
+        self.bytes += size
+        while self.bytes > self.max_bytes or (self.max_entries is not None and len(self.entries) > self.max_entries):
+            self.forget(next(iter(self.entries)))
+            self.evictions += 1
+
+    def forget(self, key: str) -> None:
+        _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+    def disk_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pickle")
+
+    def read_disk(self, key: str) -> Optional[Tuple[Any, Any, Any]]:
+        if self.directory is None:
+            return None
+        path = self.disk_path(key)
+        try:
+            if self.max_age is not None and time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                self.evictions += 1
+                return None
+            with open(path, "rb") as f:
+                value, value_type, bindings = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            # A torn or foreign file is just a miss.
+            return None
+        return (value, value_type, state_from_bindings(bindings))
+
+    def write_disk(self, key: str, result: Tuple[Any, Any, Any]) -> None:
+        if self.directory is None:
+            return
+        value, value_type, state = result
+        # States are flattened first; pickling the chain itself would recurse once per binding.
+        temporary_path = self.disk_path(key) + f".{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as f:
+            pickle.dump((value, value_type, state_bindings(state)), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, self.disk_path(key))
+        if self.max_disk_entries is not None:
+            self.prune_disk()
+
+    def prune_disk(self) -> None:
+        paths = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".pickle")
+        ]
+        if len(paths) <= self.max_disk_entries:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[: len(paths) - self.max_disk_entries]:
+            os.remove(path)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
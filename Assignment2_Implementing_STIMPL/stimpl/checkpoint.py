@@ -0,0 +1,190 @@
+import hashlib
+import os
+import pickle
+import time
+from typing import Any, List, Optional, Tuple
+
+from stimpl.expression import *
+from stimpl.runtime import (
+    EmptyState,
+    evaluation_hook,
+    live_bindings,
+    state_from_bindings,
+)
+import stimpl.runtime as runtime
+
+"""
+Checkpoint and resume.
+
+While a program runs with run_stimpl(program, checkpoint=path), the
+Checkpointer keeps a shadow stack of the nodes being evaluated. A node is
+resumable when every node above it only needs the result of its child to
+carry on: a Program or Sequence item, the taken branch of an If or the body
+of a While. At those points the whole continuation is just the path to the
+node, the iteration count of each enclosing While and the state, so that is
+what gets written to the checkpoint. Nothing is copied in memory: State is
+persistent, so holding on to it is enough until it is written.
+
+The program is written once, to `path + ".program"`, and every checkpoint
+only holds its digest and the live bindings of the state: the bindings that
+later assignments shadowed can never be read again, so they are dropped.
+"""
+
+CHECKPOINT_VERSION = 2
+
+
+def program_path(path: str) -> str:
+    """Returns the path of the file holding the program of the checkpoint at `path`."""
+    return f"{path}.program"
+
+
+def _write_atomically(path: str, data: bytes) -> None:
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(data)
+    os.replace(temporary_path, path)
+
+
+class Frame(object):
+    def __init__(self, node: Expr, position: Optional[int], resumable: bool, entered: int = 0):
+        self.node = node
+        # Index of the node among children(parent), None for the root.
+        self.position = position
+        # True when the path from the root to this node only goes through resumable positions.
+        self.resumable = resumable
+        # Number of children evaluated so far.
+        self.entered = entered
+
+
+class Checkpointer(object):
+    """Writes the continuation of a run to `path` at most once every `every` seconds."""
+
+    def __init__(self, path: str, program: Expr, every: float, program_digest: Optional[str] = None):
+        self.path = path
+        self.program = program
+        # The digest of the program file, once it is written; a resumed run passes the one it loaded.
+        self.program_digest = program_digest
+        self.every = every
+        self.last_checkpoint = time.monotonic()
+        self.stack: List[Frame] = []
+        self.checkpoints = 0
+
+    def hook(self, evaluate_next, expression, state):
+        if not self.stack:
+            frame = Frame(expression, None, expression is self.program)
+        else:
+            parent = self.stack[-1]
+            parent.entered += 1
+            position, resumable = self.child_position(parent, expression)
+            frame = Frame(expression, position, parent.resumable and resumable)
+        self.stack.append(frame)
+        if frame.resumable and time.monotonic() - self.last_checkpoint >= self.every:
+            self.write(state)
+        try:
+            return evaluate_next(expression, state)
+        finally:
+            self.stack.pop()
+
+    def child_position(self, parent: Frame, expression: Expr) -> Tuple[int, bool]:
+        # Children are entered in a fixed order, so the count tells us which one this is.
+        match parent.node:
+            case Program() | Sequence():
+                return (parent.entered - 1, True)
+            case If():
+                if parent.entered == 1:
+                    return (0, False)
+                return (1 if expression is parent.node.true else 2, True)
+            case While():
+                if parent.entered % 2 == 1:
+                    return (0, False)
+                return (1, True)
+            case Lazy():
+                # Evaluates to its subtree, so it is resumable wherever the subtree is.
+                return (0, True)
+            case _:
+                return (parent.entered - 1, False)
+
+    def write(self, state) -> None:
+        path = [frame.position for frame in self.stack[1:]]
+        # Iteration number of every enclosing While, counting from 1 for the first body.
+        iterations = [frame.entered // 2 for frame in self.stack[:-1] if isinstance(frame.node, While)]
+        if self.program_digest is None:
+            program_bytes = pickle.dumps(self.program, pickle.HIGHEST_PROTOCOL)
+            _write_atomically(program_path(self.path), program_bytes)
+            self.program_digest = hashlib.blake2b(program_bytes, digest_size=20).hexdigest()
+        checkpoint = (
+            CHECKPOINT_VERSION,
+            self.program_digest,
+            path,
+            iterations,
+            live_bindings(state),
+            self.every,
+        )
+        _write_atomically(self.path, pickle.dumps(checkpoint, pickle.HIGHEST_PROTOCOL))
+        self.checkpoints += 1
+        self.last_checkpoint = time.monotonic()
+
+
+def _load_checkpoint(path: str):
+    with open(path, "rb") as f:
+        version, *checkpoint = pickle.load(f)
+    if version != CHECKPOINT_VERSION:
+        raise ValueError(f"{path} is a version {version} checkpoint, expected {CHECKPOINT_VERSION}")
+    digest, node_path, iterations, bindings, every = checkpoint
+    with open(program_path(path), "rb") as f:
+        program_bytes = f.read()
+    if hashlib.blake2b(program_bytes, digest_size=20).hexdigest() != digest:
+        raise ValueError(f"{program_path(path)} does not hold the program of {path}")
+    return (pickle.loads(program_bytes), node_path, iterations, state_from_bindings(bindings), every), digest
+
+
+def load_checkpoint(path: str):
+    """Returns (program, path to the resumed node, While iteration counts, state, checkpoint interval)."""
+    return _load_checkpoint(path)[0]
+
+
+def resume_stimpl(checkpoint: str, checkpoint_every: Optional[float] = None):
+    """Continues the run saved in `checkpoint` and returns what run_stimpl would have returned.
+
+    The resumed run keeps checkpointing to the same file, every `checkpoint_every`
+    seconds (by default the interval of the original run).
+    """
+    (program, node_path, iterations, state, every), digest = _load_checkpoint(checkpoint)
+    checkpointer = Checkpointer(
+        checkpoint, program, every if checkpoint_every is None else checkpoint_every, digest
+    )
+
+    # Rebuild the shadow stack as it was when the checkpoint was written.
+    node = program
+    checkpointer.stack.append(Frame(program, None, True))
+    remaining_iterations = list(iterations)
+    for position in node_path:
+        frame = checkpointer.stack[-1]
+        match frame.node:
+            case Program() | Sequence():
+                frame.entered = position
+            case If():
+                frame.entered = 1
+            case While():
+                frame.entered = 2 * remaining_iterations.pop(0) - 1
+        node = frame.node.force() if isinstance(frame.node, Lazy) else children(frame.node)[position]
+        checkpointer.stack.append(Frame(node, position, True))
+    checkpointer.stack.pop()
+
+    with evaluation_hook(checkpointer.hook):
+        value, value_type, state = runtime.evaluate(node, state)
+        # Unwind the continuation: finish every enclosing node with the result of its child.
+        while checkpointer.stack:
+            frame = checkpointer.stack[-1]
+            match frame.node:
+                case Program(exprs=exprs) | Sequence(exprs=exprs):
+                    for expr in exprs[frame.entered:]:
+                        value, value_type, state = runtime.evaluate(expr, state)
+                case While(condition=condition, body=body):
+                    # The body just finished; evaluate the condition and carry on with the loop.
+                    value, value_type, state = runtime.evaluate(condition, state)
+                    while value:
+                        _, _, state = runtime.evaluate(body, state)
+                        value, value_type, state = runtime.evaluate(condition, state)
+            checkpointer.stack.pop()
+    return value, value_type, state
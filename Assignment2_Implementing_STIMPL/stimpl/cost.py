@@ -0,0 +1,157 @@
+import math
+from typing import Dict, NamedTuple, Optional
+
+from stimpl.expression import *
+from stimpl.parallel import read_write_sets
+
+"""
+Static cost model.
+
+estimate_cost(program) estimates how many nodes evaluating a program will
+visit, without running it. Every node counts once, an If counts its more
+expensive branch and a While counts its condition and body once per
+estimated trip.
+
+Trips are worked out for counter loops: a condition comparing a variable
+with an integer (a literal, or a variable whose value is known from an
+earlier assignment of a literal), and a body that assigns the counter
+exactly once, by adding or subtracting an integer literal. A counter loop
+that can never end, or a While whose condition is the literal True, makes
+the estimate infinite and the program a runaway. Any other loop is assumed
+to run DEFAULT_TRIPS times and is counted in `guessed_loops`.
+"""
+
+DEFAULT_TRIPS = 100
+
+_FLIPPED = {Lt: Gt, Lte: Gte, Gt: Lt, Gte: Lte, Ne: Ne}
+
+
+class Cost(NamedTuple):
+    # Nodes in the tree.
+    nodes: int
+    # Deepest nesting of While loops.
+    loop_nesting: int
+    # Number of loops whose trips had to be guessed.
+    guessed_loops: int
+    # Estimated number of evaluated nodes; math.inf for a runaway program.
+    work: float
+
+    @property
+    def runaway(self) -> bool:
+        return math.isinf(self.work)
+
+
+def _step(counter: str, body: Expr) -> Optional[int]:
+    """Returns the amount the body adds to `counter`, if it assigns it exactly once by a constant step."""
+    assigns = [node for node in walk(body) if isinstance(node, Assign) and node.variable.variable_name == counter]
+    if len(assigns) != 1:
+        return None
+    match assigns[0].value:
+        case Add(left=Variable(variable_name=name), right=IntLiteral(literal=step)) if name == counter:
+            return step
+        case Add(left=IntLiteral(literal=step), right=Variable(variable_name=name)) if name == counter:
+            return step
+        case Subtract(left=Variable(variable_name=name), right=IntLiteral(literal=step)) if name == counter:
+            return -step
+    return None
+
+
+def loop_trips(loop: While, constants: Dict[str, int]) -> Optional[float]:
+    """Returns the trip count of a counter loop (math.inf if it never ends), or None if it is not one."""
+    condition = loop.condition
+    if isinstance(condition, BooleanLiteral):
+        return math.inf if condition.literal else 0
+    if type(condition) not in _FLIPPED:
+        return None
+    operator, counter, bound = type(condition), condition.left, condition.right
+    if not isinstance(counter, Variable):
+        operator, counter, bound = _FLIPPED[operator], condition.right, condition.left
+    if not isinstance(counter, Variable) or counter.variable_name not in constants:
+        return None
+    match bound:
+        case IntLiteral(literal=limit):
+            pass
+        case Variable(variable_name=name) if name in constants and name not in read_write_sets(loop.body)[1]:
+            limit = constants[name]
+        case _:
+            return None
+    step = _step(counter.variable_name, loop.body)
+    if step is None:
+        return None
+    start = constants[counter.variable_name]
+
+    # Distance the counter has to travel before the condition turns false.
+    if operator is Ne:
+        distance = limit - start
+        if distance == 0:
+            return 0
+        if step == 0 or distance % step != 0 or distance // step < 0:
+            return math.inf
+        return distance // step
+    if operator is Lt:
+        distance = limit - start
+    elif operator is Lte:
+        distance = limit - start + 1
+    elif operator is Gt:
+        distance, step = start - limit, -step
+    else:
+        distance, step = start - limit + 1, -step
+    if distance <= 0:
+        return 0
+    if step <= 0:
+        return math.inf
+    return -(-distance // step)
+
+
+class CostModel(object):
+    def __init__(self):
+        self.loop_nesting = 0
+        self.guessed_loops = 0
+
+    def work(self, expression: Expr, constants: Dict[str, int], nesting: int = 0) -> float:
+        """Estimated evaluated nodes; `constants` holds the integer variables known at this point and is updated."""
+        match expression:
+            case Program(exprs=exprs) | Sequence(exprs=exprs):
+                return 1 + sum(self.work(expr, constants, nesting) for expr in exprs)
+            case Assign(variable=variable, value=value):
+                total = 1 + self.work(value, constants, nesting)
+                if isinstance(value, IntLiteral):
+                    constants[variable.variable_name] = value.literal
+                else:
+                    constants.pop(variable.variable_name, None)
+                return total
+            case If(condition=condition, true=true, false=false):
+                total = 1 + self.work(condition, constants, nesting)
+                true_constants, false_constants = dict(constants), dict(constants)
+                total += max(self.work(true, true_constants, nesting), self.work(false, false_constants, nesting))
+                # Only what both branches agree on is still known afterwards.
+                for name in list(constants.keys() | true_constants.keys() | false_constants.keys()):
+                    if name in true_constants and true_constants.get(name) == false_constants.get(name):
+                        constants[name] = true_constants[name]
+                    else:
+                        constants.pop(name, None)
+                return total
+            case While(condition=condition, body=body):
+                self.loop_nesting = max(self.loop_nesting, nesting + 1)
+                trips = loop_trips(expression, constants)
+                if trips is None:
+                    self.guessed_loops += 1
+                    trips = DEFAULT_TRIPS
+                for part in (condition, body):
+                    for name in read_write_sets(part)[1]:
+                        constants.pop(name, None)
+                iteration_constants = dict(constants)
+                condition_work = self.work(condition, iteration_constants, nesting + 1)
+                body_work = self.work(body, iteration_constants, nesting + 1)
+                if trips == 0:
+                    return 1 + condition_work
+                return 1 + condition_work + trips * (condition_work + body_work)
+            case _:
+                return 1 + sum(self.work(child, constants, nesting) for child in children(expression))
+
+
+def estimate_cost(program: Expr) -> Cost:
+    model = CostModel()
+    work = model.work(program, {})
+    nodes = sum(1 for _ in walk(program))
+    return Cost(nodes, model.loop_nesting, model.guessed_loops, work)
@@ -1,29 +1,59 @@
 import re
 """
 Interpreter errors.
+
+Errors carry structured fields (the operator, the operand types, the node
+being evaluated and, when a tool is counting them, the step number) next to a
+message template. Nothing is formatted when an error is raised: the template
+is filled in from the fields, and its whitespace collapsed, the first time the
+message is read.
 """
 class InterpError(Exception):
-  def __init__(self, error_msg):
-    error_msg = re.sub(r"[\n\s]+", ' ', error_msg)
-    super().__init__(error_msg)
+  default_message = "InterpError"
+
+  def __init__(self, error_msg = None, node = None, step = None, operator = None, left_type = None, right_type = None, **fields):
+    super().__init__()
+    self.template = error_msg
+    self.node = node
+    self.step = step
+    self.operator = operator
+    self.left_type = left_type
+    self.right_type = right_type
+    self.fields = fields
+    self._message = None
+
+  @property
+  def message(self):
+    if self._message == None:
+      template = self.template if self.template != None else self.default_message
+      if self.operator != None or self.left_type != None or self.right_type != None or self.fields:
+        template = template.format(operator = self.operator, left_type = self.left_type, right_type = self.right_type, **self.fields)
+      self._message = re.sub(r"[\n\s]+", ' ', template)
+    return self._message
+
+  # args holds the message, as it did when the message was passed to Exception, but it is only formatted when read.
+  @property
+  def args(self):
+    return (self.message,)
+
+  @args.setter
+  def args(self, args):
+    self._message = str(args[0]) if args else self.default_message
+
+  def __str__(self):
+    return self.message
+
+  def __repr__(self):
+    return f"{type(self).__name__}({self.message!r})"
 
 class InterpSyntaxError(InterpError):
-  def __init__(self, error_msg = None):
-    if error_msg == None:
-      error_msg = "InterpSyntaxError"
-    super().__init__(error_msg)
+  default_message = "InterpSyntaxError"
 
 class InterpTypeError(InterpError):
-  def __init__(self, error_msg = None):
-    if error_msg == None:
-      error_msg = "InterpTypeError"
-    super().__init__(error_msg)
+  default_message = "InterpTypeError"
 
 class InterpMathError(InterpError):
-  def __init__(self, error_msg = None):
-    if error_msg == None:
-      error_msg = "InterpMathError"
-    super().__init__(error_msg)
+  default_message = "InterpMathError"
 
 def pretty_type(value):
   return f"{str(type(value).__name__)}"
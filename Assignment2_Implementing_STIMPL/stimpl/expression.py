@@ -1,3 +1,6 @@
+import io
+from typing import Optional, TextIO
+
 from stimpl.errors import InterpSyntaxError, InterpTypeError, pretty_type
 """
 Expressions
@@ -39,7 +42,7 @@ class IntLiteral(Literal):
     def __init__(self, literal):
         if type(literal) != int:
             raise InterpTypeError(
-                f"Integer literal cannot be {pretty_type(literal)}")
+                "Integer literal cannot be {literal_type}", literal_type=pretty_type(literal))
         super().__init__(literal)
 
 
@@ -47,7 +50,7 @@ class FloatingPointLiteral(Literal):
     def __init__(self, literal):
         if type(literal) != float:
             raise InterpTypeError(
-                f"Floating-point literal cannot be {pretty_type(literal)}")
+                "Floating-point literal cannot be {literal_type}", literal_type=pretty_type(literal))
         super().__init__(literal)
 
 
@@ -55,7 +58,7 @@ class StringLiteral(Literal):
     def __init__(self, literal):
         if type(literal) != str:
             raise InterpTypeError(
-                f"Integer literal cannot be {pretty_type(literal)}")
+                "Integer literal cannot be {literal_type}", literal_type=pretty_type(literal))
         super().__init__(literal)
 
 
@@ -63,7 +66,7 @@ class BooleanLiteral(Literal):
     def __init__(self, literal):
         if type(literal) != bool:
             raise InterpTypeError(
-                f"Boolean literal cannot be {pretty_type(literal)}")
+                "Boolean literal cannot be {literal_type}", literal_type=pretty_type(literal))
         super().__init__(literal)
 
 
@@ -96,7 +99,7 @@ class Assign(Expr):
         self.value = value
 
     def __repr__(self):
-        return f"{self.variable} = {self.value}"
+        return format_expression(self)
 
 
 class UnaryOperator(Expr):
@@ -110,7 +113,7 @@ class Print(UnaryOperator):
         super().__init__()
 
     def __repr__(self):
-        return f"Print {self.to_print}"
+        return format_expression(self)
 
 
 class Not(UnaryOperator):
@@ -119,7 +122,7 @@ class Not(UnaryOperator):
         super().__init__()
 
     def __repr__(self):
-        return f"Not {self.expr}"
+        return format_expression(self)
 
 
 class BinaryOperator(Expr):
@@ -134,7 +137,7 @@ class And(BinaryOperator):
         super().__init__(left, right)
 
     def __repr__(self):
-        return f"{self.left} && {self.right}"
+        return format_expression(self)
 
 
 class Or(BinaryOperator):
@@ -142,7 +145,7 @@ class Or(BinaryOperator):
         super().__init__(left, right)
 
     def __repr__(self):
-        return f"{self.left} || {self.right}"
+        return format_expression(self)
 
 
 class Lt(BinaryOperator):
@@ -150,7 +153,7 @@ class Lt(BinaryOperator):
         super().__init__(left, right)
 
     def __repr__(self):
-        return f"{self.left} < {self.right}"
+        return format_expression(self)
 
 
 class Lte(BinaryOperator):
@@ -158,7 +161,7 @@ class Lte(BinaryOperator):
         super().__init__(left, right)
 
     def __repr__(self):
-        return f"{self.left} <= {self.right}"
+        return format_expression(self)
 
 
 class Gt(BinaryOperator):
@@ -166,7 +169,7 @@ class Gt(BinaryOperator):
         super().__init__(left, right)
 
     def __repr__(self):
-        return f"{self.left} < {self.right}"
+        return format_expression(self)
 
 
 class Gte(BinaryOperator):
@@ -174,7 +177,7 @@ class Gte(BinaryOperator):
         super().__init__(left, right)
 
     def __repr__(self):
-        return f"{self.left} <= {self.right}"
+        return format_expression(self)
 
 
 class Eq(BinaryOperator):
@@ -182,7 +185,7 @@ class Eq(BinaryOperator):
         super().__init__(left, right)
 
     def __repr__(self):
-        return f"{self.left} == {self.right}"
+        return format_expression(self)
 
 
 class Ne(BinaryOperator):
@@ -190,7 +193,7 @@ class Ne(BinaryOperator):
         super().__init__(left, right)
 
     def __repr__(self):
-        return f"{self.left} != {self.right}"
+        return format_expression(self)
 
 
 class Add(BinaryOperator):
@@ -198,7 +201,7 @@ class Add(BinaryOperator):
         super().__init__(left, right)
 
     def __repr__(self):
-        return f"{self.left} + {self.right}"
+        return format_expression(self)
 
 
 class Subtract(BinaryOperator):
@@ -206,7 +209,7 @@ class Subtract(BinaryOperator):
         super().__init__(left, right)
 
     def __repr__(self):
-        return f"{self.left} - {self.right}"
+        return format_expression(self)
 
 
 class Multiply(BinaryOperator):
@@ -214,7 +217,7 @@ class Multiply(BinaryOperator):
         super().__init__(left, right)
 
     def __repr__(self):
-        return f"{self.left} * {self.right}"
+        return format_expression(self)
 
 
 class Divide(BinaryOperator):
@@ -222,7 +225,7 @@ class Divide(BinaryOperator):
         super().__init__(left, right)
 
     def __repr__(self):
-        return f"{self.left} / {self.right}"
+        return format_expression(self)
 
 
 """
@@ -235,10 +238,7 @@ class Program(Expr):
         self.exprs = exprs
 
     def __repr__(self):
-        exprs = self.exprs
-        if len(exprs) == 0:
-            exprs = ["None"]
-        return "Program: " + ";\n".join([repr(x) for x in exprs])
+        return format_expression(self)
 
 
 class Sequence(Expr):
@@ -246,10 +246,7 @@ class Sequence(Expr):
         self.exprs = exprs
 
     def __repr__(self):
-        exprs = self.exprs
-        if len(exprs) == 0:
-            exprs = ["None"]
-        return "Sequence: " + ";\n".join([repr(x) for x in exprs])
+        return format_expression(self)
 
 
 class If(Expr):
@@ -259,7 +256,7 @@ class If(Expr):
         self.false = false
 
     def __repr__(self):
-        return f"if ({self.condition}) then {{ {self.true} }} else {{ {self.false} }}"
+        return format_expression(self)
 
 
 class While(Expr):
@@ -268,4 +265,187 @@ class While(Expr):
         self.body = body
 
     def __repr__(self):
-        return f"while ({self.condition}) {{ {self.body} }}"
+        return format_expression(self)
+
+
+"""
+Lazily built subtrees.
+"""
+
+
+class Lazy(Expr):
+    """Stands for the subtree returned by load(), which is only called the first time the subtree is needed.
+
+    Until then the subtree takes no memory and prints as <lazy `description`>.
+    `source`, when the subtree is stored somewhere, identifies it without
+    loading it (see serialize.LazyRange); tools that key on a program's
+    structure use it instead of the subtree.
+    """
+
+    # Subtrees loaded by any Lazy so far, so a caller can tell cheaply whether a run loaded any.
+    loads = 0
+
+    def __init__(self, load, description: str = "subtree", source: Optional[tuple] = None):
+        # Kept after loading: two threads forcing at once both get a valid subtree.
+        self.load = load
+        self.description = description
+        self.source = source
+        self.node = None
+
+    def force(self) -> Expr:
+        if self.node is None:
+            self.node = self.load()
+            Lazy.loads += 1
+        return self.node
+
+    def __repr__(self):
+        return format_expression(self)
+
+
+"""
+Traversal.
+"""
+
+
+def children(expression: Expr) -> tuple:
+    """Returns the direct subexpressions of an expression in evaluation order."""
+    match expression:
+        case Assign(variable=variable, value=value):
+            return (variable, value)
+        case Print(to_print=to_print):
+            return (to_print,)
+        case Not(expr=expr):
+            return (expr,)
+        case BinaryOperator(left=left, right=right):
+            return (left, right)
+        case Program(exprs=exprs) | Sequence(exprs=exprs):
+            return exprs
+        case If(condition=condition, true=true, false=false):
+            return (condition, true, false)
+        case While(condition=condition, body=body):
+            return (condition, body)
+        case Lazy(node=node):
+            # An unloaded subtree stays on disk; call force() to get it.
+            return (node,) if node is not None else ()
+        case _:
+            return ()
+
+
+def walk(expression: Expr):
+    """Yields every node of the tree in pre-order without recursing, so arbitrarily deep programs are fine.
+
+    Lazy subtrees are walked through once they are loaded; until then the Lazy node is a leaf.
+    """
+    stack = [expression]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(children(node)))
+
+
+"""
+Printing.
+"""
+
+_OPERATOR_SYMBOLS = {
+    And: "&&", Or: "||", Lt: "<", Lte: "<=", Gt: ">", Gte: ">=", Eq: "==", Ne: "!=",
+    Add: "+", Subtract: "-", Multiply: "*", Divide: "/",
+}
+
+ELLIPSIS = "..."
+
+
+class StopWriting(Exception):
+    pass
+
+
+class BoundedWriter(object):
+    """Writes to `stream` until `max_length` characters were written, then writes an ellipsis and stops."""
+
+    def __init__(self, stream: TextIO, max_length: Optional[int] = None):
+        self.stream = stream
+        self.remaining = max_length
+
+    def write(self, text: str) -> None:
+        if self.remaining is None:
+            self.stream.write(text)
+            return
+        if len(text) > self.remaining:
+            self.stream.write(text[: self.remaining])
+            self.stream.write(ELLIPSIS)
+            self.remaining = 0
+            raise StopWriting()
+        self.stream.write(text)
+        self.remaining -= len(text)
+
+
+def write_expression(
+    expression: Expr,
+    stream: TextIO,
+    max_depth: Optional[int] = None,
+    max_items: Optional[int] = None,
+    max_length: Optional[int] = None,
+) -> None:
+    """Writes the repr of `expression` to `stream` without recursing or building it in memory first.
+
+    Nodes nested deeper than `max_depth`, Program and Sequence items past
+    `max_items` and everything past `max_length` characters are elided.
+    """
+    writer = BoundedWriter(stream, max_length)
+    # Pending work, popped from the end: text to write, or (node, depth) to expand.
+    stack = [(expression, 0)]
+    try:
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                writer.write(item)
+                continue
+            node, depth = item
+            if max_depth is not None and depth > max_depth:
+                writer.write(ELLIPSIS)
+                continue
+            depth += 1
+            match node:
+                case Ren() | Literal() | Variable():
+                    writer.write(repr(node))
+                case Assign(variable=variable, value=value):
+                    stack.extend([(value, depth), " = ", (variable, depth)])
+                case Print(to_print=to_print):
+                    stack.extend([(to_print, depth), "Print "])
+                case Not(expr=expr):
+                    stack.extend([(expr, depth), "Not "])
+                case BinaryOperator(left=left, right=right) if type(node) in _OPERATOR_SYMBOLS:
+                    stack.extend([(right, depth), f" {_OPERATOR_SYMBOLS[type(node)]} ", (left, depth)])
+                case Program(exprs=exprs) | Sequence(exprs=exprs):
+                    parts = [f"{type(node).__name__}: "]
+                    shown = exprs if max_items is None else exprs[:max_items]
+                    for index, expr in enumerate(shown):
+                        if index:
+                            parts.append(";\n")
+                        parts.append((expr, depth))
+                    if not exprs:
+                        parts.append("None")
+                    elif len(shown) < len(exprs):
+                        parts.append(f";\n{ELLIPSIS} ({len(exprs) - len(shown)} more)")
+                    stack.extend(reversed(parts))
+                case If(condition=condition, true=true, false=false):
+                    stack.extend(reversed(
+                        ["if (", (condition, depth), ") then { ", (true, depth), " } else { ", (false, depth), " }"]
+                    ))
+                case While(condition=condition, body=body):
+                    stack.extend(reversed(["while (", (condition, depth), ") { ", (body, depth), " }"]))
+                case Lazy(node=None, description=description):
+                    writer.write(f"<lazy {description}>")
+                case Lazy(node=loaded):
+                    stack.append((loaded, depth - 1))
+                case _:
+                    writer.write(repr(node))
+    except StopWriting:
+        pass
+
+
+def format_expression(expression: Expr, **limits) -> str:
+    """Returns what write_expression would write, as a string."""
+    stream = io.StringIO()
+    write_expression(expression, stream, **limits)
+    return stream.getvalue()
@@ -0,0 +1,311 @@
+import argparse
+import math
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from stimpl.expression import *
+from stimpl.runtime import run_stimpl
+from stimpl.types import *
+
+"""
+Synthetic workload generator and scaling driver.
+
+ProgramGenerator builds random programs that are well typed by construction:
+every variable is initialized with a fixed type before it is used, operands
+always have matching types, divisors are non-zero literals and While loops
+are bounded counters. String Add only ever takes a variable on one side, so a
+string grows by a bounded number of characters per assignment. Numbers can
+grow geometrically in a loop (x = x * 9, or x = x + x), but Multiply never
+takes a variable on its right, so a number is never squared: an integer
+gains a bounded number of digits per assignment and a float at worst reaches
+inf. The same config and seed always give the same program.
+
+scaling_curve runs a workload at geometrically increasing sizes and fits the
+exponent of time and peak memory against size on a log-log scale; anything
+noticeably above 1 is flagged as superlinear.
+
+    python -m stimpl.gen                       # every scenario at the default sizes
+    python -m stimpl.gen --scenario loop-trips --sizes 1000 2000 4000 8000
+"""
+
+_VARIABLE_TYPES = (Integer, FloatingPoint, String, Boolean)
+
+DEFAULT_OPERATOR_WEIGHTS = {
+    "Add": 4, "Subtract": 2, "Multiply": 2, "Divide": 1,
+    "And": 1, "Or": 1, "Not": 1,
+    "Lt": 1, "Lte": 1, "Gt": 1, "Gte": 1, "Eq": 1, "Ne": 1,
+}
+
+_OPERATORS = {
+    cls.__name__: cls
+    for cls in (Add, Subtract, Multiply, Divide, And, Or, Lt, Lte, Gt, Gte, Eq, Ne)
+}
+
+DEFAULT_STATEMENT_WEIGHTS = {"assign": 6, "if": 2, "while": 1, "print": 0}
+
+
+class GeneratorConfig(object):
+    def __init__(
+        self,
+        statements: int = 20,
+        max_nesting: int = 2,
+        max_expression_depth: int = 3,
+        variables: int = 8,
+        loop_trips: int = 10,
+        block_size: int = 3,
+        operator_weights: Optional[Dict[str, float]] = None,
+        statement_weights: Optional[Dict[str, float]] = None,
+        seed: int = 0,
+    ):
+        # Number of top-level statements after the variables are initialized.
+        self.statements = statements
+        # How deeply If and While statements may nest.
+        self.max_nesting = max_nesting
+        self.max_expression_depth = max_expression_depth
+        self.variables = variables
+        # Trip count of every generated While loop.
+        self.loop_trips = loop_trips
+        # Maximum number of statements in an If branch or While body.
+        self.block_size = block_size
+        self.operator_weights = operator_weights or DEFAULT_OPERATOR_WEIGHTS
+        self.statement_weights = statement_weights or DEFAULT_STATEMENT_WEIGHTS
+        self.seed = seed
+
+
+class ProgramGenerator(object):
+    def __init__(self, config: GeneratorConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.variables: Dict[type, List[str]] = {type_class: [] for type_class in _VARIABLE_TYPES}
+        self.loops = 0
+
+    def program(self) -> Program:
+        statements = []
+        for index in range(self.config.variables):
+            type_class = _VARIABLE_TYPES[index % len(_VARIABLE_TYPES)]
+            name = f"v{index}"
+            statements.append(Assign(Variable(name), self.literal(type_class)))
+            self.variables[type_class].append(name)
+        for _ in range(self.config.statements):
+            statements.append(self.statement(self.config.max_nesting))
+        return Program(*statements)
+
+    def choose(self, weights: Dict[str, float], allowed) -> str:
+        names = [name for name in allowed if weights.get(name, 0) > 0]
+        if not names:
+            return allowed[0]
+        return self.random.choices(names, [weights[name] for name in names])[0]
+
+    def block(self, nesting: int) -> Sequence:
+        count = self.random.randint(1, self.config.block_size)
+        return Sequence(*[self.statement(nesting) for _ in range(count)])
+
+    def statement(self, nesting: int) -> Expr:
+        kinds = ["assign", "print"] + (["if", "while"] if nesting > 0 else [])
+        match self.choose(self.config.statement_weights, kinds):
+            case "print":
+                return Print(self.expression(self.random.choice(_VARIABLE_TYPES)))
+            case "if":
+                return If(self.expression(Boolean), self.block(nesting - 1), self.block(nesting - 1))
+            case "while":
+                self.loops += 1
+                counter = Variable(f"loop{self.loops}")
+                body = self.block(nesting - 1)
+                return Sequence(
+                    Assign(counter, IntLiteral(0)),
+                    While(
+                        Lt(counter, IntLiteral(self.config.loop_trips)),
+                        Sequence(*body.exprs, Assign(counter, Add(counter, IntLiteral(1)))),
+                    ),
+                )
+            case _:
+                type_class = self.random.choice([t for t in _VARIABLE_TYPES if self.variables[t]] or [Integer])
+                if not self.variables[type_class]:
+                    self.variables[type_class].append("v0")
+                    return Assign(Variable("v0"), self.literal(type_class))
+                name = self.random.choice(self.variables[type_class])
+                return Assign(Variable(name), self.expression(type_class))
+
+    def expression(self, type_class: type, depth: Optional[int] = None, variables: bool = True) -> Expr:
+        if depth is None:
+            depth = self.random.randint(0, self.config.max_expression_depth)
+        if depth == 0:
+            return self.leaf(type_class, variables)
+        weights = self.config.operator_weights
+        if type_class is Boolean:
+            operator = self.choose(weights, ["And", "Or", "Not", "Lt", "Lte", "Gt", "Gte", "Eq", "Ne"])
+            match operator:
+                case "Not":
+                    return Not(self.expression(Boolean, depth - 1, variables))
+                case "And" | "Or":
+                    return _OPERATORS[operator](
+                        self.expression(Boolean, depth - 1, variables),
+                        self.expression(Boolean, depth - 1, variables),
+                    )
+                case _:
+                    operand_type = self.random.choice((Integer, FloatingPoint, String))
+                    return _OPERATORS[operator](
+                        self.expression(operand_type, depth - 1, variables),
+                        self.expression(operand_type, depth - 1, variables),
+                    )
+        if type_class is String:
+            # Only one side may read variables, so a string grows by a bounded amount per assignment.
+            grown = self.expression(String, depth - 1, variables)
+            if self.random.random() < 0.5:
+                return Add(grown, self.literal(String))
+            return Add(self.literal(String), grown)
+        operator = self.choose(weights, ["Add", "Subtract", "Multiply", "Divide"])
+        left = self.expression(type_class, depth - 1, variables)
+        match operator:
+            case "Multiply":
+                # A variable on both sides could square a number, doubling its digits every iteration.
+                return Multiply(left, self.expression(type_class, depth - 1, False))
+            case "Divide":
+                return Divide(left, self.literal(type_class, non_zero=True))
+            case _:
+                return _OPERATORS[operator](left, self.expression(type_class, depth - 1, variables))
+
+    def leaf(self, type_class: type, variables: bool) -> Expr:
+        if variables and self.variables[type_class] and self.random.random() < 0.6:
+            return Variable(self.random.choice(self.variables[type_class]))
+        return self.literal(type_class)
+
+    def literal(self, type_class: type, non_zero: bool = False) -> Expr:
+        if type_class is Integer:
+            value = self.random.randint(1, 9) if non_zero else self.random.randint(-9, 9)
+            return IntLiteral(value)
+        if type_class is FloatingPoint:
+            value = round(self.random.uniform(0.5, 4.0), 2)
+            return FloatingPointLiteral(value if non_zero or self.random.random() < 0.8 else -value)
+        if type_class is String:
+            return StringLiteral("".join(self.random.choices("abcxyz", k=self.random.randint(1, 3))))
+        return BooleanLiteral(self.random.random() < 0.5)
+
+
+def generate_program(config: Optional[GeneratorConfig] = None, **options) -> Program:
+    """Generates a program from `config`, or from a GeneratorConfig built from `options`."""
+    return ProgramGenerator(config or GeneratorConfig(**options)).program()
+
+
+"""
+Scaling driver.
+"""
+
+
+class ScalingResult(object):
+    def __init__(self, name: str, sizes: List[int], seconds: List[float], peak_bytes: List[int], tolerance: float):
+        self.name = name
+        self.sizes = sizes
+        self.seconds = seconds
+        self.peak_bytes = peak_bytes
+        self.time_exponent = fit_exponent(sizes, seconds)
+        self.memory_exponent = fit_exponent(sizes, peak_bytes)
+        self.tolerance = tolerance
+
+    @property
+    def superlinear_time(self) -> bool:
+        return self.time_exponent > 1 + self.tolerance
+
+    @property
+    def superlinear_memory(self) -> bool:
+        return self.memory_exponent > 1 + self.tolerance
+
+    def __repr__(self) -> str:
+        flags = [kind for kind, flagged in (("time", self.superlinear_time), ("memory", self.superlinear_memory)) if flagged]
+        verdict = f"SUPERLINEAR {' and '.join(flags)}" if flags else "ok"
+        return (
+            f"{self.name}: time ~ n^{self.time_exponent:.2f}, "
+            f"memory ~ n^{self.memory_exponent:.2f} ({verdict})"
+        )
+
+
+def fit_exponent(sizes: List[int], values: List[float]) -> float:
+    """Least-squares slope of log(value) against log(size)."""
+    points = [(math.log(size), math.log(max(value, 1e-9))) for size, value in zip(sizes, values)]
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    if spread == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+
+def measure(program: Expr, repeat: int = 3):
+    """Returns (best wall time in seconds, peak traced memory in bytes) of running `program`."""
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_stimpl(program)
+        best = min(best, time.perf_counter() - start)
+    # Memory is measured in a separate run; tracemalloc would distort the timings.
+    tracemalloc.start()
+    try:
+        run_stimpl(program)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def scaling_curve(
+    name: str,
+    build: Callable[[int], Expr],
+    sizes: List[int],
+    repeat: int = 3,
+    tolerance: float = 0.3,
+) -> ScalingResult:
+    seconds, peaks = [], []
+    for size in sizes:
+        elapsed, peak = measure(build(size), repeat)
+        seconds.append(elapsed)
+        peaks.append(peak)
+    return ScalingResult(name, sizes, seconds, peaks, tolerance)
+
+
+def _counting_loop(size: int, *body: Expr) -> Program:
+    i = Variable("i")
+    return Program(
+        Assign(Variable("limit"), IntLiteral(size)),
+        Assign(i, IntLiteral(0)),
+        Assign(Variable("s"), StringLiteral("")),
+        While(Lt(i, Variable("limit")), Sequence(*body, Assign(i, Add(i, IntLiteral(1))))),
+    )
+
+
+SCENARIOS: Dict[str, Callable[[int], Expr]] = {
+    # Straight-line random code with small nested loops; size is the statement count.
+    "statements": lambda size: generate_program(statements=size, loop_trips=4, seed=size),
+    # Random loop bodies; size is the trip count of every loop.
+    "loop-trips": lambda size: generate_program(
+        statements=3, max_nesting=1, loop_trips=size, statement_weights={"while": 1}, seed=1
+    ),
+    # Many variables, each read after all the others were bound.
+    "variables": lambda size: generate_program(
+        statements=size, variables=size, statement_weights={"assign": 1}, seed=size
+    ),
+    # A string that grows by a constant amount per iteration.
+    "string-growth": lambda size: _counting_loop(
+        size, Assign(Variable("s"), Add(Variable("s"), StringLiteral("abc")))
+    ),
+}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m stimpl.gen", description="Measure how the interpreter scales.")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append", help="scenario to run (default: all)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[250, 500, 1000, 2000, 4000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="exponent above 1 that is still called linear")
+    args = parser.parse_args(argv)
+
+    for name in args.scenario or sorted(SCENARIOS):
+        result = scaling_curve(name, SCENARIOS[name], args.sizes, args.repeat, args.tolerance)
+        for size, seconds, peak in zip(result.sizes, result.seconds, result.peak_bytes):
+            print(f"  {name:>14} n={size:<8} {seconds * 1000:10.2f} ms {peak / 1024:12.1f} KiB")
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
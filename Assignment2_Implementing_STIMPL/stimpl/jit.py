@@ -0,0 +1,380 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import operator
+from weakref import WeakKeyDictionary
+
+from stimpl.expression import *
+from stimpl.types import *
+import stimpl.metrics as metrics
+
+"""
+Tracing JIT for hot While loops.
+
+The interpreter counts iterations per While node. Once a loop is hot, one
+iteration (body followed by condition) is recorded against the current state:
+the types of every variable it touches and the branch every If takes. The
+recording is compiled into a specialized Python function that keeps running
+iterations until the loop exits or a guard fails. On a guard failure the
+function hands back the state at the start of the failing iteration (nothing
+from that iteration has been committed, since State is persistent and Print
+output is buffered per iteration) and the interpreter carries on with evaluate.
+A trace reports what it printed to stimpl.metrics, and on exit adds the nodes
+its completed iterations stand for, as evaluate would have counted them.
+Like the interpreter, a trace raises the interrupts queued with
+stimpl.runtime.interrupt at the end of each iteration.
+"""
+
+# Number of interpreted iterations before a While node gets traced.
+HOT_LOOP_THRESHOLD = 64
+# Number of times a loop is retraced after side exits before it is left to the interpreter.
+MAX_TRACE_ATTEMPTS = 3
+# Set to False to run every loop through the tree-walking interpreter.
+jit_enabled = True
+
+# A compiled trace takes the state at the top of an iteration and returns
+# (condition_value, state). condition_value is None on a side exit.
+Trace = Callable[[Any], Tuple[Optional[Any], Any]]
+
+_OPERATORS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+_iteration_counts: "WeakKeyDictionary[While, int]" = WeakKeyDictionary()
+_trace_attempts: "WeakKeyDictionary[While, int]" = WeakKeyDictionary()
+_traces: "WeakKeyDictionary[While, Trace]" = WeakKeyDictionary()
+# Exceptions queued by stimpl.runtime.interrupt, raised at the next loop iteration.
+pending_interrupts: List[BaseException] = []
+
+
+class TraceAbort(Exception):
+    """Raised while recording an iteration that cannot be traced."""
+
+
+class TraceRecorder(object):
+    def __init__(self, state):
+        # The state at the top of the recorded iteration. Recording never writes to it.
+        self.state = state
+        # Variables loaded from the entry state and their guarded type (None when unbound).
+        self.entry_types: Dict[str, Optional[Type]] = {}
+        # Python local name, current concrete value and type of every variable the trace touches.
+        self.locals: Dict[str, str] = {}
+        self.values: Dict[str, Any] = {}
+        self.types: Dict[str, Type] = {}
+        self.namespace: Dict[str, Any] = {}
+        self.lines: List[str] = []
+        self.prints = False
+        self.counter = 0
+        # Nodes evaluate would visit in one iteration, which is one per record call.
+        self.nodes = 0
+
+    def fresh(self, prefix: str) -> str:
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+    def constant(self, value: Any) -> str:
+        name = self.fresh("c")
+        self.namespace[name] = value
+        return name
+
+    def emit(self, code: str) -> str:
+        temp = self.fresh("t")
+        self.lines.append(f"{temp} = {code}")
+        return temp
+
+    def exit_unless(self, code: str) -> None:
+        self.lines.append(f"if not ({code}): return (None, _entry)")
+
+    def load(self, variable_name: str) -> Optional[Type]:
+        # Returns the type of the variable as the trace currently sees it, loading it from the entry state if needed.
+        if variable_name in self.types:
+            return self.types[variable_name]
+        if variable_name in self.entry_types:
+            return None
+        value = self.state.get_value(variable_name)
+        if value is None:
+            self.entry_types[variable_name] = None
+            return None
+        self.entry_types[variable_name] = value[1]
+        self.locals[variable_name] = self.fresh("v")
+        self.values[variable_name], self.types[variable_name] = value
+        return value[1]
+
+    def record(self, expression: Expr) -> Tuple[str, Any, Type]:
+        # Mirrors evaluate, returning (python code, concrete value, type) for the expression.
+        self.nodes += 1
+        match expression:
+            case Ren():
+                return ("None", None, Unit())
+
+            case IntLiteral(literal=l):
+                return (self.constant(l), l, Integer())
+
+            case FloatingPointLiteral(literal=l):
+                return (self.constant(l), l, FloatingPoint())
+
+            case StringLiteral(literal=l):
+                return (self.constant(l), l, String())
+
+            case BooleanLiteral(literal=l):
+                return (self.constant(l), l, Boolean())
+
+            case Print(to_print=to_print):
+                code, value, value_type = self.record(to_print)
+                self.prints = True
+                if value_type == Unit():
+                    self.lines.append("_out.append('Unit')")
+                else:
+                    self.lines.append(f"_out.append(f'{{{code}}}')")
+                return (code, value, value_type)
+
+            case Sequence(exprs=exprs) | Program(exprs=exprs):
+                result = ("None", None, Unit())
+                for expr in exprs:
+                    result = self.record(expr)
+                return result
+
+            case Variable(variable_name=variable_name):
+                if self.load(variable_name) is None:
+                    raise TraceAbort(f"{variable_name} is read before assignment")
+                # Copy into a temporary so a later Assign in the same expression cannot change what was read.
+                return (
+                    self.emit(self.locals[variable_name]),
+                    self.values[variable_name],
+                    self.types[variable_name],
+                )
+
+            case Assign(variable=variable, value=value):
+                code, value_result, value_type = self.record(value)
+                name = variable.variable_name
+                variable_type = self.load(name)
+                if variable_type is not None and variable_type != value_type:
+                    raise TraceAbort(f"cannot assign {value_type} to {variable_type}")
+                if name not in self.locals:
+                    self.locals[name] = self.fresh("v")
+                self.values[name], self.types[name] = value_result, value_type
+                local = self.locals[name]
+                self.lines.append(f"{local} = {code}")
+                self.lines.append(
+                    f"state = state.set_value({name!r}, {local}, {self.constant(value_type)})"
+                )
+                return (code, value_result, value_type)
+
+            case Add(left=left, right=right):
+                return self.record_arithmetic(
+                    "+", left, right, (Integer(), String(), FloatingPoint())
+                )
+
+            case Subtract(left=left, right=right):
+                return self.record_arithmetic(
+                    "-", left, right, (Integer(), FloatingPoint())
+                )
+
+            case Multiply(left=left, right=right):
+                return self.record_arithmetic(
+                    "*", left, right, (Integer(), FloatingPoint())
+                )
+
+            case Divide(left=left, right=right):
+                left_code, left_value, left_type, right_code, right_value, _ = (
+                    self.record_operands(left, right, (Integer(), FloatingPoint()))
+                )
+                # A zero divisor leaves the iteration to the interpreter, which raises the error.
+                self.exit_unless(f"{right_code} != 0")
+                if right_value == 0:
+                    raise TraceAbort("division by zero")
+                if left_type == Integer():
+                    code, value = f"{left_code} // {right_code}", left_value // right_value
+                else:
+                    code, value = f"{left_code} / {right_code}", left_value / right_value
+                return (self.emit(code), value, left_type)
+
+            case And(left=left, right=right):
+                left_code, left_value, _, right_code, right_value, _ = (
+                    self.record_operands(left, right, (Boolean(),))
+                )
+                return (
+                    self.emit(f"{left_code} and {right_code}"),
+                    left_value and right_value,
+                    Boolean(),
+                )
+
+            case Or(left=left, right=right):
+                left_code, left_value, _, right_code, right_value, _ = (
+                    self.record_operands(left, right, (Boolean(),))
+                )
+                return (
+                    self.emit(f"{left_code} or {right_code}"),
+                    left_value or right_value,
+                    Boolean(),
+                )
+
+            case Not(expr=expr):
+                code, value, value_type = self.record(expr)
+                if value_type != Boolean():
+                    raise TraceAbort("not on a non-boolean operand")
+                return (self.emit(f"not {code}"), not value, Boolean())
+
+            case If(condition=condition, true=true, false=false):
+                code, value, value_type = self.record(condition)
+                if value_type != Boolean():
+                    raise TraceAbort("if on a non-boolean condition")
+                # Only the branch taken while recording is compiled; the other one is a side exit.
+                if value:
+                    self.exit_unless(code)
+                    return self.record(true)
+                self.exit_unless(f"not {code}")
+                return self.record(false)
+
+            case Lt(left=left, right=right):
+                return self.record_comparison("<", False, left, right)
+
+            case Lte(left=left, right=right):
+                return self.record_comparison("<=", True, left, right)
+
+            case Gt(left=left, right=right):
+                return self.record_comparison(">", False, left, right)
+
+            case Gte(left=left, right=right):
+                return self.record_comparison(">=", True, left, right)
+
+            case Eq(left=left, right=right):
+                return self.record_comparison("==", True, left, right)
+
+            case Ne(left=left, right=right):
+                return self.record_comparison("!=", False, left, right)
+
+            case Lazy():
+                return self.record(expression.force())
+
+            case _:
+                # Nested loops get their own trace once they are hot.
+                raise TraceAbort(f"cannot trace {type(expression).__name__}")
+
+    def record_operands(self, left, right, allowed_types):
+        left_code, left_value, left_type = self.record(left)
+        right_code, right_value, right_type = self.record(right)
+        if left_type != right_type or left_type not in allowed_types:
+            raise TraceAbort(f"mismatched operands {left_type} and {right_type}")
+        return (left_code, left_value, left_type, right_code, right_value, right_type)
+
+    def record_arithmetic(self, operator, left, right, allowed_types):
+        left_code, left_value, left_type, right_code, right_value, _ = (
+            self.record_operands(left, right, allowed_types)
+        )
+        code = f"{left_code} {operator} {right_code}"
+        value = _OPERATORS[operator](left_value, right_value)
+        return (self.emit(code), value, left_type)
+
+    def record_comparison(self, operator, unit_result, left, right):
+        left_code, left_value, left_type, right_code, right_value, _ = (
+            self.record_operands(
+                left, right, (Integer(), Boolean(), String(), FloatingPoint(), Unit())
+            )
+        )
+        if left_type == Unit():
+            return (self.constant(unit_result), unit_result, Boolean())
+        code = f"{left_code} {operator} {right_code}"
+        value = _OPERATORS[operator](left_value, right_value)
+        return (self.emit(code), value, Boolean())
+
+    def compile(self, loop: While) -> Trace:
+        iteration = self.lines
+        self.lines = []
+        condition_code, _, condition_type = self.record(loop.condition)
+        if condition_type != Boolean():
+            raise TraceAbort("while on a non-boolean condition")
+        iteration += self.lines
+
+        source = ["def _trace(state):"]
+        # Guard the types of everything the trace reads from the entry state.
+        for name, entry_type in self.entry_types.items():
+            if entry_type is None:
+                source.append(f"    if state.get_value({name!r}) is not None: return (None, state)")
+                continue
+            local = self.locals[name]
+            source.append(f"    {local}, _type = state.get_value({name!r}) or (None, None)")
+            source.append(
+                f"    if type(_type) is not {type(entry_type).__name__}: return (None, state)"
+            )
+        source.append("    _iterations = 0")
+        source.append("    try:")
+        source.append("        while True:")
+        source.append("            _entry = state")
+        if self.prints:
+            source.append("            _out = []")
+        source += ["            " + line for line in iteration]
+        if self.prints:
+            source.append("            for _line in _out:")
+            source.append("                print(_line)")
+            source.append("                _printed(_line)")
+        source.append("            _iterations += 1")
+        source.append("            if _interrupts: raise _interrupts.pop(0)")
+        source.append(f"            if not {condition_code}: return ({condition_code}, state)")
+        # A side exit leaves its iteration to the interpreter, which counts it itself.
+        source.append("    finally:")
+        source.append(f"        _evaluated(_iterations * {self.nodes})")
+
+        namespace = dict(self.namespace)
+        namespace.update(
+            Unit=Unit,
+            Integer=Integer,
+            FloatingPoint=FloatingPoint,
+            String=String,
+            Boolean=Boolean,
+            _printed=metrics.printed,
+            _evaluated=metrics.evaluated,
+            _interrupts=pending_interrupts,
+        )
+        exec("\n".join(source), namespace)
+        return namespace["_trace"]
+
+
+def record_trace(loop: While, state) -> Optional[Trace]:
+    """Records one iteration of `loop` starting from `state` and compiles it. Returns None if the iteration cannot be traced."""
+    recorder = TraceRecorder(state)
+    try:
+        recorder.record(loop.body)
+        return recorder.compile(loop)
+    except TraceAbort:
+        return None
+
+
+def hot_trace(loop: While, state) -> Optional[Trace]:
+    """Counts one interpreted iteration of `loop` and returns its compiled trace once the loop is hot."""
+    trace = _traces.get(loop)
+    if trace is not None:
+        return trace
+    attempts = _trace_attempts.get(loop, 0)
+    if attempts >= MAX_TRACE_ATTEMPTS:
+        return None
+    count = _iteration_counts.get(loop, 0) + 1
+    if count < HOT_LOOP_THRESHOLD:
+        _iteration_counts[loop] = count
+        return None
+    _iteration_counts[loop] = 0
+    _trace_attempts[loop] = attempts + 1
+    trace = record_trace(loop, state)
+    if trace is None:
+        # Untraceable loops stay in the interpreter for good.
+        _trace_attempts[loop] = MAX_TRACE_ATTEMPTS
+    else:
+        _traces[loop] = trace
+    return trace
+
+
+def side_exit(loop: While) -> None:
+    """Drops the trace of `loop` after a guard failed so it can be retraced once it is hot again."""
+    _traces.pop(loop, None)
+
+
+def reset_traces() -> None:
+    _iteration_counts.clear()
+    _trace_attempts.clear()
+    _traces.clear()
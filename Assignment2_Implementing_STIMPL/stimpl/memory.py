@@ -0,0 +1,196 @@
+import sys
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Set, TextIO, Union
+
+from stimpl.expression import *
+from stimpl.runtime import EmptyState, State
+
+"""
+Memory accounting.
+
+run_stimpl(program, memory_report=True) runs the program under tracemalloc
+and writes a MemoryReport to stderr afterwards, even if the run fails (the
+program's own output stays alone on stdout). memory_report can also be a
+text stream to write the report to, or a function that is handed the
+MemoryReport object. tracemalloc only records one frame per
+allocation, so the run itself stays reasonably fast; everything else is
+counted once, at the end, by walking the program and the final State chain:
+
+    AST     number of nodes and the bytes they hold, including literals
+    State   number of bindings in the chain, how many of them are shadowed
+            (every reassignment keeps the old binding alive) and the bytes
+            held by string values
+    history per variable: how many bindings it has and the bytes of its
+            live value and of its whole history
+
+Object sizes are shallow sys.getsizeof sizes; values shared by several
+bindings are only counted once.
+
+Inside a tracemalloc session the caller already started, the peak is not
+reset, so the caller's own peak survives the run. The peak of the run is
+then only known exactly if it went past the caller's earlier peak;
+otherwise the report gives the earlier peak as an upper bound ("at most").
+Peak and retained bytes are relative to the memory traced when the run
+started.
+"""
+
+
+def _object_bytes(value: Any) -> int:
+    size = sys.getsizeof(value)
+    attributes = getattr(value, "__dict__", None)
+    if attributes is not None:
+        size += sys.getsizeof(attributes)
+    return size
+
+
+class MemoryTracker(object):
+    """Measures the peak and retained traced memory of the code run inside it.
+
+    An outer tracemalloc session is left as it is, peak included, so peak_bytes
+    is an upper bound unless peak_exact is set.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.baseline = 0
+        self.earlier_peak = 0
+        self.peak_bytes = 0
+        self.peak_exact = True
+        self.retained_bytes = 0
+
+    def __enter__(self) -> "MemoryTracker":
+        # Nest inside an outer tracemalloc session instead of stopping it on exit.
+        self.started = not tracemalloc.is_tracing()
+        if self.started:
+            tracemalloc.start()
+        self.baseline, self.earlier_peak = tracemalloc.get_traced_memory()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        if self.started:
+            tracemalloc.stop()
+        # A peak that did not move may have been reached before the tracker was entered.
+        self.peak_exact = self.started or peak > self.earlier_peak
+        self.peak_bytes = max(peak - self.baseline, 0)
+        self.retained_bytes = max(current - self.baseline, 0)
+
+
+class VariableHistory(object):
+    def __init__(self, name: str):
+        self.name = name
+        # Bindings of the variable in the chain, the live one included.
+        self.bindings = 0
+        self.live_bytes = 0
+        self.history_bytes = 0
+
+    @property
+    def shadowed(self) -> int:
+        return self.bindings - 1
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.name}: {self.bindings} bindings, "
+            f"{self.live_bytes} bytes live, {self.history_bytes} bytes in history"
+        )
+
+
+class MemoryReport(object):
+    def __init__(
+        self,
+        program: Expr,
+        state: State,
+        peak_bytes: int = 0,
+        retained_bytes: int = 0,
+        error: Optional[BaseException] = None,
+        peak_exact: bool = True,
+    ):
+        self.peak_bytes = peak_bytes
+        # False when peak_bytes is only an upper bound (see MemoryTracker).
+        self.peak_exact = peak_exact
+        self.retained_bytes = retained_bytes
+        # The error that ended the run, if it failed; the state is then empty.
+        self.error = error
+
+        self.ast_nodes = 0
+        self.ast_bytes = 0
+        self.largest_literal_bytes = 0
+        for node in walk(program):
+            self.ast_nodes += 1
+            self.ast_bytes += _object_bytes(node)
+            if isinstance(node, Literal):
+                literal_bytes = sys.getsizeof(node.literal)
+                self.ast_bytes += literal_bytes
+                self.largest_literal_bytes = max(self.largest_literal_bytes, literal_bytes)
+
+        self.state_nodes = 0
+        self.state_bytes = 0
+        self.string_bytes = 0
+        self.variables: Dict[str, VariableHistory] = {}
+        counted: Set[int] = set()
+        # Newest first, so the first binding seen for a variable is its live one.
+        while not isinstance(state, EmptyState):
+            variable_value, _ = state.value
+            value_bytes = 0
+            if id(variable_value) not in counted:
+                counted.add(id(variable_value))
+                value_bytes = sys.getsizeof(variable_value)
+                if isinstance(variable_value, str):
+                    self.string_bytes += value_bytes
+            self.state_nodes += 1
+            self.state_bytes += _object_bytes(state) + sys.getsizeof(state.value) + value_bytes
+            history = self.variables.get(state.variable_name)
+            if history is None:
+                history = self.variables[state.variable_name] = VariableHistory(state.variable_name)
+                history.live_bytes = sys.getsizeof(variable_value)
+            history.bindings += 1
+            history.history_bytes += value_bytes
+            state = state.next_state
+
+    @property
+    def shadowed_bindings(self) -> int:
+        return self.state_nodes - len(self.variables)
+
+    def largest_variables(self, count: int = 5) -> List[VariableHistory]:
+        return sorted(self.variables.values(), key=lambda history: history.history_bytes, reverse=True)[:count]
+
+    def __str__(self) -> str:
+        lines = [
+            f"peak: {'' if self.peak_exact else 'at most '}{self.peak_bytes} bytes, retained: {self.retained_bytes} bytes",
+            f"ast: {self.ast_nodes} nodes, {self.ast_bytes} bytes (largest literal {self.largest_literal_bytes} bytes)",
+            f"state: {self.state_nodes} bindings ({self.shadowed_bindings} shadowed), "
+            f"{self.state_bytes} bytes ({self.string_bytes} in strings)",
+        ]
+        lines.extend(f"  {history}" for history in self.largest_variables())
+        if self.error is not None:
+            lines.append(f"failed: {type(self.error).__name__}: {self.error}")
+        return "\n".join(lines)
+
+
+class MemoryReporter(object):
+    """Measures a run like MemoryTracker and reports it on exit, whether or not the run failed.
+
+    `sink` is True for stderr, a text stream, or a function called with the MemoryReport.
+    Set `state` to the final state of the run before exiting.
+    """
+
+    def __init__(self, program: Expr, sink: Union[bool, TextIO, Callable[[MemoryReport], Any]]):
+        self.program = program
+        self.sink = sink
+        self.state: State = EmptyState()
+        self.tracker = MemoryTracker()
+
+    def __enter__(self) -> "MemoryReporter":
+        self.tracker.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.tracker.__exit__(exc_type, exc, traceback)
+        report = MemoryReport(
+            self.program, self.state, self.tracker.peak_bytes, self.tracker.retained_bytes, exc, self.tracker.peak_exact
+        )
+        if callable(self.sink):
+            self.sink(report)
+        else:
+            stream = sys.stderr if self.sink is True else self.sink
+            stream.write(f"{report}\n")
@@ -0,0 +1,272 @@
+import bisect
+import io
+import itertools
+import math
+import os
+import threading
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, TextIO, Tuple
+
+"""
+Interpreter metrics.
+
+run_stimpl records how many runs started and finished, the errors that
+ended runs (by exception class), the depth of the final State, the bytes
+written by Print and a histogram of run latencies. evaluate counts the nodes
+it evaluates, and a compiled JIT trace adds the nodes of the iterations it
+ran when it exits. The batch scheduler and the server add up what their worker
+processes recorded.
+
+Every thread records into its own Metrics object without taking a lock;
+snapshot() adds them up when someone asks. When a thread ends, its Metrics
+are folded into a process-wide total. The node count is a single C-level
+counter for the whole process, which is atomic under the GIL and cheaper
+to bump than a thread's Metrics. Metrics are read in the
+Prometheus text format, either over HTTP from a MetricsExporter:
+
+    exporter = MetricsExporter(port=9464)   # GET http://127.0.0.1:9464/metrics
+
+or from a file rewritten with write_metrics_file(), for scrapers that
+collect text files.
+"""
+
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, math.inf)
+DEPTH_BUCKETS = (1, 4, 16, 64, 256, 1024, 4096, 16384, 65536, math.inf)
+
+
+class Histogram(object):
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def add(self, other: "Histogram", sign: int = 1) -> None:
+        for index, count in enumerate(other.counts):
+            self.counts[index] += sign * count
+        self.sum += sign * other.sum
+        self.count += sign * other.count
+
+
+class Metrics(object):
+    def __init__(self):
+        self.runs_started = 0
+        self.runs_finished = 0
+        self.errors: Dict[str, int] = {}
+        self.evaluated_nodes = 0
+        self.print_bytes = 0
+        self.state_depth = Histogram(DEPTH_BUCKETS)
+        self.latency = Histogram(LATENCY_BUCKETS)
+
+    def add(self, other: "Metrics", sign: int = 1) -> None:
+        self.runs_started += sign * other.runs_started
+        self.runs_finished += sign * other.runs_finished
+        # Copied first, since the owning thread may add an error type meanwhile.
+        for name, count in dict(other.errors).items():
+            self.errors[name] = self.errors.get(name, 0) + sign * count
+            if not self.errors[name]:
+                del self.errors[name]
+        self.evaluated_nodes += sign * other.evaluated_nodes
+        self.print_bytes += sign * other.print_bytes
+        self.state_depth.add(other.state_depth, sign)
+        self.latency.add(other.latency, sign)
+
+    def __sub__(self, other: "Metrics") -> "Metrics":
+        difference = Metrics()
+        difference.add(self)
+        difference.add(other, -1)
+        return difference
+
+
+_local = threading.local()
+# Metrics of the threads that are still running, and the sum of those of the threads that ended.
+_registered: List[Metrics] = []
+_finished = Metrics()
+# Reentrant, since a thread's finalizer can run from a garbage collection started while it is held.
+_register_lock = threading.RLock()
+
+# Bumped by evaluate for every node; read with _counted_nodes().
+count_node = itertools.count().__next__
+_node_reads = 0
+
+
+class _Registration(object):
+    """Only referenced from the thread-local of its thread, so it is collected when the thread ends."""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+
+def _retire(metrics: Metrics) -> None:
+    with _register_lock:
+        _registered.remove(metrics)
+        _finished.add(metrics)
+
+
+def _counted_nodes() -> int:
+    # Reading the counter bumps it as well, so the reads so far are taken off.
+    global _node_reads
+    with _register_lock:
+        count = count_node() - _node_reads
+        _node_reads += 1
+    return count
+
+
+def local_metrics() -> Metrics:
+    """The Metrics object of the calling thread, which only that thread writes to."""
+    try:
+        return _local.metrics
+    except AttributeError:
+        metrics = _local.metrics = Metrics()
+        _local.registration = registration = _Registration(metrics)
+        with _register_lock:
+            _registered.append(metrics)
+        weakref.finalize(registration, _retire, metrics)
+        return metrics
+
+
+def snapshot() -> Metrics:
+    """Adds up what every thread recorded so far."""
+    total = Metrics()
+    with _register_lock:
+        registered = list(_registered)
+        total.add(_finished)
+        total.evaluated_nodes += _counted_nodes()
+    for metrics in registered:
+        total.add(metrics)
+    return total
+
+
+def merge(metrics: Metrics) -> None:
+    """Adds metrics recorded elsewhere, e.g. in a worker process, to this process."""
+    local_metrics().add(metrics)
+
+
+def reset() -> None:
+    with _register_lock:
+        for metrics in _registered:
+            metrics.__init__()
+        _finished.__init__()
+        _finished.evaluated_nodes = -_counted_nodes()
+
+
+"""
+Recording.
+"""
+
+
+def run_started() -> None:
+    local_metrics().runs_started += 1
+
+
+def run_finished(state_depth: int, elapsed: float) -> None:
+    metrics = local_metrics()
+    metrics.runs_finished += 1
+    metrics.state_depth.observe(state_depth)
+    metrics.latency.observe(elapsed)
+
+
+def run_failed(error: BaseException, elapsed: float) -> None:
+    metrics = local_metrics()
+    name = type(error).__name__
+    metrics.errors[name] = metrics.errors.get(name, 0) + 1
+    metrics.latency.observe(elapsed)
+
+
+def evaluated(nodes: int) -> None:
+    # For nodes that were not run by evaluate, such as the iterations of a compiled JIT trace.
+    local_metrics().evaluated_nodes += nodes
+
+
+def printed(text: str) -> None:
+    # Print writes the text and a newline.
+    local_metrics().print_bytes += len(text.encode()) + 1
+
+
+"""
+Exporting.
+"""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _write_histogram(stream: TextIO, name: str, help: str, histogram: Histogram) -> None:
+    stream.write(f"# HELP {name} {help}\n# TYPE {name} histogram\n")
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        stream.write(f'{name}_bucket{{le="{_number(bound)}"}} {cumulative}\n')
+    stream.write(f"{name}_sum {_number(histogram.sum)}\n{name}_count {histogram.count}\n")
+
+
+def write_metrics(stream: TextIO, metrics: Optional[Metrics] = None) -> None:
+    """Writes `metrics` (by default, everything recorded in this process) in the Prometheus text format."""
+    metrics = metrics if metrics is not None else snapshot()
+    counters = (
+        ("stimpl_runs_started_total", "Runs started by run_stimpl.", metrics.runs_started),
+        ("stimpl_runs_finished_total", "Runs that returned a value.", metrics.runs_finished),
+        ("stimpl_evaluated_nodes_total", "Nodes evaluated by the interpreter, including those of compiled loop iterations.", metrics.evaluated_nodes),
+        ("stimpl_print_bytes_total", "Bytes written by Print.", metrics.print_bytes),
+    )
+    for name, help, value in counters:
+        stream.write(f"# HELP {name} {help}\n# TYPE {name} counter\n{name} {value}\n")
+    stream.write("# HELP stimpl_errors_total Runs ended by an error, by error type.\n# TYPE stimpl_errors_total counter\n")
+    for error, count in sorted(metrics.errors.items()):
+        stream.write(f'stimpl_errors_total{{type="{error}"}} {count}\n')
+    _write_histogram(stream, "stimpl_state_depth", "Bindings in the final State of finished runs.", metrics.state_depth)
+    _write_histogram(stream, "stimpl_run_seconds", "Run latency in seconds.", metrics.latency)
+
+
+def write_metrics_file(path: str) -> None:
+    """Rewrites `path` with the current metrics; readers never see a partial file."""
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as f:
+        write_metrics(f)
+    os.replace(temporary_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        text = io.StringIO()
+        write_metrics(text)
+        body = text.getvalue().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class MetricsExporter(object):
+    """Serves the metrics of this process over HTTP from a background thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="stimpl-metrics", daemon=True)
+        self.thread.start()
+
+    def __enter__(self) -> "MetricsExporter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
@@ -0,0 +1,253 @@
+import heapq
+import io
+import math
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from contextlib import redirect_stdout
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence as SequenceType, Tuple
+
+from stimpl.expression import *
+from stimpl.runtime import EmptyState, print_debug, run_stimpl, state_bindings, state_from_bindings
+import stimpl.runtime as runtime
+from stimpl.types import *
+
+"""
+Dependency analysis and parallel execution of top-level expressions.
+
+Two top-level expressions of a Program depend on each other when they touch
+a common variable. Expressions that are connected through dependencies form
+a segment, and separate segments can run in any order, or at the same time,
+without changing their results. run_stimpl_parallel packs the segments into
+one chunk per worker process, balanced by their estimated cost (see
+stimpl.cost), so that many small segments do not each pay for a round trip
+to a worker. It then merges the results back in program order: the bindings
+and the output of every top-level expression are replayed in the order the
+expressions appear in the program, so the final state and the printed
+output are exactly those of run_stimpl. When several segments fail, the
+error of the expression that comes first in the program is raised, after
+the output printed before it. Once an expression fails, nothing that comes
+after it in the program is waited for: chunks that only hold later
+expressions are cancelled, and workers still running them are stopped (or,
+for a caller's executor, left to finish in the background), so a later
+segment that never ends cannot hang a run that run_stimpl would have failed.
+"""
+
+
+def _accesses(expression: Expr, load: bool) -> Tuple[FrozenSet[str], FrozenSet[str], bool]:
+    # The flag is set when an unloaded Lazy subtree was left out, so the sets may be incomplete.
+    reads, writes = set(), set()
+    opaque = False
+    stack = [expression]
+    while stack:
+        node = stack.pop()
+        match node:
+            case Assign(variable=variable, value=value):
+                # The target is not a read, but the same Variable object may be read elsewhere, so only the value is walked.
+                writes.add(variable.variable_name)
+                stack.append(value)
+                continue
+            case Variable(variable_name=variable_name):
+                reads.add(variable_name)
+            case Lazy(node=None):
+                if load:
+                    stack.append(node.force())
+                else:
+                    opaque = True
+                continue
+        stack.extend(reversed(children(node)))
+    return frozenset(reads), frozenset(writes), opaque
+
+
+def read_write_sets(expression: Expr, load: bool = False) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """Returns (names read, names assigned) anywhere inside `expression`.
+
+    Lazy subtrees that are not loaded yet are left out unless `load` is set.
+    """
+    reads, writes, _ = _accesses(expression, load)
+    return reads, writes
+
+
+def partition(exprs: SequenceType[Expr]) -> List[List[int]]:
+    """Splits the indices of `exprs` into independent segments, ordered by their first index.
+
+    An expression holding a Lazy subtree that is not loaded yet could touch any
+    variable, so it shares a segment with every other expression.
+    """
+    parents = list(range(len(exprs)))
+
+    def find(index: int) -> int:
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    def join(first: int, second: int) -> None:
+        root, other = find(first), find(second)
+        if root != other:
+            parents[max(root, other)] = min(root, other)
+
+    # Every variable belongs to the segment of the first expression that touched it.
+    owners: Dict[str, int] = {}
+    opaque: Optional[int] = None
+    for index, expr in enumerate(exprs):
+        reads, writes, unloaded = _accesses(expr, False)
+        for name in reads | writes:
+            join(owners.setdefault(name, index), index)
+        if unloaded:
+            opaque = index
+    if opaque is not None:
+        for index in range(len(exprs)):
+            join(opaque, index)
+
+    segments: Dict[int, List[int]] = {}
+    for index in range(len(exprs)):
+        segments.setdefault(find(index), []).append(index)
+    return list(segments.values())
+
+
+class SegmentResult(object):
+    def __init__(self):
+        # (index, bindings added by the expression, output it printed) in program order.
+        self.steps: List[Tuple[int, list, str]] = []
+        self.value: Any = None
+        self.value_type: Type = Unit()
+        self.error: Optional[Tuple[int, BaseException]] = None
+
+
+def run_segment(exprs: List[Tuple[int, Expr]], stop_after: float = math.inf) -> SegmentResult:
+    """Runs the (index, expression) pairs of one segment from an empty state, up to index `stop_after`."""
+    result = SegmentResult()
+    state = EmptyState()
+    bound = 0
+    for index, expr in exprs:
+        if index > stop_after:
+            break
+        output = io.StringIO()
+        try:
+            with redirect_stdout(output):
+                result.value, result.value_type, state = runtime.evaluate(expr, state)
+        except Exception as e:
+            result.steps.append((index, [], output.getvalue()))
+            result.error = (index, e)
+            break
+        bindings = state_bindings(state)
+        result.steps.append((index, bindings[bound:], output.getvalue()))
+        bound = len(bindings)
+    return result
+
+
+def run_segments(segments: List[List[Tuple[int, Expr]]]) -> List[SegmentResult]:
+    """Runs a chunk of segments in program order, skipping whatever comes after the first error."""
+    results = []
+    stop_after = math.inf
+    for segment in sorted(segments, key=lambda segment: segment[0][0]):
+        if segment[0][0] > stop_after:
+            break
+        result = run_segment(segment, stop_after)
+        results.append(result)
+        if result.error is not None:
+            stop_after = min(stop_after, result.error[0])
+    return results
+
+
+def pack(segments: List[List[Tuple[int, Expr]]], chunks: int) -> List[List[List[Tuple[int, Expr]]]]:
+    """Packs segments into at most `chunks` chunks of about the same estimated cost, most expensive first."""
+    # Imported here since stimpl.cost imports this module.
+    from stimpl.cost import estimate_cost
+
+    costs = [estimate_cost(Program(*(expr for _, expr in segment))).work for segment in segments]
+    # (work so far, chunk number) of every chunk; each segment goes to the least loaded one.
+    loads = [(0.0, number) for number in range(min(chunks, len(segments)))]
+    packed: List[List[List[Tuple[int, Expr]]]] = [[] for _ in loads]
+    for cost, segment in sorted(zip(costs, segments), key=lambda pair: pair[0], reverse=True):
+        work, number = heapq.heappop(loads)
+        packed[number].append(segment)
+        heapq.heappush(loads, (work + cost, number))
+    return packed
+
+
+def _stop_workers(pool: ProcessPoolExecutor) -> None:
+    # ProcessPoolExecutor has no public way to stop a worker in the middle of a job (before Python 3.14).
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.terminate()
+    pool.shutdown(cancel_futures=True)
+
+
+def _run_chunks(executor: Executor, chunks: List[List[List[Tuple[int, Expr]]]]) -> Tuple[List[SegmentResult], bool]:
+    """Runs the chunks and returns their results, and whether some chunk was left running after an error."""
+    starts = [min(segment[0][0] for segment in chunk) for chunk in chunks]
+    # Chunks are submitted in program order, so that a busy executor gets to the earlier expressions first.
+    futures: Dict[Future, int] = {
+        executor.submit(run_segments, chunk): start for start, chunk in sorted(zip(starts, chunks), key=lambda pair: pair[0])
+    }
+    results: List[SegmentResult] = []
+    first_error = math.inf
+    abandoned = False
+    pending = set(futures)
+    while pending:
+        # Only the chunks that hold an expression before the first error so far are still needed.
+        needed = {future for future in pending if futures[future] < first_error}
+        for future in pending - needed:
+            future.cancel()
+        abandoned = abandoned or any(not future.done() for future in pending - needed)
+        pending = needed
+        if not pending:
+            break
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            for result in future.result():
+                results.append(result)
+                if result.error is not None:
+                    first_error = min(first_error, result.error[0])
+    return results, abandoned
+
+
+def run_stimpl_parallel(program: Expr, workers: Optional[int] = None, executor: Optional[Executor] = None, debug=False):
+    """Runs `program` like run_stimpl, with its independent segments on separate processes.
+
+    Pass an `executor` to reuse a pool across runs; otherwise a pool of `workers`
+    processes (by default one per CPU) is started for this run. Either way, the
+    segments are packed into `workers` chunks.
+    """
+    exprs = program.exprs if isinstance(program, Program) else (program,)
+    segments = partition(exprs)
+    if len(segments) < 2:
+        return run_stimpl(program, debug)
+
+    jobs = [[(index, exprs[index]) for index in segment] for segment in segments]
+    chunks = pack(jobs, workers or os.cpu_count() or 1)
+    if executor is None:
+        pool = ProcessPoolExecutor(len(chunks))
+        abandoned = True
+        try:
+            results, abandoned = _run_chunks(pool, chunks)
+        finally:
+            if abandoned:
+                _stop_workers(pool)
+            else:
+                pool.shutdown()
+    else:
+        results, _ = _run_chunks(executor, chunks)
+
+    errors = [result.error for result in results if result.error is not None]
+    first_error = min(errors, key=lambda error: error[0]) if errors else None
+    last_index = len(exprs) - 1 if first_error is None else first_error[0]
+
+    steps = sorted((step for result in results for step in result.steps), key=lambda step: step[0])
+    bindings = []
+    for index, new_bindings, output in steps:
+        if index > last_index:
+            break
+        sys.stdout.write(output)
+        bindings.extend(new_bindings)
+    if first_error is not None:
+        raise first_error[1]
+
+    last = next(result for result in results if result.steps and result.steps[-1][0] == last_index)
+    program_value, program_type, program_state = last.value, last.value_type, state_from_bindings(bindings)
+
+    if debug:
+        print_debug(program, program_value, program_type, program_state)
+
+    return program_value, program_type, program_state
@@ -0,0 +1,179 @@
+import argparse
+import io
+import signal
+import sys
+import threading
+import weakref
+from collections import Counter
+from contextlib import redirect_stdout
+from typing import Dict, List, Optional, TextIO, Tuple
+
+from stimpl.expression import *
+from stimpl.serialize import program_from_json
+import stimpl.runtime as runtime
+
+"""
+Sampling profiler.
+
+While a Profiler is running, the Python stack of the interpreter is sampled
+every `interval` seconds of CPU time (with SIGPROF), or of wall time from a
+background thread when the profiled code does not run on the main thread.
+Each evaluate frame on the sampled stack is mapped to the STIMPL node it is
+evaluating, so a sample reads like
+
+    Program > While#3 > Sequence > Assign(j) > Add
+
+where If and While nodes carry their pre-order index in the program (the
+node ids of stimpl.replay, including its numbering of lazy subtrees) and Assign and Variable nodes their variable.
+Samples taken while a loop runs through its compiled JIT trace end in
+[jit]. Nothing is done between samples, so the overhead only depends on the
+sampling rate. Samples are labelled when they are taken and only their
+labels are kept, so a long profile does not keep old programs alive.
+
+    python -m stimpl.profiler program.json --output program.folded
+
+writes the samples in the collapsed-stack format read by flamegraph.pl and
+speedscope.
+"""
+
+_RUNTIME_FILE = runtime.__file__
+_JIT_MARKER = "[jit]"
+
+
+def _is_evaluate(code) -> bool:
+    return code.co_name == "evaluate" and code.co_filename == _RUNTIME_FILE
+
+
+class Profiler(object):
+    def __init__(self, interval: float = 0.005, use_signal: Optional[bool] = None):
+        self.interval = interval
+        # SIGPROF only works when the profiled code runs on the main thread.
+        self.use_signal = use_signal
+        # Samples per stack of node labels, outermost first.
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self.thread_id: Optional[int] = None
+        self.previous_handler = None
+        self.sampler: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+        # Pre-order ids of the nodes of every sampled program, by its root.
+        self.node_ids: "weakref.WeakKeyDictionary[Expr, Dict[int, int]]" = weakref.WeakKeyDictionary()
+
+    def __enter__(self) -> "Profiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self.thread_id = threading.get_ident()
+        use_signal = self.use_signal
+        if use_signal is None:
+            use_signal = threading.current_thread() is threading.main_thread()
+        self.stopped.clear()
+        if use_signal:
+            self.previous_handler = signal.signal(signal.SIGPROF, self._on_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self.sampler = threading.Thread(target=self._sample_loop, name="stimpl-profiler", daemon=True)
+            self.sampler.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.sampler is not None:
+            self.sampler.join()
+            self.sampler = None
+        else:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self.previous_handler or signal.SIG_DFL)
+
+    def _on_signal(self, signum, frame) -> None:
+        self.sample(frame)
+
+    def _sample_loop(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.sample(frame)
+
+    def sample(self, frame) -> None:
+        nodes = []
+        jit = False
+        while frame is not None:
+            code = frame.f_code
+            if _is_evaluate(code):
+                expression = frame.f_locals.get("expression")
+                if expression is not None:
+                    nodes.append(expression)
+            elif not nodes and code.co_name == "_trace":
+                jit = True
+            frame = frame.f_back
+        if not nodes:
+            return
+        root = nodes[-1]
+        labels = [self.label(node, root) for node in reversed(nodes)]
+        if jit:
+            labels.append(_JIT_MARKER)
+        self.counts[tuple(labels)] += 1
+        self.samples += 1
+
+    def label(self, node: Expr, root: Expr) -> str:
+        match node:
+            case Assign(variable=variable):
+                return f"Assign({variable.variable_name})"
+            case Variable(variable_name=variable_name):
+                return f"Variable({variable_name})"
+            case If() | While():
+                ids = self.node_ids.get(root)
+                if ids is None:
+                    ids = self.node_ids[root] = {id(node): index for index, node in enumerate(walk(root))}
+                if id(node) not in ids:
+                    self.number_loaded(root, ids)
+                return f"{type(node).__name__}#{ids.get(id(node), '?')}"
+            case _:
+                return type(node).__name__
+
+    def number_loaded(self, root: Expr, ids: Dict[int, int]) -> None:
+        # Lazy subtrees loaded since root was numbered go after it in pre-order, like in a trace.
+        for node in walk(root):
+            if type(node) is Lazy and node.node is not None and id(node.node) not in ids:
+                for index, loaded in enumerate(walk(node.node), len(ids)):
+                    ids[id(loaded)] = index
+
+    def top(self, count: int = 10) -> List[Tuple[str, int]]:
+        """The most sampled node stacks, as ("Program > While#3 > ...", samples)."""
+        return [(" > ".join(labels), samples) for labels, samples in self.counts.most_common(count)]
+
+    def write_collapsed(self, stream: TextIO) -> None:
+        """Writes one "frame;frame;frame samples" line per sampled stack."""
+        folded: Counter = Counter()
+        for labels, samples in self.counts.items():
+            folded[";".join(label.replace(";", ":") for label in labels)] += samples
+        for stack, samples in sorted(folded.items()):
+            stream.write(f"{stack} {samples}\n")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m stimpl.profiler", description="Profile a serialized STIMPL program.")
+    parser.add_argument("program", help="program serialized with stimpl.serialize.program_to_json")
+    parser.add_argument("--interval", type=float, default=0.001, help="sampling interval in seconds of CPU time")
+    parser.add_argument("--output", default=None, help="write collapsed stacks here (default: print the top stacks)")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    with open(args.program) as f:
+        program = program_from_json(f.read())
+    profiler = Profiler(args.interval)
+    with profiler, redirect_stdout(io.StringIO()):
+        runtime.run_stimpl(program)
+    if args.output:
+        with open(args.output, "w") as f:
+            profiler.write_collapsed(f)
+    print(f"{profiler.samples} samples")
+    for stack, samples in profiler.top(args.top):
+        print(f"{samples:8} {100 * samples / max(profiler.samples, 1):5.1f}%  {stack}")
+
+
+if __name__ == "__main__":
+    main()
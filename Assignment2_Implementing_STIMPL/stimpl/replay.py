@@ -0,0 +1,305 @@
+import argparse
+import struct
+from typing import Any, Dict, Iterator, NamedTuple, Optional, Tuple
+
+from stimpl.errors import InterpError
+from stimpl.expression import *
+from stimpl.runtime import EmptyState, state_bindings
+from stimpl.types import *
+
+"""
+Execution trace recording and deterministic replay.
+
+run_stimpl(program, trace=path) streams one event per evaluated node to a
+compact binary log. Nodes are identified by their pre-order index in the
+program (the order of stimpl.expression.walk). Ids identify node objects,
+not tree positions: a node object that appears at several positions (a
+shared subtree, such as the same Variable used twice) gets the index of its
+first position, and all of its evaluations are recorded under that id, so
+the node at that index of walk(program) is always the one evaluated. Lazy subtrees that are not
+loaded yet are left out of that numbering and are not loaded for it; the
+first time one is evaluated its nodes are numbered in pre-order after the
+highest id so far, and a LAZY record says so. The log layout is:
+
+    header  MAGIC
+    NAME    0x03 len:uvarint utf-8            defines the next variable name id
+    EVAL    0x01 node:uvarint kind:u8 value   a node finished evaluating
+    WRITE   0x02 node:uvarint name:uvarint value
+                                              an Assign finished and bound a variable
+    ERROR   0x04 node:uvarint class:str message:str
+                                              the innermost node that raised
+    LAZY    0x05 node:uvarint first:uvarint source:str
+                                              the Lazy node `node` was loaded and its
+                                              subtree numbered from `first`; source
+                                              is where it was read from
+
+    value   tag:u8 payload, where the payload is nothing for Unit, a zig-zag
+            uvarint for Integer, a little-endian double for FloatingPoint, a
+            byte for Boolean and len:uvarint utf-8 for String.
+
+Every EVAL, WRITE and ERROR event is one step; NAME and LAZY are not. Since State is only ever
+changed by Assign, the state at any step is rebuilt from the WRITE events
+alone, without re-running the program.
+"""
+
+MAGIC = b"STIMPLTRACE\x01"
+
+EVAL, WRITE, NAME, ERROR, LAZY = 1, 2, 3, 4, 5
+
+_NODE_KINDS = (
+    Ren, IntLiteral, FloatingPointLiteral, StringLiteral, BooleanLiteral,
+    Variable, Assign, Print, Not, And, Or, Lt, Lte, Gt, Gte, Eq, Ne,
+    Add, Subtract, Multiply, Divide, Program, Sequence, If, While,
+)
+_NODE_KIND_IDS = {kind: index for index, kind in enumerate(_NODE_KINDS)}
+_UNKNOWN_KIND = 255
+
+_UNIT, _INTEGER, _FLOATING_POINT, _STRING, _BOOLEAN = range(5)
+_TYPE_TAGS = {Unit: _UNIT, Integer: _INTEGER, FloatingPoint: _FLOATING_POINT, String: _STRING, Boolean: _BOOLEAN}
+_TAG_TYPES = {tag: type_class() for type_class, tag in _TYPE_TAGS.items()}
+
+_DOUBLE = struct.Struct("<d")
+
+
+class TraceEvent(NamedTuple):
+    step: int
+    kind: int
+    node_id: int
+    node_kind: Optional[str]
+    variable_name: Optional[str]
+    value: Any
+    value_type: Optional[Type]
+    error: Optional[str]
+
+
+def _write_uvarint(buffer: bytearray, number: int) -> None:
+    while number > 0x7F:
+        buffer.append((number & 0x7F) | 0x80)
+        number >>= 7
+    buffer.append(number)
+
+
+def _read_uvarint(data, offset: int) -> Tuple[int, int]:
+    number = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        number |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return number, offset
+        shift += 7
+
+
+def _write_string(buffer: bytearray, string: str) -> None:
+    encoded = string.encode("utf-8", "surrogatepass")
+    _write_uvarint(buffer, len(encoded))
+    buffer += encoded
+
+
+def _read_string(data, offset: int) -> Tuple[str, int]:
+    length, offset = _read_uvarint(data, offset)
+    end = offset + length
+    return bytes(data[offset:end]).decode("utf-8", "surrogatepass"), end
+
+
+def _write_value(buffer: bytearray, value: Any, value_type: Type) -> None:
+    tag = _TYPE_TAGS[type(value_type)]
+    buffer.append(tag)
+    if tag == _INTEGER:
+        _write_uvarint(buffer, value << 1 if value >= 0 else ((-value) << 1) - 1)
+    elif tag == _FLOATING_POINT:
+        buffer += _DOUBLE.pack(value)
+    elif tag == _STRING:
+        _write_string(buffer, value)
+    elif tag == _BOOLEAN:
+        buffer.append(1 if value else 0)
+
+
+def _read_value(data, offset: int) -> Tuple[Any, Type, int]:
+    tag = data[offset]
+    offset += 1
+    if tag == _INTEGER:
+        number, offset = _read_uvarint(data, offset)
+        value = number >> 1 if not number & 1 else -((number + 1) >> 1)
+    elif tag == _FLOATING_POINT:
+        (value,) = _DOUBLE.unpack_from(data, offset)
+        offset += _DOUBLE.size
+    elif tag == _STRING:
+        value, offset = _read_string(data, offset)
+    elif tag == _BOOLEAN:
+        value = data[offset] == 1
+        offset += 1
+    else:
+        value = None
+    return value, _TAG_TYPES[tag], offset
+
+
+class TraceWriter(object):
+    """Records evaluation events of one run to `path`. Install `hook` with runtime.evaluation_hook."""
+
+    def __init__(self, path: str, program: Expr, buffer_size: int = 1 << 16):
+        self.path = path
+        self.buffer_size = buffer_size
+        # A node object shared by several positions keeps the index of the first one.
+        self.node_ids: Dict[int, int] = {}
+        for index, node in enumerate(walk(program)):
+            self.node_ids.setdefault(id(node), index)
+        # Shared nodes are only in node_ids once, so the next index is kept rather than taken from len(node_ids).
+        self.next_id = index + 1
+        self.name_ids: Dict[str, int] = {}
+        self.buffer = bytearray(MAGIC)
+        self.failed = False
+        self.steps = 0
+        self.file = None
+
+    def __enter__(self) -> "TraceWriter":
+        self.file = open(self.path, "wb")
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
+        self.file.close()
+
+    def flush(self) -> None:
+        self.file.write(self.buffer)
+        self.buffer = bytearray()
+
+    def number_subtree(self, lazy: Lazy) -> None:
+        first = self.next_id
+        for index, node in enumerate(walk(lazy.node), first):
+            self.node_ids.setdefault(id(node), index)
+        self.next_id = index + 1
+        if lazy.source is not None:
+            path, _, start, length = lazy.source
+            source = f"{path}@{start}+{length}"
+        else:
+            source = lazy.description
+        buffer = self.buffer
+        buffer.append(LAZY)
+        _write_uvarint(buffer, self.node_ids.get(id(lazy), 0))
+        _write_uvarint(buffer, first)
+        _write_string(buffer, source)
+
+    def hook(self, evaluate_next, expression, state):
+        if type(expression) is Lazy and id(expression.force()) not in self.node_ids:
+            self.number_subtree(expression)
+        try:
+            result = evaluate_next(expression, state)
+        except Exception as e:
+            # Only the innermost node is recorded; the enclosing nodes just propagate the error.
+            if not self.failed:
+                self.failed = True
+                if isinstance(e, InterpError) and e.step is None:
+                    e.step = self.steps
+                buffer = self.buffer
+                buffer.append(ERROR)
+                _write_uvarint(buffer, self.node_ids.get(id(expression), 0))
+                _write_string(buffer, type(e).__name__)
+                _write_string(buffer, str(e))
+            raise
+        # Nested evaluations may have flushed and replaced the buffer.
+        buffer = self.buffer
+        value, value_type, _ = result
+        node_id = self.node_ids.get(id(expression), 0)
+        if type(expression) is Assign:
+            name = expression.variable.variable_name
+            name_id = self.name_ids.get(name)
+            if name_id is None:
+                name_id = self.name_ids[name] = len(self.name_ids)
+                buffer.append(NAME)
+                _write_string(buffer, name)
+            buffer.append(WRITE)
+            _write_uvarint(buffer, node_id)
+            _write_uvarint(buffer, name_id)
+        else:
+            buffer.append(EVAL)
+            _write_uvarint(buffer, node_id)
+            buffer.append(_NODE_KIND_IDS.get(type(expression), _UNKNOWN_KIND))
+        _write_value(buffer, value, value_type)
+        self.steps += 1
+        if len(buffer) >= self.buffer_size:
+            self.flush()
+        return result
+
+
+def read_trace(path: str) -> Iterator[TraceEvent]:
+    """Yields the events of a trace file in the order they were recorded."""
+    with open(path, "rb") as f:
+        data = memoryview(f.read())
+    if bytes(data[: len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{path} is not a STIMPL trace")
+    names = []
+    offset = len(MAGIC)
+    step = 0
+    while offset < len(data):
+        kind = data[offset]
+        offset += 1
+        if kind == NAME:
+            name, offset = _read_string(data, offset)
+            names.append(name)
+            continue
+        if kind == LAZY:
+            _, offset = _read_uvarint(data, offset)
+            _, offset = _read_uvarint(data, offset)
+            _, offset = _read_string(data, offset)
+            continue
+        node_id, offset = _read_uvarint(data, offset)
+        if kind == EVAL:
+            node_kind = data[offset]
+            offset += 1
+            value, value_type, offset = _read_value(data, offset)
+            kind_name = _NODE_KINDS[node_kind].__name__ if node_kind < len(_NODE_KINDS) else None
+            yield TraceEvent(step, EVAL, node_id, kind_name, None, value, value_type, None)
+        elif kind == WRITE:
+            name_id, offset = _read_uvarint(data, offset)
+            value, value_type, offset = _read_value(data, offset)
+            yield TraceEvent(step, WRITE, node_id, "Assign", names[name_id], value, value_type, None)
+        elif kind == ERROR:
+            error_class, offset = _read_string(data, offset)
+            message, offset = _read_string(data, offset)
+            yield TraceEvent(step, ERROR, node_id, None, None, None, None, f"{error_class}: {message}")
+        else:
+            raise ValueError(f"Corrupt trace {path}: unknown record {kind} at byte {offset - 1}")
+        step += 1
+
+
+def replay(path: str, step: Optional[int] = None):
+    """Rebuilds the state right after `step` (the last step when None). Returns (state, event at that step)."""
+    state = EmptyState()
+    event = None
+    for event in read_trace(path):
+        if event.kind == WRITE:
+            state = state.set_value(event.variable_name, event.value, event.value_type)
+        if step is not None and event.step >= step:
+            break
+    return state, event
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m stimpl.replay",
+        description="Show the state recorded in a STIMPL execution trace.",
+    )
+    parser.add_argument("trace", help="trace file written by run_stimpl(program, trace=path)")
+    parser.add_argument("--step", type=int, default=None, help="step to stop at (default: the last one)")
+    parser.add_argument("--events", action="store_true", help="list the events up to the step")
+    args = parser.parse_args(argv)
+
+    if args.events:
+        for event in read_trace(args.trace):
+            if args.step is not None and event.step > args.step:
+                break
+            print(event)
+    state, event = replay(args.trace, args.step)
+    print(f"step: {event.step if event else None}")
+    print(f"event: {event}")
+    # Live bindings only, newest first.
+    seen = set()
+    for variable_name, variable_value, variable_type in reversed(state_bindings(state)):
+        if variable_name not in seen:
+            seen.add(variable_name)
+            print(f"{variable_name}: ({variable_value!r}, {variable_type})")
+
+
+if __name__ == "__main__":
+    main()
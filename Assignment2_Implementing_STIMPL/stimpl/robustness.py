@@ -4,5 +4,9 @@ from stimpl.types import *
 from stimpl.expression import *
 
 
+ROBUSTNESS_CASES = {}
+
+
 def run_stimpl_robustness_tests():
-    pass
+    for case in ROBUSTNESS_CASES.values():
+        case()
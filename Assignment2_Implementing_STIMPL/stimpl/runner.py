@@ -0,0 +1,139 @@
+import argparse
+import fnmatch
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Callable, ContextManager, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import stimpl.jit as jit
+from stimpl.robustness import ROBUSTNESS_CASES
+from stimpl.test import SANITY_CASES
+
+"""
+Parallel test runner.
+
+Every case of the sanity and robustness suites is run on its own, once per
+execution engine, across a pool of worker processes. A failing case does not
+stop the others, and every run reports how long it took:
+
+    python -m stimpl.runner                          # every case on every engine
+    python -m stimpl.runner --engine jit --case 'while*' --workers 1
+    python -m stimpl.runner --slowest 5
+
+A case is addressed as suite::case, for example sanity::while_loops.
+"""
+
+SUITES: Dict[str, Dict[str, Callable[[], None]]] = {
+    "sanity": SANITY_CASES,
+    "robustness": ROBUSTNESS_CASES,
+}
+
+
+@contextmanager
+def _interpreter():
+    previous = jit.jit_enabled
+    jit.jit_enabled = False
+    try:
+        yield
+    finally:
+        jit.jit_enabled = previous
+
+
+@contextmanager
+def _jit():
+    # Trace every loop on its first iteration, so even the short loops of the suites run compiled.
+    previous = (jit.jit_enabled, jit.HOT_LOOP_THRESHOLD)
+    jit.jit_enabled, jit.HOT_LOOP_THRESHOLD = True, 1
+    jit.reset_traces()
+    try:
+        yield
+    finally:
+        jit.jit_enabled, jit.HOT_LOOP_THRESHOLD = previous
+        jit.reset_traces()
+
+
+ENGINES: Dict[str, Callable[[], ContextManager]] = {
+    "interpreter": _interpreter,
+    "jit": _jit,
+}
+
+
+class CaseResult(NamedTuple):
+    suite: str
+    case: str
+    engine: str
+    passed: bool
+    seconds: float
+    error: Optional[str]
+
+    @property
+    def name(self) -> str:
+        return f"{self.suite}::{self.case}"
+
+
+def collect(
+    suites: Optional[Iterable[str]] = None,
+    engines: Optional[Iterable[str]] = None,
+    pattern: Optional[str] = None,
+) -> List[Tuple[str, str, str]]:
+    """Returns (suite, case, engine) for every case whose name (or suite::case) matches `pattern`."""
+    selected = []
+    for suite in suites or SUITES:
+        for case in SUITES[suite]:
+            if pattern is None or fnmatch.fnmatchcase(case, pattern) or fnmatch.fnmatchcase(f"{suite}::{case}", pattern):
+                selected.extend((suite, case, engine) for engine in engines or ENGINES)
+    return selected
+
+
+def run_case(suite: str, case: str, engine: str) -> CaseResult:
+    start = time.perf_counter()
+    try:
+        with ENGINES[engine]():
+            SUITES[suite][case]()
+    except Exception as e:
+        return CaseResult(suite, case, engine, False, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+    return CaseResult(suite, case, engine, True, time.perf_counter() - start, None)
+
+
+def run_cases(cases: List[Tuple[str, str, str]], workers: Optional[int] = None) -> Iterator[CaseResult]:
+    """Runs `cases` and yields their results as they finish. workers=1 runs them in this process."""
+    if workers == 1:
+        for case in cases:
+            yield run_case(*case)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        for future in as_completed([pool.submit(run_case, *case) for case in cases]):
+            yield future.result()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m stimpl.runner", description="Run the STIMPL test suites in parallel.")
+    parser.add_argument("--suite", choices=sorted(SUITES), action="append", help="suite to run (default: all)")
+    parser.add_argument("--engine", choices=sorted(ENGINES), action="append", help="engine to run on (default: all)")
+    parser.add_argument("--case", default=None, help="glob matched against case or suite::case names")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--slowest", type=int, default=0, help="list the N slowest runs at the end")
+    args = parser.parse_args(argv)
+
+    cases = collect(args.suite, args.engine, args.case)
+    start = time.perf_counter()
+    results = []
+    for result in run_cases(cases, args.workers):
+        results.append(result)
+        print(f"{'PASS' if result.passed else 'FAIL'} {result.name} [{result.engine}] {result.seconds * 1000:.2f} ms")
+    elapsed = time.perf_counter() - start
+
+    failures = [result for result in results if not result.passed]
+    for result in failures:
+        print(f"\n{result.name} [{result.engine}] failed:\n  {result.error}")
+    if args.slowest:
+        print(f"\nslowest {args.slowest}:")
+        for result in sorted(results, key=lambda result: result.seconds, reverse=True)[: args.slowest]:
+            print(f"  {result.seconds * 1000:10.2f} ms {result.name} [{result.engine}]")
+    print(f"\n{len(results) - len(failures)} passed, {len(failures)} failed in {elapsed:.2f} s")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
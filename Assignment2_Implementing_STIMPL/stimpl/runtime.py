@@ -1,8 +1,16 @@
-from typing import Any, Tuple, Optional
+import io
+import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Tuple, Optional, TextIO
 
 from stimpl.expression import *
 from stimpl.types import *
 from stimpl.errors import *
+import stimpl.jit as jit
+import stimpl.metrics as metrics
 
 """
 Interpreter State
@@ -20,6 +28,8 @@ class State(object):
         self.variable_name = variable_name
         self.value = (variable_value, variable_type)
         self.next_state = next_state
+        # Bindings in the chain, kept so that metrics never have to walk it.
+        self.depth = next_state.depth + 1
 
     def copy(self) -> "State":
         variable_value, variable_type = self.value
@@ -29,20 +39,25 @@ class State(object):
         return State(variable_name, variable_value, variable_type, self)
 
     def get_value(self, variable_name) -> Any:
-        # First, check to see if the variable is in the current state.
-        if variable_name == self.variable_name:
-            # If it is, return the value.
-            return self.value
-        # Otherwise, check the next state.
-        else:
-            # If the variable_name is not this state, go to the next state and repeat.
-            return self.next_state.get_value(variable_name)
+        state = self
+        # Walk down the chain (iteratively, so long chains cannot overflow the stack) until the variable is found.
+        while not isinstance(state, EmptyState):
+            # If the variable is in this state, return the value.
+            if variable_name == state.variable_name:
+                return state.value
+            # Otherwise, go to the next state and repeat.
+            state = state.next_state
+        return None
 
     def __repr__(self) -> str:
-        return f"{self.variable_name}: {self.value}, " + repr(self.next_state)
+        stream = io.StringIO()
+        write_state(self, stream)
+        return stream.getvalue()
 
 
 class EmptyState(State):
+    depth = 0
+
     def __init__(self):
         pass
 
@@ -56,6 +71,121 @@ class EmptyState(State):
         return ""
 
 
+def state_bindings(state: State) -> List[Tuple[str, Any, Type]]:
+    """Flattens a state chain into its bindings, oldest first, without recursing. Shadowed bindings are kept."""
+    bindings = []
+    while not isinstance(state, EmptyState):
+        variable_value, variable_type = state.value
+        bindings.append((state.variable_name, variable_value, variable_type))
+        state = state.next_state
+    bindings.reverse()
+    return bindings
+
+
+def live_bindings(state: State) -> List[Tuple[str, Any, Type]]:
+    """Like state_bindings, but only keeps the binding each variable currently has."""
+    bindings = []
+    seen = set()
+    while not isinstance(state, EmptyState):
+        if state.variable_name not in seen:
+            seen.add(state.variable_name)
+            variable_value, variable_type = state.value
+            bindings.append((state.variable_name, variable_value, variable_type))
+        state = state.next_state
+    bindings.reverse()
+    return bindings
+
+
+def state_from_bindings(bindings: List[Tuple[str, Any, Type]]) -> State:
+    """Rebuilds the state chain produced by state_bindings."""
+    state = EmptyState()
+    for variable_name, variable_value, variable_type in bindings:
+        state = state.set_value(variable_name, variable_value, variable_type)
+    return state
+
+
+def python_type(value: Any) -> Type:
+    """Returns the STIMPL type of a Python value given as a program input."""
+    match value:
+        case None:
+            return Unit()
+        case bool():
+            return Boolean()
+        case int():
+            return Integer()
+        case float():
+            return FloatingPoint()
+        case str():
+            return String()
+    raise InterpTypeError("Inputs cannot be {input_type}", input_type=type(value).__name__)
+
+
+def state_from_values(values: Dict[str, Any]) -> State:
+    """Binds each input name to its Python value, typed with python_type."""
+    state = EmptyState()
+    for variable_name, variable_value in values.items():
+        state = state.set_value(variable_name, variable_value, python_type(variable_value))
+    return state
+
+
+def write_state(
+    state: State,
+    stream: TextIO,
+    live_only: bool = False,
+    max_bindings: Optional[int] = None,
+    max_length: Optional[int] = None,
+) -> None:
+    """Writes the repr of `state` (newest binding first) to `stream` without recursing.
+
+    With `live_only`, shadowed bindings are skipped. Bindings past `max_bindings`
+    and everything past `max_length` characters are elided.
+    """
+    writer = BoundedWriter(stream, max_length)
+    seen = set()
+    written = 0
+    try:
+        while not isinstance(state, EmptyState):
+            variable_name = state.variable_name
+            state_value = state.value
+            state = state.next_state
+            if live_only:
+                if variable_name in seen:
+                    continue
+                seen.add(variable_name)
+            if max_bindings is not None and written >= max_bindings:
+                writer.write(ELLIPSIS)
+                break
+            variable_value, variable_type = state_value
+            # Only the part of a long string that can still be shown is copied.
+            if writer.remaining is not None and isinstance(variable_value, str):
+                variable_value = variable_value[: writer.remaining]
+            writer.write(f"{variable_name}: ({variable_value!r}, {variable_type!r}), ")
+            written += 1
+    except StopWriting:
+        pass
+
+
+# Limits on what debug mode prints, so that it stays cheap on large programs and states.
+DEBUG_MAX_ITEMS = 100
+DEBUG_MAX_LENGTH = 10_000
+
+
+def print_debug(program, program_value, program_type, program_state) -> None:
+    """Prints the debug summary of a run; `program` is an expression or a description of it."""
+    out = sys.stdout
+    out.write("program: ")
+    if isinstance(program, Expr):
+        write_expression(program, out, max_items=DEBUG_MAX_ITEMS, max_length=DEBUG_MAX_LENGTH)
+    else:
+        out.write(program)
+    out.write("\n")
+    value = program_value[:DEBUG_MAX_LENGTH] if isinstance(program_value, str) else program_value
+    out.write(f"final_value: ({value}, {program_type})\n")
+    out.write("final_state: ")
+    write_state(program_state, out, live_only=True, max_bindings=DEBUG_MAX_ITEMS, max_length=DEBUG_MAX_LENGTH)
+    out.write("\n")
+
+
 def InitCommonExpression(
     state, left, right
 ) -> Tuple[Any | None, Type, Any | None, Type, State]:
@@ -69,7 +199,17 @@ Main evaluation logic!
 """
 
 
-def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State]:
+# Counts the evaluated nodes for stimpl.metrics; bound once so evaluate pays for a single call.
+_count_node = metrics.count_node
+
+
+def evaluate(expression: Expr, state: State, _unhooked: bool = False) -> Tuple[Optional[Any], Type, State]:
+    # Hooks installed with evaluation_hook in this context see every node first.
+    if _installed_hooks and not _unhooked:
+        hooks = _evaluation_hooks.get()
+        if hooks:
+            return _call_hooks(hooks, len(hooks) - 1, expression, state)
+    _count_node()
     match expression:
         case Ren():
             return (None, Unit(), state)
@@ -91,9 +231,11 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
 
             match printable_type:
                 case Unit():
-                    print("Unit")
+                    text = "Unit"
                 case _:
-                    print(f"{printable_value}")
+                    text = f"{printable_value}"
+            print(text)
+            metrics.printed(text)
 
             return (printable_value, printable_type, new_state)
 
@@ -115,7 +257,9 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
             value = state.get_value(variable_name)
             if value == None:
                 raise InterpSyntaxError(
-                    f"Cannot read from {variable_name} before assignment."
+                    "Cannot read from {variable_name} before assignment.",
+                    node=expression,
+                    variable_name=variable_name,
                 )
             variable_value, variable_type = value
             return (variable_value, variable_type, state)
@@ -130,8 +274,11 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
 
             if value_type != variable_type and variable_type != None:
                 raise InterpTypeError(
-                    f"""Mismatched types for Assignment:
-            Cannot assign {value_type} to {variable_type}"""
+                    "Mismatched types for Assignment: Cannot assign {right_type} to {left_type}",
+                    operator="Assign",
+                    left_type=variable_type,
+                    right_type=value_type,
+                    node=expression,
                 )
 
             new_state = new_state.set_value(
@@ -146,15 +293,24 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
 
             if left_type != right_type:
                 raise InterpTypeError(
-                    f"""Mismatched types for Add:
-            Cannot add {left_type} to {right_type}"""
+                    "Mismatched types for {operator}: Cannot add {left_type} to {right_type}",
+                    operator="Add",
+                    left_type=left_type,
+                    right_type=right_type,
+                    node=expression,
                 )
 
             match left_type:
                 case Integer() | String() | FloatingPoint():
                     result = left_result + right_result
                 case _:
-                    raise InterpTypeError(f"""Cannot add {left_type}s""")
+                    raise InterpTypeError(
+                        "Cannot add {left_type}s",
+                        operator="Add",
+                        left_type=left_type,
+                        right_type=right_type,
+                        node=expression,
+                    )
 
             return (result, left_type, new_state)
 
@@ -173,8 +329,11 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
             # If the left and right types are not the same, raise an error.
             if left_type != right_type:
                 raise InterpTypeError(
-                    f"""Mismatched types for Subtract:
-            Cannot subtract {left_type} to {right_type}"""
+                    "Mismatched types for {operator}: Cannot subtract {left_type} to {right_type}",
+                    operator="Subtract",
+                    left_type=left_type,
+                    right_type=right_type,
+                    node=expression,
                 )
 
             # Match the left type.
@@ -184,7 +343,13 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
                     result = left_result - right_result
                 # If the type is Not Integer or FloatingPoint, raise error.
                 case _:
-                    raise InterpTypeError(f"""Cannot subtract {left_type}s""")
+                    raise InterpTypeError(
+                        "Cannot subtract {left_type}s",
+                        operator="Subtract",
+                        left_type=left_type,
+                        right_type=right_type,
+                        node=expression,
+                    )
             # Return the result, left type, and new state.
             return (result, left_type, new_state)
 
@@ -203,8 +368,11 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
             # If the left and right types are not the same, raise an error.
             if left_type != right_type:
                 raise InterpTypeError(
-                    f"""Mismatched types for Multiply:
-            Cannot multiply {left_type} to {right_type}"""
+                    "Mismatched types for {operator}: Cannot multiply {left_type} to {right_type}",
+                    operator="Multiply",
+                    left_type=left_type,
+                    right_type=right_type,
+                    node=expression,
                 )
 
             # Match the left type.
@@ -214,7 +382,13 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
                     result = left_result * right_result
                 # If the type is Not Integer or FloatingPoint, raise error.
                 case _:
-                    raise InterpTypeError(f"""Cannot multiply {left_type}s""")
+                    raise InterpTypeError(
+                        "Cannot multiply {left_type}s",
+                        operator="Multiply",
+                        left_type=left_type,
+                        right_type=right_type,
+                        node=expression,
+                    )
             # Return the result, left type, and new state.
             return (result, left_type, new_state)
 
@@ -233,8 +407,11 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
             # If the left and right types are not the same, raise an error.
             if left_type != right_type:
                 raise InterpTypeError(
-                    f"""Mismatched types for Divide:
-            Cannot divide {left_type} to {right_type}"""
+                    "Mismatched types for {operator}: Cannot divide {left_type} to {right_type}",
+                    operator="Divide",
+                    left_type=left_type,
+                    right_type=right_type,
+                    node=expression,
                 )
 
             # Match the left type.
@@ -242,7 +419,13 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
                 # If the type is Integer or FloatingPoint, perform the division.
                 case Integer() | FloatingPoint():
                     if right_result == 0:
-                        raise InterpMathError(f"""Cannot divide by zero""")
+                        raise InterpMathError(
+                            "Cannot divide by zero",
+                            operator="Divide",
+                            left_type=left_type,
+                            right_type=right_type,
+                            node=expression,
+                        )
                     # Do integer division if both operands are integers. Semantics rule 7.
                     if left_type == Integer():
                         result = left_result // right_result
@@ -250,7 +433,13 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
                         result = left_result / right_result
                 # If the type is Not Integer or FloatingPoint, raise error.
                 case _:
-                    raise InterpTypeError(f"""Cannot divide {left_type}s""")
+                    raise InterpTypeError(
+                        "Cannot divide {left_type}s",
+                        operator="Divide",
+                        left_type=left_type,
+                        right_type=right_type,
+                        node=expression,
+                    )
             # Return the result, left type, and new state.
             return (result, left_type, new_state)
 
@@ -265,15 +454,22 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
 
             if left_type != right_type:
                 raise InterpTypeError(
-                    f"""Mismatched types for And:
-            Cannot add {left_type} to {right_type}"""
+                    "Mismatched types for {operator}: Cannot add {left_type} to {right_type}",
+                    operator="And",
+                    left_type=left_type,
+                    right_type=right_type,
+                    node=expression,
                 )
             match left_type:
                 case Boolean():
                     result = left_result and right_result
                 case _:
                     raise InterpTypeError(
-                        "Cannot perform logical and on non-boolean operands."
+                        "Cannot perform logical and on non-boolean operands.",
+                        operator="And",
+                        left_type=left_type,
+                        right_type=right_type,
+                        node=expression,
                     )
 
             return (result, left_type, new_state)
@@ -291,8 +487,11 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
             # If the left and right types are not the same, raise an error.
             if left_type != right_type:
                 raise InterpTypeError(
-                    f"""Mismatched types for Or:
-            Cannot add {left_type} to {right_type}"""
+                    "Mismatched types for {operator}: Cannot add {left_type} to {right_type}",
+                    operator="Or",
+                    left_type=left_type,
+                    right_type=right_type,
+                    node=expression,
                 )
 
             # Match the left type.
@@ -303,7 +502,11 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
                 # If the type is Not Bool, raise error.
                 case _:
                     raise InterpTypeError(
-                        "Cannot perform logical or on non-boolean operands."
+                        "Cannot perform logical or on non-boolean operands.",
+                        operator="Or",
+                        left_type=left_type,
+                        right_type=right_type,
+                        node=expression,
                     )
 
             # Return the result, Boolean type, and new state.
@@ -320,7 +523,10 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
                 # If the type is Not Bool, raise error.
                 case _:
                     raise InterpTypeError(
-                        "Cannot perform logical not on non-boolean operands."
+                        "Cannot perform logical not on non-boolean operands.",
+                        operator="Not",
+                        left_type=expr_type,
+                        node=expression,
                     )
 
             # Return the result, Boolean type, and new state.
@@ -333,7 +539,10 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
             # If the condition is not a boolean, raise an error. Type rule 8.
             if condition_type != Boolean():
                 raise InterpTypeError(
-                    "Cannot perform logical if on non-boolean operands."
+                    "Cannot perform logical if on non-boolean operands.",
+                    operator="If",
+                    left_type=condition_type,
+                    node=expression,
                 )
 
             # If the condition is true, evaluate the true branch. Semantics rule 13.
@@ -355,8 +564,11 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
 
             if left_type != right_type:
                 raise InterpTypeError(
-                    f"""Mismatched types for Lt:
-            Cannot compare {left_type} to {right_type}"""
+                    "Mismatched types for {operator}: Cannot compare {left_type} to {right_type}",
+                    operator="Lt",
+                    left_type=left_type,
+                    right_type=right_type,
+                    node=expression,
                 )
 
             match left_type:
@@ -365,7 +577,13 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
                 case Unit():
                     result = False
                 case _:
-                    raise InterpTypeError(f"Cannot perform < on {left_type} type.")
+                    raise InterpTypeError(
+                        "Cannot perform < on {left_type} type.",
+                        operator="Lt",
+                        left_type=left_type,
+                        right_type=right_type,
+                        node=expression,
+                    )
 
             return (result, Boolean(), new_state)
 
@@ -384,8 +602,11 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
             # If the left and right types are not the same, raise an error.
             if left_type != right_type:
                 raise InterpTypeError(
-                    f"""Mismatched types for Lte:
-            Cannot compare {left_type} to {right_type}"""
+                    "Mismatched types for {operator}: Cannot compare {left_type} to {right_type}",
+                    operator="Lte",
+                    left_type=left_type,
+                    right_type=right_type,
+                    node=expression,
                 )
 
             # Match the left/right type.
@@ -397,7 +618,13 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
                 case Unit():
                     result = True
                 case _:
-                    raise InterpTypeError(f"Cannot perform <= on {left_type} type.")
+                    raise InterpTypeError(
+                        "Cannot perform <= on {left_type} type.",
+                        operator="Lte",
+                        left_type=left_type,
+                        right_type=right_type,
+                        node=expression,
+                    )
             # Return the result, Boolean type, and new state.
             return (result, Boolean(), new_state)
 
@@ -416,8 +643,11 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
             # If the left and right types are not the same, raise an error.
             if left_type != right_type:
                 raise InterpTypeError(
-                    f"""Mismatched types for Gt:
-            Cannot compare {left_type} to {right_type}"""
+                    "Mismatched types for {operator}: Cannot compare {left_type} to {right_type}",
+                    operator="Gt",
+                    left_type=left_type,
+                    right_type=right_type,
+                    node=expression,
                 )
 
             # Match the left/right type.
@@ -429,7 +659,13 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
                 case Unit():
                     result = False
                 case _:
-                    raise InterpTypeError(f"Cannot perform > on {left_type} type.")
+                    raise InterpTypeError(
+                        "Cannot perform > on {left_type} type.",
+                        operator="Gt",
+                        left_type=left_type,
+                        right_type=right_type,
+                        node=expression,
+                    )
             # Return the result, Boolean type, and new state.
             return (result, Boolean(), new_state)
 
@@ -448,8 +684,11 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
             # If the left and right types are not the same, raise an error.
             if left_type != right_type:
                 raise InterpTypeError(
-                    f"""Mismatched types for Gte:
-            Cannot compare {left_type} to {right_type}"""
+                    "Mismatched types for {operator}: Cannot compare {left_type} to {right_type}",
+                    operator="Gte",
+                    left_type=left_type,
+                    right_type=right_type,
+                    node=expression,
                 )
 
             # Match the left/right type.
@@ -461,7 +700,13 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
                 case Unit():
                     result = True
                 case _:
-                    raise InterpTypeError(f"Cannot perform >= on {left_type} type.")
+                    raise InterpTypeError(
+                        "Cannot perform >= on {left_type} type.",
+                        operator="Gte",
+                        left_type=left_type,
+                        right_type=right_type,
+                        node=expression,
+                    )
             # Return the result, Boolean type, and new state.
             return (result, Boolean(), new_state)
 
@@ -479,8 +724,11 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
             # If the left and right types are not the same, raise an error.
             if left_type != right_type:
                 raise InterpTypeError(
-                    f"""Mismatched types for Eq:
-            Cannot compare {left_type} to {right_type}"""
+                    "Mismatched types for {operator}: Cannot compare {left_type} to {right_type}",
+                    operator="Eq",
+                    left_type=left_type,
+                    right_type=right_type,
+                    node=expression,
                 )
 
             # Match the left/right type.
@@ -492,7 +740,13 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
                 case Unit():
                     result = True
                 case _:
-                    raise InterpTypeError(f"Cannot perform == on {left_type} type.")
+                    raise InterpTypeError(
+                        "Cannot perform == on {left_type} type.",
+                        operator="Eq",
+                        left_type=left_type,
+                        right_type=right_type,
+                        node=expression,
+                    )
             # Return the result, Boolean type, and new state.
             return (result, Boolean(), new_state)
 
@@ -510,8 +764,11 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
             # If the left and right types are not the same, raise an error.
             if left_type != right_type:
                 raise InterpTypeError(
-                    f"""Mismatched types for Ne:
-            Cannot compare {left_type} to {right_type}"""
+                    "Mismatched types for {operator}: Cannot compare {left_type} to {right_type}",
+                    operator="Ne",
+                    left_type=left_type,
+                    right_type=right_type,
+                    node=expression,
                 )
 
             # Match the left/right type.
@@ -523,7 +780,13 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
                 case Unit():
                     result = False
                 case _:
-                    raise InterpTypeError(f"Cannot perform != on {left_type} type.")
+                    raise InterpTypeError(
+                        "Cannot perform != on {left_type} type.",
+                        operator="Ne",
+                        left_type=left_type,
+                        right_type=right_type,
+                        node=expression,
+                    )
             # Return the result, Boolean type, and new state.
             return (result, Boolean(), new_state)
 
@@ -537,11 +800,29 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
             if condition_type != Boolean():
                 # If the condition is not a boolean, raise an error. Type rule 8.
                 raise InterpTypeError(
-                    "Cannot perform logical while on non-boolean operands."
+                    "Cannot perform logical while on non-boolean operands.",
+                    operator="While",
+                    left_type=condition_type,
+                    node=expression,
                 )
 
+            # Hooked runs must see every node, so their loops are not handed to the JIT.
+            use_jit = jit.jit_enabled and not (_installed_hooks and _evaluation_hooks.get())
+            interrupts = jit.pending_interrupts
             # While the condition is true, evaluate the body. Semantics rule 12.
             while condition_value:
+                # The top of an iteration is a safe point to stop at (see interrupt).
+                if interrupts:
+                    raise interrupts.pop(0)
+                # Once the loop is hot, run it through its compiled trace until the loop exits or a guard fails.
+                trace = jit.hot_trace(expression, new_state) if use_jit else None
+                if trace is not None:
+                    trace_value, new_state = trace(new_state)
+                    if trace_value is not None:
+                        condition_value = trace_value
+                        break
+                    # A guard failed; run this iteration in the interpreter.
+                    jit.side_exit(expression)
                 _, _, new_state = evaluate(
                     body, new_state
                 )  # Evaluate the body and update the state.
@@ -552,18 +833,141 @@ def evaluate(expression: Expr, state: State) -> Tuple[Optional[Any], Type, State
             # Return the final state, value, and type.
             return (condition_value, condition_type, new_state)
 
+        case Lazy():
+            return evaluate(expression.force(), state)
+
         case _:
-            raise InterpSyntaxError("Unhandled!")
+            raise InterpSyntaxError("Unhandled!", node=expression)
     pass
 
 
-def run_stimpl(program, debug=False):
-    state = EmptyState()
-    program_value, program_type, program_state = evaluate(program, state)
+"""
+Evaluation hooks.
+"""
+
+
+# Hooks installed in the current context (thread or asyncio task), in the order they were installed.
+_evaluation_hooks: ContextVar[Tuple] = ContextVar("evaluation_hooks", default=())
+# Hooks installed in any context; while there are none, evaluate skips the context lookup.
+_installed_hooks = 0
+_installed_hooks_lock = threading.Lock()
+
+
+def _call_hooks(hooks: Tuple, index: int, expression: Expr, state: State):
+    if index < 0:
+        return evaluate(expression, state, _unhooked=True)
+    return hooks[index](lambda expression, state: _call_hooks(hooks, index - 1, expression, state), expression, state)
+
+
+@contextmanager
+def evaluation_hook(hook):
+    """Routes every evaluate call through hook(evaluate_next, expression, state) while the block runs.
+
+    The hook must call evaluate_next(expression, state) and return its result. Hooks nest, the
+    last one installed seeing each node first. They only apply to the current thread or asyncio
+    task, whose hot loops are then not handed to the JIT; other runs are not affected.
+    """
+    global _installed_hooks
+    token = _evaluation_hooks.set(_evaluation_hooks.get() + (hook,))
+    with _installed_hooks_lock:
+        _installed_hooks += 1
+    try:
+        yield
+    finally:
+        _evaluation_hooks.reset(token)
+        with _installed_hooks_lock:
+            _installed_hooks -= 1
+
+
+"""
+Interrupts.
+"""
+
+
+def interrupt(exception: BaseException) -> None:
+    """Makes the running program raise `exception` at its next safe point, the top of a While iteration.
+
+    Meant for signal handlers: unlike raising from the handler, which can happen at any bytecode,
+    this never leaves the result cache or the JIT halfway through an update. A program without
+    loops runs to the end, in time linear in its size.
+    """
+    jit.pending_interrupts.append(exception)
+
+
+def clear_interrupts() -> None:
+    """Drops the interrupts that no program reached a safe point for, e.g. after it finished."""
+    jit.pending_interrupts.clear()
+
+
+def run_stimpl(program, debug=False, cache=None, trace=None, checkpoint=None, checkpoint_every=60.0, memory_report=False, inputs=None):
+    # Pure programs that were run before are answered from the result cache without evaluating anything.
+    # Traced, checkpointed and measured runs always evaluate, since a cache hit would leave nothing to record.
+    # Runs with inputs are not cached either, since the key only covers the program.
+    start = time.perf_counter()
+    metrics.run_started()
+    instrumented = trace is not None or checkpoint is not None or memory_report
+    try:
+        key = cache.key(program) if cache is not None and not instrumented and not inputs else None
+        cached = cache.get(key) if key is not None else None
+        loads = Lazy.loads
+        if cached is not None:
+            program_value, program_type, program_state = cached
+        else:
+            with ExitStack() as hooks:
+                if trace is not None:
+                    from stimpl.replay import TraceWriter
+
+                    writer = hooks.enter_context(TraceWriter(trace, program))
+                    hooks.enter_context(evaluation_hook(writer.hook))
+                if checkpoint is not None:
+                    from stimpl.checkpoint import Checkpointer
+
+                    checkpointer = Checkpointer(checkpoint, program, checkpoint_every)
+                    hooks.enter_context(evaluation_hook(checkpointer.hook))
+                if memory_report:
+                    from stimpl.memory import MemoryReporter
+
+                    reporter = hooks.enter_context(MemoryReporter(program, memory_report))
+                state = state_from_values(inputs) if inputs else EmptyState()
+                program_value, program_type, program_state = evaluate(program, state)
+                if memory_report:
+                    reporter.state = program_state
+            # Lazy branches loaded by the run may hold a Print, which makes the program impure after all;
+            # the program is only hashed again if some subtree was loaded since it was first hashed.
+            if key is not None and (Lazy.loads == loads or cache.key(program) == key):
+                cache.put(key, (program_value, program_type, program_state))
+    except BaseException as e:
+        metrics.run_failed(e, time.perf_counter() - start)
+        raise
+    metrics.run_finished(program_state.depth, time.perf_counter() - start)
 
     if debug:
-        print(f"program: {program}")
-        print(f"final_value: ({program_value}, {program_type})")
-        print(f"final_state: {program_state}")
+        print_debug(program, program_value, program_type, program_state)
 
     return program_value, program_type, program_state
+
+
+def run_stimpl_stream(exprs: Iterable[Expr], debug=False):
+    """Runs the top-level expressions of a program as they arrive, e.g. from serialize.read_program_stream.
+
+    The result is the same as run_stimpl(Program(*exprs)), but each expression is dropped as soon
+    as it has run, so only one statement of the program has to be in memory at a time.
+    """
+    start = time.perf_counter()
+    metrics.run_started()
+    program_value, program_type, program_state = None, Unit(), EmptyState()
+    count = 0
+    try:
+        for expr in exprs:
+            program_value, program_type, program_state = evaluate(expr, program_state)
+            count += 1
+            del expr
+    except BaseException as e:
+        metrics.run_failed(e, time.perf_counter() - start)
+        raise
+    metrics.run_finished(program_state.depth, time.perf_counter() - start)
+
+    if debug:
+        print_debug(f"{count} streamed expressions", program_value, program_type, program_state)
+
+    return program_value, program_type, program_state
\ No newline at end of file
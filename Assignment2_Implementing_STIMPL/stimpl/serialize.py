@@ -0,0 +1,205 @@
+import io
+import json
+import os
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Optional, TextIO, Tuple
+
+from stimpl.expression import *
+from stimpl.errors import InterpSyntaxError
+
+"""
+Program serialization.
+
+Programs are encoded as nested JSON arrays holding the class name of each node
+followed by its fields, for example
+
+    ["Program", ["Assign", ["Variable", "i"], ["IntLiteral", 1]],
+                ["Print", ["Variable", "i"]]]
+
+Decoding only ever builds stimpl.expression nodes, so it is safe to use on
+programs received from other processes.
+
+Very large programs can also be stored as a program stream: one top-level
+expression per line, read back one expression at a time so that a program
+can start running (see runtime.run_stimpl_stream) before it is fully loaded.
+
+Programs whose big If branches or While bodies often never run can be stored
+as a lazy program file instead, with write_lazy_program. The first line
+holds the program, with each branch or body of at least `min_nodes` nodes
+replaced by a reference ["Lazy", offset, length, nodes] to where its
+encoding sits in the rest of the file (branches nested in it are references
+too). load_lazy_program only decodes the first line and turns references
+into Lazy nodes, which read and decode their byte range the first time they
+are evaluated.
+"""
+
+LAZY_MIN_NODES = 64
+
+_LITERALS = {
+    "IntLiteral": IntLiteral,
+    "FloatingPointLiteral": FloatingPointLiteral,
+    "StringLiteral": StringLiteral,
+    "BooleanLiteral": BooleanLiteral,
+}
+_UNARY = {"Print": Print, "Not": Not}
+_BINARY = {
+    cls.__name__: cls
+    for cls in (And, Or, Lt, Lte, Gt, Gte, Eq, Ne, Add, Subtract, Multiply, Divide)
+}
+_COMBINING = {"Program": Program, "Sequence": Sequence}
+
+
+def expression_to_data(expression: Expr) -> list:
+    match expression:
+        case Ren():
+            return ["Ren"]
+        case Literal(literal=l):
+            return [type(expression).__name__, l]
+        case Variable(variable_name=variable_name):
+            return ["Variable", variable_name]
+        case Assign(variable=variable, value=value):
+            return ["Assign", expression_to_data(variable), expression_to_data(value)]
+        case Print(to_print=to_print):
+            return ["Print", expression_to_data(to_print)]
+        case Not(expr=expr):
+            return ["Not", expression_to_data(expr)]
+        case BinaryOperator(left=left, right=right):
+            return [type(expression).__name__, expression_to_data(left), expression_to_data(right)]
+        case Program(exprs=exprs) | Sequence(exprs=exprs):
+            return [type(expression).__name__] + [expression_to_data(expr) for expr in exprs]
+        case If(condition=condition, true=true, false=false):
+            return ["If", expression_to_data(condition), expression_to_data(true), expression_to_data(false)]
+        case While(condition=condition, body=body):
+            return ["While", expression_to_data(condition), expression_to_data(body)]
+        case Lazy():
+            return expression_to_data(expression.force())
+        case _:
+            raise InterpSyntaxError(f"Cannot serialize {type(expression).__name__}")
+
+
+def expression_from_data(data: Any, lazy: Optional[Callable[[int, int, int], Expr]] = None) -> Expr:
+    """Decodes `data`; lazy(offset, length, nodes) builds the node for a ["Lazy", ...] reference, if allowed."""
+    if not isinstance(data, list) or not data or not isinstance(data[0], str):
+        raise InterpSyntaxError(f"Malformed expression {data!r:.80}")
+    kind, fields = data[0], data[1:]
+    if kind in _LITERALS and len(fields) == 1:
+        return _LITERALS[kind](fields[0])
+    if kind == "Ren" and not fields:
+        return Ren()
+    if kind == "Variable" and len(fields) == 1 and isinstance(fields[0], str):
+        return Variable(fields[0])
+    if kind in _COMBINING:
+        return _COMBINING[kind](*[expression_from_data(field, lazy) for field in fields])
+    if kind in _UNARY and len(fields) == 1:
+        return _UNARY[kind](expression_from_data(fields[0], lazy))
+    if kind in _BINARY and len(fields) == 2:
+        return _BINARY[kind](expression_from_data(fields[0], lazy), expression_from_data(fields[1], lazy))
+    if kind == "Assign" and len(fields) == 2:
+        return Assign(expression_from_data(fields[0], lazy), expression_from_data(fields[1], lazy))
+    if kind == "If" and len(fields) == 3:
+        return If(*[expression_from_data(field, lazy) for field in fields])
+    if kind == "While" and len(fields) == 2:
+        return While(expression_from_data(fields[0], lazy), expression_from_data(fields[1], lazy))
+    if kind == "Lazy" and lazy is not None and len(fields) == 3 and all(type(field) is int and field >= 0 for field in fields):
+        return lazy(*fields)
+    raise InterpSyntaxError(f"Malformed expression {data!r:.80}")
+
+
+def program_to_json(expression: Expr) -> str:
+    return json.dumps(expression_to_data(expression), separators=(",", ":"))
+
+
+def program_from_json(text: str) -> Expr:
+    return expression_from_data(json.loads(text))
+
+
+def write_program_stream(expressions: Iterable[Expr], stream: TextIO) -> None:
+    """Writes top-level expressions (for example program.exprs) one per line."""
+    for expression in expressions:
+        stream.write(json.dumps(expression_to_data(expression), separators=(",", ":")))
+        stream.write("\n")
+
+
+def read_program_stream(stream: TextIO) -> Iterator[Expr]:
+    """Yields the top-level expressions of a program stream, decoding each line only when it is asked for."""
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            raise InterpSyntaxError(f"Line {line_number} of the program stream is not JSON: {e}")
+        yield expression_from_data(data)
+
+
+def _lazy_data(expression: Expr, blobs: BinaryIO, min_nodes: int) -> Tuple[list, int]:
+    """Encodes `expression` like expression_to_data, moving big branches and bodies to `blobs`. Also returns the node count."""
+    if isinstance(expression, Lazy):
+        return _lazy_data(expression.force(), blobs, min_nodes)
+    parts = children(expression)
+    if not parts:
+        return expression_to_data(expression), 1
+    data, nodes = [type(expression).__name__], 1
+    for index, part in enumerate(parts):
+        part_data, part_nodes = _lazy_data(part, blobs, min_nodes)
+        # Everything but the condition of an If or a While may be left unloaded.
+        if index > 0 and isinstance(expression, (If, While)) and part_nodes >= min_nodes:
+            encoded = json.dumps(part_data, separators=(",", ":")).encode()
+            part_data = ["Lazy", blobs.tell(), len(encoded), part_nodes]
+            blobs.write(encoded)
+        data.append(part_data)
+        nodes += part_nodes
+    return data, nodes
+
+
+def write_lazy_program(program: Expr, stream: BinaryIO, min_nodes: int = LAZY_MIN_NODES) -> None:
+    """Writes `program` to a binary stream in the lazy program format."""
+    blobs = io.BytesIO()
+    data, _ = _lazy_data(program, blobs, min_nodes)
+    stream.write(json.dumps(data, separators=(",", ":")).encode())
+    stream.write(b"\n")
+    stream.write(blobs.getvalue())
+
+
+class LazyRange(object):
+    """Loads the subtree encoded in bytes [start, start + length) of a lazy program file.
+
+    `stamp` is the (size, modification time) the file had when the program was
+    loaded; it goes into the source of every Lazy node made here so that a
+    rewritten file does not share cache keys with the old one.
+    """
+
+    def __init__(self, path: str, base: int, offset: int, length: int, stamp: Optional[tuple] = None):
+        self.path = path
+        self.base = base
+        self.offset = offset
+        self.length = length
+        self.stamp = stamp
+
+    def __call__(self) -> Expr:
+        with open(self.path, "rb") as f:
+            f.seek(self.base + self.offset)
+            encoded = f.read(self.length)
+        if len(encoded) != self.length:
+            raise InterpSyntaxError(f"{self.path} ends inside a lazy subtree")
+        try:
+            data = json.loads(encoded)
+        except ValueError as e:
+            raise InterpSyntaxError(f"Lazy subtree at byte {self.base + self.offset} of {self.path} is not JSON: {e}")
+        return expression_from_data(data, self.reference)
+
+    def reference(self, offset: int, length: int, nodes: int) -> Lazy:
+        source = (os.path.abspath(self.path), self.stamp, self.base + offset, length)
+        return Lazy(LazyRange(self.path, self.base, offset, length, self.stamp), f"{nodes} nodes", source)
+
+
+def load_lazy_program(path: str) -> Expr:
+    """Reads a program written by write_lazy_program, leaving its big branches and bodies on disk until they run."""
+    with open(path, "rb") as f:
+        header = f.readline()
+        status = os.fstat(f.fileno())
+    try:
+        data = json.loads(header)
+    except ValueError as e:
+        raise InterpSyntaxError(f"{path} is not a lazy program file: {e}")
+    stamp = (status.st_size, status.st_mtime_ns)
+    return expression_from_data(data, LazyRange(path, len(header), 0, 0, stamp).reference)
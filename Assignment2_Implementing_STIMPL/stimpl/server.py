@@ -0,0 +1,332 @@
+import argparse
+import asyncio
+import io
+import ipaddress
+import json
+import os
+import signal
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stdout
+from typing import Any, Dict, Optional
+
+from stimpl.cache import ResultCache
+from stimpl.expression import Expr
+from stimpl.runtime import clear_interrupts, interrupt, run_stimpl
+from stimpl.serialize import expression_from_data, expression_to_data
+import stimpl.metrics as metrics
+
+"""
+Local execution server.
+
+    python -m stimpl.server --socket /tmp/stimpl.sock --workers 4
+    python -m stimpl.server --port 7878
+
+The server only listens on a Unix socket or on the loopback interface.
+
+Programs are run by a pool of pre-forked workers that have stimpl imported
+and keep a result cache warm across requests. Clients send one JSON object
+per line:
+
+    {"id": 1, "program": <serialized program>, "timeout": 2.0, "max_output": 65536}
+
+where the program is encoded as in stimpl.serialize and the budgets are
+optional. Every request gets one line back, carrying the same id:
+
+    {"id": 1, "value": 20, "type": "Integer", "output": "", "elapsed": 0.0003}
+    {"id": 1, "error": "InterpTypeError", "message": "...", "output": "", "elapsed": 0.0001}
+
+Requests on a connection can be pipelined; responses are written as soon as
+they finish, so they may come back in a different order than they were sent.
+A line longer than --max-request-bytes is skipped and answered with a
+BadRequest error. If a worker dies, the requests it was running fail and the
+pool is started again for the next ones.
+
+With --metrics-port, the metrics of every run (see stimpl.metrics) are
+served over HTTP on that localhost port.
+"""
+
+# Lines longer than this are rejected; generous enough for very large programs.
+MAX_REQUEST_BYTES = 1 << 28
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class _BoundedOutput(io.StringIO):
+    def __init__(self, max_output: Optional[int]):
+        super().__init__()
+        self.max_output = max_output
+        self.written = 0
+
+    def write(self, text: str) -> int:
+        self.written += len(text)
+        if self.max_output is not None and self.written > self.max_output:
+            raise BudgetExceeded(f"Output exceeded {self.max_output} characters.")
+        return super().write(text)
+
+
+def _interrupt_timeout(signum, frame):
+    # The run stops at its next loop iteration, so the caches and the JIT are never left halfway through an update.
+    interrupt(BudgetExceeded("Time budget exceeded."))
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt()
+
+
+_worker_cache: Optional[ResultCache] = None
+
+
+def _init_worker() -> None:
+    global _worker_cache
+    _worker_cache = ResultCache()
+    signal.signal(signal.SIGALRM, _interrupt_timeout)
+    # Workers are forked from the server, but are stopped by the pool, not by the server's SIGTERM handler.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def execute_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs one request inside a worker process and builds its response."""
+    response: Dict[str, Any] = {"id": request.get("id")}
+    before = metrics.snapshot()
+    output = _BoundedOutput(request.get("max_output"))
+    timeout = request.get("timeout")
+    start = time.perf_counter()
+    try:
+        program = expression_from_data(request["program"])
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            with redirect_stdout(output):
+                value, value_type, _ = run_stimpl(program, cache=_worker_cache)
+        finally:
+            if timeout:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                # The timer may have gone off after the last loop, so nothing raised it.
+                clear_interrupts()
+        response["value"] = value
+        response["type"] = repr(value_type)
+    except Exception as e:
+        response["error"] = type(e).__name__
+        response["message"] = str(e)
+    response["output"] = output.getvalue()
+    response["elapsed"] = time.perf_counter() - start
+    # Taken off the response by the server, which adds it to its own metrics.
+    response["metrics"] = metrics.snapshot() - before
+    return response
+
+
+# Returned by _read_line for a line over the stream limit.
+_TOO_LONG = object()
+
+
+async def _read_line(reader: asyncio.StreamReader):
+    """Returns the next line (b"" at the end of the stream), or _TOO_LONG after skipping a line over the limit."""
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:
+        # The last line may not end with a newline.
+        return e.partial
+    except asyncio.LimitOverrunError as e:
+        consumed = e.consumed
+    # Drop the rest of the line a chunk at a time, so it is never buffered whole.
+    while True:
+        await reader.readexactly(consumed)
+        try:
+            await reader.readuntil(b"\n")
+            return _TOO_LONG
+        except asyncio.IncompleteReadError:
+            return _TOO_LONG
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+
+
+class StimplServer(object):
+    def __init__(
+        self,
+        socket_path: Optional[str] = None,
+        host: str = "127.0.0.1",
+        port: Optional[int] = None,
+        workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_output: Optional[int] = None,
+        max_request_bytes: int = MAX_REQUEST_BYTES,
+    ):
+        # Requests run arbitrary programs, so they are only taken from this machine.
+        if socket_path is None and host != "localhost" and not ipaddress.ip_address(host).is_loopback:
+            raise ValueError(f"The server only listens on a loopback address, not {host}.")
+        self.socket_path = socket_path
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_output = max_output
+        self.max_request_bytes = max_request_bytes
+        self.pool: Optional[ProcessPoolExecutor] = None
+
+    def start_pool(self, wait: bool = True) -> None:
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker)
+        # Fork every worker now instead of on the first requests.
+        futures = [self.pool.submit(_warm_up) for _ in range(self.workers)]
+        if wait:
+            for future in futures:
+                future.result()
+
+    def restart_pool(self, broken: ProcessPoolExecutor) -> None:
+        """Replaces a pool that a dead worker broke; requests that fail on it together only restart it once."""
+        if self.pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.start_pool(wait=False)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        write_lock = asyncio.Lock()
+        pending = set()
+        next_id = 0
+
+        async def send(response):
+            async with write_lock:
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+
+        async def respond(request):
+            pool = self.pool
+            try:
+                response = await loop.run_in_executor(pool, execute_request, request)
+                metrics.merge(response.pop("metrics"))
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self.restart_pool(pool)
+                response = {"id": request["id"], "error": type(e).__name__, "message": str(e)}
+            await send(response)
+
+        while line := await _read_line(reader):
+            next_id += 1
+            try:
+                if line is _TOO_LONG:
+                    raise ValueError(f"A request must be at most {self.max_request_bytes} bytes long.")
+                request = json.loads(line)
+                if not isinstance(request, dict) or "program" not in request:
+                    raise ValueError("A request must be an object with a program.")
+            except ValueError as e:
+                await send({"id": next_id, "error": "BadRequest", "message": str(e)})
+                continue
+            request.setdefault("id", next_id)
+            request.setdefault("timeout", self.timeout)
+            request.setdefault("max_output", self.max_output)
+            task = asyncio.create_task(respond(request))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+        writer.close()
+
+    async def serve_forever(self) -> None:
+        if self.pool is None:
+            self.start_pool()
+        # SIGTERM stops the server between callbacks, instead of interrupting a response halfway.
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        if self.socket_path is not None:
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            server = await asyncio.start_unix_server(
+                self.handle, self.socket_path, limit=self.max_request_bytes
+            )
+        else:
+            server = await asyncio.start_server(
+                self.handle, self.host, self.port, limit=self.max_request_bytes
+            )
+        async with server:
+            await server.serve_forever()
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+        if self.socket_path is not None and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+class StimplClient(object):
+    """Blocking client for StimplServer. send/receive can be used to pipeline requests."""
+
+    def __init__(self, socket_path: Optional[str] = None, host: str = "127.0.0.1", port: Optional[int] = None):
+        if socket_path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(socket_path)
+        else:
+            self.socket = socket.create_connection((host, port))
+        self.reader = self.socket.makefile("rb")
+        self.next_id = 0
+
+    def __enter__(self) -> "StimplClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def send(self, program: Expr, timeout: Optional[float] = None, max_output: Optional[int] = None) -> int:
+        self.next_id += 1
+        request = {"id": self.next_id, "program": expression_to_data(program)}
+        if timeout is not None:
+            request["timeout"] = timeout
+        if max_output is not None:
+            request["max_output"] = max_output
+        self.socket.sendall(json.dumps(request, separators=(",", ":")).encode() + b"\n")
+        return self.next_id
+
+    def receive(self) -> Dict[str, Any]:
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("The server closed the connection.")
+        return json.loads(line)
+
+    def run(self, program: Expr, timeout: Optional[float] = None, max_output: Optional[int] = None) -> Dict[str, Any]:
+        request_id = self.send(program, timeout, max_output)
+        response = self.receive()
+        if response["id"] != request_id:
+            raise ConnectionError("run() cannot be mixed with pipelined requests still in flight.")
+        return response
+
+    def close(self) -> None:
+        self.reader.close()
+        self.socket.close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m stimpl.server", description="Run STIMPL programs for local clients.")
+    listen = parser.add_mutually_exclusive_group(required=True)
+    listen.add_argument("--socket", help="Unix domain socket to listen on")
+    listen.add_argument("--port", type=int, help="localhost TCP port to listen on")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--timeout", type=float, default=None, help="default time budget per request, in seconds")
+    parser.add_argument("--max-output", type=int, default=None, help="default output budget per request, in characters")
+    parser.add_argument("--max-request-bytes", type=int, default=MAX_REQUEST_BYTES, help="longest request line accepted")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve metrics over HTTP on this localhost port")
+    args = parser.parse_args(argv)
+
+    # Stop cleanly (removing the socket) on SIGTERM as well as on Ctrl-C.
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    server = StimplServer(
+        args.socket, "127.0.0.1", args.port, args.workers, args.timeout, args.max_output, args.max_request_bytes
+    )
+    exporter = metrics.MetricsExporter(port=args.metrics_port) if args.metrics_port is not None else None
+    try:
+        asyncio.run(server.serve_forever())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        server.close()
+        if exporter is not None:
+            exporter.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import io
+import json
+import sys
+from contextlib import redirect_stdout
+from functools import cached_property
+from typing import Any, List, Optional, Sequence as SequenceType
+
+from stimpl.cache import structural_hash
+from stimpl.errors import InterpError
+from stimpl.expression import *
+from stimpl.runtime import EmptyState, State, state_bindings
+from stimpl.serialize import expression_from_data, expression_to_data
+from stimpl.types import *
+import stimpl.runtime as runtime
+
+"""
+Interactive sessions with incremental re-execution.
+
+A Session holds the top-level expressions of a program together with the
+State reached after each of them. When the program is run again after an
+edit, every expression up to the first changed one is skipped: since State
+is persistent, the state after the unchanged prefix is still valid and
+evaluation simply carries on from it. An expression is unchanged when it is
+the same object as before or, failing that, has the same structural hash
+(see stimpl.cache), which does not load lazy subtrees. The output printed by each expression
+is kept as well, so the output of the whole program is available without
+re-running the prefix.
+
+    python -m stimpl.session
+
+reads one command per line: a serialized expression (see stimpl.serialize)
+is appended to the program, ":edit N <expression>" replaces expression N,
+":delete N" removes it, ":state" shows the live bindings, ":list" the
+program and ":quit" ends the session.
+"""
+
+
+class SessionEntry(object):
+    def __init__(self, expression: Expr, value: Any, value_type: Type, state: State, output: str):
+        self.expression = expression
+        self.value = value
+        self.value_type = value_type
+        # State right after the expression ran.
+        self.state = state
+        self.output = output
+
+    @cached_property
+    def fingerprint(self) -> Optional[str]:
+        # Only needed once the expression is replaced by a different object.
+        return structural_hash(self.expression)
+
+
+class Session(object):
+    def __init__(self, echo: bool = True):
+        # Print the output of expressions as they are evaluated.
+        self.echo = echo
+        self.expressions: List[Expr] = []
+        # One entry per expression that ran, a prefix of expressions when the last run failed.
+        self.entries: List[SessionEntry] = []
+        # How many expressions the last run skipped and evaluated.
+        self.reused = 0
+        self.evaluated = 0
+
+    @property
+    def exprs(self) -> List[Expr]:
+        return list(self.expressions)
+
+    @property
+    def state(self) -> State:
+        return self.entries[-1].state if self.entries else EmptyState()
+
+    @property
+    def output(self) -> str:
+        return "".join(entry.output for entry in self.entries)
+
+    def result(self):
+        if not self.entries:
+            return None, Unit(), EmptyState()
+        last = self.entries[-1]
+        return last.value, last.value_type, last.state
+
+    def run(self, exprs: SequenceType[Expr]):
+        """Makes `exprs` the program of the session and returns what run_stimpl(Program(*exprs)) would.
+
+        On an error, the session still holds all of `exprs`, but only the states
+        reached before the failing expression; the next run starts from there.
+        """
+        self.expressions = list(exprs)
+        prefix = 0
+        for entry, expr in zip(self.entries, exprs):
+            if entry.expression is not expr:
+                fingerprint = entry.fingerprint
+                if fingerprint is None or fingerprint != structural_hash(expr):
+                    break
+            prefix += 1
+        del self.entries[prefix:]
+        self.reused, self.evaluated = prefix, 0
+
+        state = self.state
+        for expr in exprs[prefix:]:
+            output = io.StringIO()
+            try:
+                with redirect_stdout(output):
+                    value, value_type, state = runtime.evaluate(expr, state)
+            finally:
+                self.evaluated += 1
+                if self.echo:
+                    sys.stdout.write(output.getvalue())
+            self.entries.append(SessionEntry(expr, value, value_type, state, output.getvalue()))
+        return self.result()
+
+    def append(self, expr: Expr):
+        return self.run(self.exprs + [expr])
+
+    def edit(self, index: int, expr: Expr):
+        exprs = self.exprs
+        exprs[index] = expr
+        return self.run(exprs)
+
+    def delete(self, index: int):
+        exprs = self.exprs
+        del exprs[index]
+        return self.run(exprs)
+
+
+def _show_state(state: State) -> None:
+    # Live bindings only, newest first.
+    seen = set()
+    for variable_name, variable_value, variable_type in reversed(state_bindings(state)):
+        if variable_name not in seen:
+            seen.add(variable_name)
+            print(f"{variable_name}: ({variable_value!r}, {variable_type})")
+
+
+def main(argv=None) -> None:
+    session = Session()
+    prompt = "stimpl> " if sys.stdin.isatty() else ""
+    while True:
+        try:
+            line = input(prompt).strip()
+        except EOFError:
+            break
+        command, _, argument = line.partition(" ")
+        try:
+            if not line:
+                continue
+            elif command == ":quit":
+                break
+            elif command == ":state":
+                _show_state(session.state)
+                continue
+            elif command == ":list":
+                for index, expr in enumerate(session.exprs):
+                    print(f"{index}: {json.dumps(expression_to_data(expr))}")
+                continue
+            elif command == ":edit":
+                index, _, text = argument.partition(" ")
+                value, value_type, _ = session.edit(int(index), expression_from_data(json.loads(text)))
+            elif command == ":delete":
+                value, value_type, _ = session.delete(int(argument))
+            else:
+                value, value_type, _ = session.append(expression_from_data(json.loads(line)))
+        except (InterpError, ValueError, IndexError) as e:
+            print(f"{type(e).__name__}: {e}")
+            continue
+        print(f"({value!r}, {value_type})  [{session.reused} reused, {session.evaluated} evaluated]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+from typing import Any, Dict, FrozenSet, Iterable, List, NamedTuple, Optional
+
+from stimpl.errors import InterpError
+from stimpl.expression import *
+from stimpl.parallel import read_write_sets
+from stimpl.runtime import EmptyState, python_type
+from stimpl.types import *
+import stimpl.runtime as runtime
+
+"""
+Partial evaluation.
+
+specialize(program, known={"n": 100}) returns a residual program that gives
+the same result as running `program` with those inputs bound (see the
+`inputs` argument of run_stimpl), for any values of the remaining inputs.
+Everything that only depends on known values is computed ahead of time:
+operators are folded, Ifs with a known condition are resolved and While
+loops with a known condition are unrolled, up to `max_unroll` iterations per
+loop and `fuel` nodes overall. What is left reads the unknown inputs, which
+are the variables the program reads before assigning them. Any variable the
+program assigns before reading it may be an unknown input as well, bound at
+run time, unless `inputs` lists the names of the unknown inputs.
+
+Each variable is tracked as known (with its value) or unknown. An Assign of
+a known value is dropped unless the variable is already bound at run time,
+since every later read is replaced by the value. An Assign to a variable
+that may be an unknown input is kept in place, where its type check against
+the run-time value happens, and so the variable is bound from then on;
+passing `inputs` lets the Assigns to the other variables be dropped. Such a variable is only
+materialized, by assigning its value as a literal, when the run-time state
+needs it: before it is assigned an unknown value (which keeps the type
+check), when the branches of a residual If or the iterations of a residual
+While disagree on it, and at the end of the program, so the live bindings
+of the final state match the original ones.
+
+Operations that would fail, such as a division by zero or mismatched
+types, are never folded; they are left in the residual program with their
+operands, so they fail at run time at the same point as before.
+"""
+
+_LITERALS = {Integer: IntLiteral, FloatingPoint: FloatingPointLiteral, String: StringLiteral, Boolean: BooleanLiteral}
+
+
+class Binding(NamedTuple):
+    known: bool
+    value: Any
+    value_type: Optional[Type]
+    # Whether the run-time state holds the variable (with the same value, when it is known).
+    bound: bool
+
+
+class Partial(NamedTuple):
+    # Residual expressions to run for their effects, followed by the known value.
+    effects: List[Expr]
+    known: bool
+    value: Any = None
+    value_type: Optional[Type] = None
+    # The residual expression computing the value, when it is unknown.
+    expr: Optional[Expr] = None
+
+
+def literal(value: Any, value_type: Type) -> Expr:
+    if isinstance(value_type, Unit):
+        return Ren()
+    return _LITERALS[type(value_type)](value)
+
+
+def sequence(exprs: List[Expr]) -> Expr:
+    if len(exprs) == 1:
+        return exprs[0]
+    return Sequence(*exprs)
+
+
+def _known(effects: List[Expr], value: Any, value_type: Type) -> Partial:
+    return Partial(effects, True, value, value_type)
+
+
+def _unknown(expr: Expr) -> Partial:
+    return Partial([], False, expr=expr)
+
+
+def _as_expr(partial: Partial) -> Expr:
+    if partial.known:
+        return sequence(partial.effects + [literal(partial.value, partial.value_type)])
+    return partial.expr
+
+
+def _effects(partial: Partial) -> List[Expr]:
+    return partial.effects if partial.known else [partial.expr]
+
+
+class Specializer(object):
+    def __init__(self, known: Dict[str, Any], inputs: Optional[FrozenSet[str]], max_unroll: int, fuel: int):
+        self.env: Dict[str, Binding] = {
+            name: Binding(True, value, python_type(value), False) for name, value in known.items()
+        }
+        # The names of the unknown inputs, or None when any variable may be one.
+        self.inputs = inputs
+        self.max_unroll = max_unroll
+        self.fuel = fuel
+
+    def program(self, program: Expr) -> Program:
+        exprs = program.exprs if isinstance(program, Program) else (program,)
+        residual: List[Expr] = []
+        result = _known([], None, Unit())
+        for expr in exprs:
+            residual.extend(_effects(result))
+            result = self.specialize(expr)
+        residual.extend(result.effects)
+        # Bind what is still only known statically, so the final state has every live binding.
+        residual.extend(self.materialize(name for name, binding in self.env.items() if not binding.bound))
+        if result.known:
+            residual.append(literal(result.value, result.value_type))
+        else:
+            residual.append(result.expr)
+        return Program(*residual)
+
+    def materialize(self, names) -> List[Expr]:
+        assigns = []
+        for name in list(names):
+            binding = self.env.get(name)
+            if binding is not None and binding.known and not binding.bound:
+                assigns.append(Assign(Variable(name), literal(binding.value, binding.value_type)))
+                self.env[name] = binding._replace(bound=True)
+        return assigns
+
+    def fold(self, expression: Expr, operands: List[Partial]) -> Partial:
+        """Folds an operator whose operands were specialized, or leaves it in the residual program."""
+        effects = [effect for operand in operands for effect in _effects(operand)]
+        if all(operand.known for operand in operands):
+            literals = [literal(operand.value, operand.value_type) for operand in operands]
+            try:
+                value, value_type, _ = runtime.evaluate(type(expression)(*literals), EmptyState())
+                return _known(effects, value, value_type)
+            except InterpError:
+                # Keep the failing operation, so that it fails when the residual program runs.
+                pass
+        return _unknown(type(expression)(*[_as_expr(operand) for operand in operands]))
+
+    def specialize(self, expression: Expr) -> Partial:
+        self.fuel -= 1
+        match expression:
+            case Ren() | Literal():
+                value, value_type, _ = runtime.evaluate(expression, EmptyState())
+                return _known([], value, value_type)
+
+            case Variable(variable_name=variable_name):
+                binding = self.env.get(variable_name)
+                if binding is None:
+                    # An unknown input, bound when the residual program runs.
+                    self.env[variable_name] = Binding(False, None, None, True)
+                elif binding.known:
+                    return _known([], binding.value, binding.value_type)
+                return _unknown(expression)
+
+            case Assign(variable=variable, value=value):
+                name = variable.variable_name
+                result = self.specialize(value)
+                binding = self.env.get(name)
+                if result.known:
+                    mismatched = binding is not None and binding.value_type is not None and binding.value_type != result.value_type
+                    # An unknown input of another type would make the assignment fail at run time, right here.
+                    if binding is None and (self.inputs is None or name in self.inputs):
+                        self.env[name] = Binding(True, result.value, result.value_type, True)
+                        return _known([Assign(variable, _as_expr(result))], result.value, result.value_type)
+                    if not mismatched and (binding is None or not binding.bound):
+                        self.env[name] = Binding(True, result.value, result.value_type, False)
+                        return result
+                    # Keep the assignment: the variable is bound at run time, or the type check must fail there.
+                    prefix = self.materialize([name])
+                    if not mismatched:
+                        self.env[name] = Binding(True, result.value, result.value_type, True)
+                        return _known(
+                            prefix + [Assign(variable, _as_expr(result))], result.value, result.value_type
+                        )
+                    return _unknown(sequence(prefix + [Assign(variable, _as_expr(result))]))
+                prefix = self.materialize([name])
+                self.env[name] = Binding(False, None, binding.value_type if binding else None, True)
+                return _unknown(sequence(prefix + [Assign(variable, result.expr)]))
+
+            case Print(to_print=to_print):
+                result = self.specialize(to_print)
+                if result.known:
+                    return _known([Print(_as_expr(result))], result.value, result.value_type)
+                return _unknown(Print(result.expr))
+
+            case Not(expr=expr):
+                return self.fold(expression, [self.specialize(expr)])
+
+            case BinaryOperator(left=left, right=right):
+                left_result = self.specialize(left)
+                return self.fold(expression, [left_result, self.specialize(right)])
+
+            case Program(exprs=exprs) | Sequence(exprs=exprs):
+                effects: List[Expr] = []
+                result = _known([], None, Unit())
+                for expr in exprs:
+                    effects.extend(_effects(result))
+                    result = self.specialize(expr)
+                if result.known:
+                    return _known(effects + result.effects, result.value, result.value_type)
+                return _unknown(sequence(effects + [result.expr]))
+
+            case If(condition=condition, true=true, false=false):
+                result = self.specialize(condition)
+                if result.known:
+                    if not isinstance(result.value_type, Boolean):
+                        return _unknown(If(_as_expr(result), Ren(), Ren()))
+                    branch = self.specialize(true if result.value else false)
+                    if branch.known:
+                        return _known(result.effects + branch.effects, branch.value, branch.value_type)
+                    return _unknown(sequence(result.effects + [branch.expr]))
+                return self.residual_if(result.expr, true, false)
+
+            case While(condition=condition, body=body):
+                return self.specialize_while(expression, condition, body)
+
+            case Lazy():
+                return self.specialize(expression.force())
+
+            case _:
+                return _unknown(expression)
+
+    def residual_if(self, condition: Expr, true: Expr, false: Expr) -> Partial:
+        before = self.env
+        self.env = dict(before)
+        true_result = self.specialize(true)
+        true_env = self.env
+        self.env = dict(before)
+        false_result = self.specialize(false)
+        false_env = self.env
+
+        merged: Dict[str, Binding] = {}
+        disagree = []
+        for name in true_env.keys() | false_env.keys():
+            in_true, in_false = true_env.get(name), false_env.get(name)
+            if in_true is None or in_false is None:
+                # Only assigned on one side: whatever the other side reads would fail either way.
+                one = in_true or in_false
+                disagree.append(name)
+                merged[name] = Binding(False, None, one.value_type, True)
+            elif in_true.known and in_false.known and in_true.value_type == in_false.value_type and in_true.value == in_false.value:
+                merged[name] = Binding(True, in_true.value, in_true.value_type, in_true.bound and in_false.bound)
+            else:
+                disagree.append(name)
+                merged[name] = Binding(False, None, in_true.value_type or in_false.value_type, True)
+
+        # Each branch binds the variables the branches disagree on before producing its value.
+        self.env = true_env
+        true_expr = self.with_materialized(true_result, disagree)
+        self.env = false_env
+        false_expr = self.with_materialized(false_result, disagree)
+        self.env = merged
+        return _unknown(If(condition, true_expr, false_expr))
+
+    def with_materialized(self, result: Partial, names: List[str]) -> Expr:
+        # Materialized variables are not touched at run time by the rest of the
+        # branch, so their assignments can go right before its value.
+        assigns = self.materialize(names)
+        if result.known:
+            return sequence(result.effects + assigns + [literal(result.value, result.value_type)])
+        return sequence(assigns + [result.expr])
+
+    def specialize_while(self, expression: While, condition: Expr, body: Expr) -> Partial:
+        effects: List[Expr] = []
+        iterations = 0
+        while iterations < self.max_unroll and self.fuel > 0:
+            snapshot, fuel = dict(self.env), self.fuel
+            result = self.specialize(condition)
+            if not result.known:
+                # Nothing was committed yet; fall back to a residual loop from this state.
+                self.env, self.fuel = snapshot, fuel
+                break
+            if not isinstance(result.value_type, Boolean):
+                return _unknown(sequence(effects + [While(_as_expr(result), Ren())]))
+            effects.extend(result.effects)
+            if not result.value:
+                return _known(effects, result.value, result.value_type)
+            effects.extend(_effects(self.specialize(body)))
+            iterations += 1
+        return _unknown(sequence(effects + [self.residual_while(condition, body)]))
+
+    def residual_while(self, condition: Expr, body: Expr) -> Expr:
+        written = set()
+        for part in (condition, body):
+            # The loop is specialized below anyway, so loading its lazy parts costs nothing extra.
+            written |= read_write_sets(part, load=True)[1]
+        # Variables the loop assigns are unknown at the top of every iteration.
+        prefix = self.materialize(written)
+        for name in written:
+            binding = self.env.get(name)
+            self.env[name] = Binding(False, None, binding.value_type if binding else None, True)
+        head = dict(self.env)
+        condition_expr = _as_expr(self.specialize(condition))
+        body_effects = _effects(self.specialize(body))
+        self.env = head
+        return sequence(prefix + [While(condition_expr, sequence(body_effects or [Ren()]))])
+
+
+def specialize(
+    program: Expr,
+    known: Optional[Dict[str, Any]] = None,
+    max_unroll: int = 1000,
+    fuel: int = 1_000_000,
+    inputs: Optional[Iterable[str]] = None,
+) -> Program:
+    """Returns a residual program equivalent to `program` run with the `known` inputs bound.
+
+    `inputs` names the inputs that may be bound when the residual program runs;
+    when it is None, any variable may be.
+    """
+    return Specializer(known or {}, frozenset(inputs) if inputs is not None else None, max_unroll, fuel).program(program)
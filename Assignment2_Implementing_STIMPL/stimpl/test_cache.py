@@ -0,0 +1,89 @@
+import tempfile
+
+from stimpl.cache import ResultCache, program_key, result_bytes
+from stimpl.runtime import run_stimpl
+from stimpl.expression import *
+from stimpl.types import *
+from stimpl.test import check_equal
+
+
+def sum_program(limit):
+    return Program(
+        Assign(Variable("i"), IntLiteral(0)),
+        Assign(Variable("total"), IntLiteral(0)),
+        While(Lt(Variable("i"), IntLiteral(limit)), Sequence(
+            Assign(Variable("total"), Add(Variable("total"), Variable("i"))),
+            Assign(Variable("i"), Add(Variable("i"), IntLiteral(1))))),
+        Variable("total"))
+
+
+def test_program_key():
+    check_equal(program_key(sum_program(10)), program_key(sum_program(10)))
+    check_equal(False, program_key(sum_program(10)) == program_key(sum_program(11)))
+    check_equal(False, program_key(IntLiteral(1)) == program_key(BooleanLiteral(True)))
+    check_equal(None, program_key(Program(Print(IntLiteral(1)))))
+
+
+def test_result_cache():
+    cache = ResultCache(max_entries=2)
+    first = run_stimpl(sum_program(10), cache=cache)
+    second = run_stimpl(sum_program(10), cache=cache)
+    check_equal((45, Integer()), second[:2])
+    check_equal(first[2], second[2])
+    check_equal({"entries": 1, "bytes": result_bytes(first), "hits": 1, "disk_hits": 0, "misses": 1, "evictions": 0}, cache.stats())
+
+    run_stimpl(sum_program(11), cache=cache)
+    run_stimpl(sum_program(12), cache=cache)
+    check_equal(2, cache.stats()["entries"])
+    check_equal(1, cache.stats()["evictions"])
+
+    # Impure programs are never cached.
+    run_stimpl(Program(Print(StringLiteral("")), IntLiteral(1)), cache=cache)
+    check_equal(3, cache.stats()["misses"])
+
+    # A miss hashes the program once, unless the run loaded a lazy subtree, which may hold a Print.
+    keys = []
+
+    class CountingCache(ResultCache):
+        def key(self, program):
+            keys.append(program)
+            return super().key(program)
+
+    counting = CountingCache()
+    run_stimpl(sum_program(13), cache=counting)
+    check_equal(1, len(keys))
+    lazy = Program(Lazy(lambda: Sequence(Print(StringLiteral("")), IntLiteral(1)), source=("test", 0)))
+    run_stimpl(lazy, cache=counting)
+    check_equal((3, 1), (len(keys), counting.stats()["entries"]))
+
+    cache.clear()
+    check_equal({"entries": 0, "bytes": 0, "hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}, cache.stats())
+
+
+def test_result_cache_byte_budget():
+    i = Variable("i")
+    small = Program(Assign(i, IntLiteral(1)), i)
+    # Every iteration leaves another binding in the state chain.
+    large = sum_program(1000)
+    cache = ResultCache(max_bytes=result_bytes(run_stimpl(large)) + result_bytes(run_stimpl(small)))
+    run_stimpl(small, cache=cache)
+    run_stimpl(large, cache=cache)
+    check_equal((2, 0), (cache.stats()["entries"], cache.stats()["evictions"]))
+    # A second small result does not fit next to the large one, which is the least recently used.
+    run_stimpl(small, cache=cache)
+    run_stimpl(Program(Assign(i, IntLiteral(2)), i), cache=cache)
+    check_equal((2, 1), (cache.stats()["entries"], cache.stats()["evictions"]))
+    check_equal(True, cache.stats()["bytes"] <= cache.max_bytes)
+    # A result larger than the whole budget is not kept in memory.
+    run_stimpl(sum_program(2000), cache=cache)
+    check_equal(2, cache.stats()["entries"])
+
+
+def test_result_cache_disk_tier():
+    with tempfile.TemporaryDirectory() as directory:
+        run_stimpl(sum_program(20), cache=ResultCache(directory=directory))
+        cache = ResultCache(directory=directory)
+        value, value_type, state = run_stimpl(sum_program(20), cache=cache)
+        check_equal((190, Integer()), (value, value_type))
+        check_equal((20, Integer()), state.get_value("i"))
+        check_equal(1, cache.stats()["disk_hits"])
@@ -0,0 +1,142 @@
+import io
+import os
+import tempfile
+import threading
+from contextlib import redirect_stdout
+
+from stimpl.checkpoint import load_checkpoint, program_path, resume_stimpl
+from stimpl.runtime import evaluation_hook, live_bindings, run_stimpl, state_bindings
+import stimpl.jit as jit
+import stimpl.runtime as runtime
+from stimpl.expression import *
+from stimpl.types import *
+from stimpl.test import check_equal
+
+
+class Preempted(Exception):
+    pass
+
+
+def preempt_after(steps):
+    remaining = [steps]
+
+    def hook(evaluate_next, expression, state):
+        remaining[0] -= 1
+        if remaining[0] == 0:
+            raise Preempted()
+        return evaluate_next(expression, state)
+    return hook
+
+
+def nested_loops():
+    return Program(
+        Assign(Variable("i"), IntLiteral(0)),
+        Assign(Variable("total"), IntLiteral(0)),
+        While(Lt(Variable("i"), IntLiteral(6)), Sequence(
+            Assign(Variable("j"), IntLiteral(0)),
+            While(Lt(Variable("j"), Variable("i")), Sequence(
+                If(Eq(Variable("j"), IntLiteral(2)),
+                   Print(Variable("total")),
+                   Assign(Variable("total"), Add(Variable("total"), Variable("j")))),
+                Assign(Variable("j"), Add(Variable("j"), IntLiteral(1))))),
+            Assign(Variable("i"), Add(Variable("i"), IntLiteral(1))))),
+        Variable("total"))
+
+
+def test_checkpoint_and_resume():
+    program = nested_loops()
+    output = io.StringIO()
+    with redirect_stdout(output):
+        expected_value, expected_type, expected_state = run_stimpl(program)
+    expected_output = output.getvalue().splitlines()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "run.checkpoint")
+        for steps in [1, 5, 40, 101, 257, 400]:
+            output = io.StringIO()
+            with redirect_stdout(output):
+                try:
+                    with evaluation_hook(preempt_after(steps)):
+                        run_stimpl(program, checkpoint=path, checkpoint_every=0)
+                except Preempted:
+                    pass
+                before = output.getvalue().splitlines()
+                value, value_type, state = resume_stimpl(path)
+            resumed_output = output.getvalue().splitlines()[len(before):]
+            check_equal((expected_value, expected_type), (value, value_type))
+            check_equal(live_bindings(expected_state), live_bindings(state))
+            check_equal(expected_output[len(expected_output) - len(resumed_output):], resumed_output)
+
+    # Preempted in the inner loop, the continuation goes through both loops.
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "run.checkpoint")
+        with redirect_stdout(io.StringIO()):
+            try:
+                with evaluation_hook(preempt_after(300)):
+                    run_stimpl(program, checkpoint=path, checkpoint_every=0)
+            except Preempted:
+                pass
+        program_size = os.path.getsize(program_path(path))
+        _, node_path, iterations, state, _ = load_checkpoint(path)
+        check_equal(2, len(iterations))
+        check_equal([2, 1, 1, 1], node_path[:4])
+        # The program is only in its own file, and the checkpoint holds no shadowed bindings.
+        check_equal(live_bindings(state), state_bindings(state))
+        check_equal(True, os.path.getsize(path) < program_size)
+
+
+def test_evaluation_hooks_are_per_thread():
+    jit.reset_traces()
+    seen = {"first": 0, "second": 0}
+    entered = threading.Barrier(2)
+    first_exited = threading.Event()
+
+    def counting(name):
+        def hook(evaluate_next, expression, state):
+            seen[name] += 1
+            return evaluate_next(expression, state)
+        return hook
+
+    def first():
+        with evaluation_hook(counting("first")):
+            entered.wait()
+            run_stimpl(IntLiteral(1))
+        first_exited.set()
+
+    def second():
+        with evaluation_hook(counting("second")):
+            entered.wait()
+            # Exits after the hook that was installed first.
+            first_exited.wait()
+            run_stimpl(Add(IntLiteral(1), IntLiteral(2)))
+
+    threads = [threading.Thread(target=first), threading.Thread(target=second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    check_equal({"first": 1, "second": 3}, seen)
+
+    # Neither hook is left behind, and a hook in another thread sees none of the nodes of this one
+    # and keeps its loops on the JIT.
+    check_equal(((), 0), (runtime._evaluation_hooks.get(), runtime._installed_hooks))
+    installed, released = threading.Event(), threading.Event()
+
+    def hooked():
+        with evaluation_hook(counting("first")):
+            installed.set()
+            released.wait()
+
+    thread = threading.Thread(target=hooked)
+    thread.start()
+    installed.wait()
+    program = Program(
+        Assign(Variable("i"), IntLiteral(0)),
+        While(Lt(Variable("i"), IntLiteral(500)), Assign(Variable("i"), Add(Variable("i"), IntLiteral(1)))))
+    try:
+        run_stimpl(program)
+    finally:
+        released.set()
+        thread.join()
+    check_equal(1, seen["first"])
+    check_equal(True, program.exprs[1] in jit._traces)
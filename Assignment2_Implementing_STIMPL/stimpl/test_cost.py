@@ -0,0 +1,70 @@
+import math
+
+from stimpl.batch import AdmissionRejected, BatchScheduler
+from stimpl.cost import DEFAULT_TRIPS, estimate_cost
+from stimpl.expression import *
+from stimpl.runtime import evaluation_hook, run_stimpl
+from stimpl.types import *
+from stimpl.test import check_equal
+
+
+def counting_loop(start, condition, step, limit):
+    i = Variable("i")
+    return Program(
+        Assign(i, IntLiteral(start)),
+        Assign(Variable("limit"), IntLiteral(limit)),
+        While(condition(i, Variable("limit")), Assign(i, Add(i, IntLiteral(step)))),
+    )
+
+
+def evaluated_nodes(program):
+    count = [0]
+
+    def hook(evaluate_next, expression, state):
+        count[0] += 1
+        return evaluate_next(expression, state)
+
+    with evaluation_hook(hook):
+        run_stimpl(program)
+    return count[0]
+
+
+def test_estimate_cost():
+    for start, condition, step, limit in ((0, Lt, 1, 10), (0, Lte, 3, 10), (10, Gt, -3, 0), (0, Ne, 2, 10), (5, Lt, 1, 0)):
+        program = counting_loop(start, condition, step, limit)
+        # Counter loops without branches are estimated exactly.
+        check_equal(evaluated_nodes(program), estimate_cost(program).work)
+    check_equal((16, 1, 0), estimate_cost(counting_loop(0, Lt, 1, 10))[:3])
+
+    check_equal(True, estimate_cost(counting_loop(0, Ne, 2, 9)).runaway)
+    check_equal(True, estimate_cost(counting_loop(0, Lt, -1, 10)).runaway)
+    check_equal(True, estimate_cost(While(BooleanLiteral(True), Ren())).runaway)
+
+    i, j = Variable("i"), Variable("j")
+    guessed = Program(Assign(i, IntLiteral(0)), While(Lt(i, j), Assign(i, Add(i, IntLiteral(1)))))
+    cost = estimate_cost(guessed)
+    check_equal((1, 1, False), (cost.guessed_loops, cost.loop_nesting, cost.runaway))
+    check_equal(True, cost.work > DEFAULT_TRIPS)
+
+
+def test_batch_scheduler_runs_shortest_first():
+    for workers in (1, 2):
+        scheduler = BatchScheduler(workers=workers, max_work=10000, chunk_work=100)
+        scheduler.submit(counting_loop(0, Lt, 1, 1000))
+        for n in range(5):
+            scheduler.submit(Add(IntLiteral(n), IntLiteral(1)))
+        scheduler.submit(Print(Divide(IntLiteral(1), IntLiteral(0))))
+        for program in (counting_loop(0, Lt, -1, 10), counting_loop(0, Lt, 1, 100000)):
+            try:
+                scheduler.submit(program)
+                check_equal("AdmissionRejected", "admitted")
+            except AdmissionRejected:
+                pass
+
+        results = scheduler.run()
+        check_equal(list(range(7)), [result.index for result in results])
+        # The big loop was submitted first but runs last.
+        check_equal(6, results[0].position)
+        check_equal([(n + 1, Integer()) for n in range(5)], [(result.value, result.value_type) for result in results[1:6]])
+        check_equal(("InterpMathError: Cannot divide by zero", ""), (results[6].error, results[6].output))
+        check_equal([], scheduler.pending)
@@ -0,0 +1,37 @@
+import pickle
+
+from stimpl.runtime import run_stimpl
+from stimpl.expression import *
+from stimpl.types import *
+from stimpl.errors import *
+from stimpl.test import check_equal
+
+
+def raised_by(program):
+    try:
+        run_stimpl(program)
+    except InterpError as e:
+        return e
+    raise AssertionError(f"{program} should have raised")
+
+
+def test_structured_errors():
+    program = Add(IntLiteral(1), StringLiteral("a"))
+    error = raised_by(program)
+    # Nothing has been formatted yet.
+    check_equal(None, error._message)
+    check_equal(("Add", Integer(), String(), program), (error.operator, error.left_type, error.right_type, error.node))
+    check_equal("Mismatched types for Add: Cannot add Integer to String", str(error))
+    check_equal(("Mismatched types for Add: Cannot add Integer to String",), error.args)
+
+    error = raised_by(Variable("missing"))
+    check_equal("Cannot read from missing before assignment.", str(error))
+    check_equal("missing", error.fields["variable_name"])
+
+    # Plain messages keep working, with their whitespace collapsed.
+    check_equal("Cannot do { that }", str(InterpTypeError("Cannot do\n   { that }")))
+    check_equal("InterpMathError", str(InterpMathError()))
+    check_equal(("InterpMathError",), InterpMathError().args)
+
+    copy = pickle.loads(pickle.dumps(raised_by(Divide(IntLiteral(1), IntLiteral(0)))))
+    check_equal((InterpMathError, "Cannot divide by zero", "Divide"), (type(copy), str(copy), copy.operator))
@@ -0,0 +1,26 @@
+import io
+from contextlib import redirect_stdout
+
+from stimpl.gen import GeneratorConfig, fit_exponent, generate_program, scaling_curve
+from stimpl.runtime import run_stimpl
+from stimpl.test import check_equal
+
+
+def test_generated_programs_are_well_typed():
+    weights = {"assign": 6, "if": 2, "while": 1, "print": 1}
+    for seed in range(60):
+        program = generate_program(GeneratorConfig(statements=25, statement_weights=weights, seed=seed))
+        with redirect_stdout(io.StringIO()):
+            run_stimpl(program)
+
+
+def test_generator_is_reproducible():
+    check_equal(repr(generate_program(seed=7)), repr(generate_program(seed=7)))
+    check_equal(False, repr(generate_program(seed=7)) == repr(generate_program(seed=8)))
+
+
+def test_scaling_curve():
+    check_equal(1.0, round(fit_exponent([10, 20, 40], [3, 6, 12]), 6))
+    check_equal(2.0, round(fit_exponent([10, 20, 40], [1, 4, 16]), 6))
+    result = scaling_curve("tiny", lambda size: generate_program(statements=size), [5, 10, 20], repeat=1)
+    check_equal(3, len(result.seconds))
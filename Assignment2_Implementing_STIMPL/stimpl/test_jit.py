@@ -0,0 +1,99 @@
+import io
+import signal
+from contextlib import redirect_stdout
+
+import stimpl.jit as jit
+from stimpl.runtime import interrupt, run_stimpl
+from stimpl.expression import *
+from stimpl.types import *
+from stimpl.errors import *
+from stimpl.test import check_equal, check_program_raises
+
+
+def run_without_jit(program):
+    jit.jit_enabled = False
+    try:
+        return run_stimpl(program)
+    finally:
+        jit.jit_enabled = True
+
+
+def counting_loop(body, limit=500):
+    return Program(
+        Assign(Variable("i"), IntLiteral(0)),
+        Assign(Variable("total"), IntLiteral(0)),
+        While(Lt(Variable("i"), IntLiteral(limit)), Sequence(
+            body,
+            Assign(Variable("i"), Add(Variable("i"), IntLiteral(1))))),
+        Variable("total"))
+
+
+def test_jit_matches_interpreter():
+    jit.reset_traces()
+    program = counting_loop(
+        Assign(Variable("total"), Add(Variable("total"), Multiply(Variable("i"), IntLiteral(2)))))
+    value, value_type, state = run_stimpl(program)
+    expected_value, expected_type, expected_state = run_without_jit(program)
+    check_equal((expected_value, expected_type), (value, value_type))
+    check_equal(expected_state.get_value("i"), state.get_value("i"))
+    check_equal(True, program.exprs[2] in jit._traces)
+
+
+def test_jit_side_exit_on_other_branch():
+    jit.reset_traces()
+    # Hot with the true branch first, then the guard on the If fails for every i >= 200.
+    program = counting_loop(If(Lt(Variable("i"), IntLiteral(200)),
+                               Assign(Variable("total"), Add(Variable("total"), IntLiteral(1))),
+                               Assign(Variable("total"), Add(Variable("total"), IntLiteral(10)))))
+    check_equal(run_without_jit(program)[:2], run_stimpl(program)[:2])
+    check_equal((3200, Integer()), run_stimpl(program)[:2])
+
+
+def test_jit_guards_entry_types():
+    jit.reset_traces()
+    loop = While(Lt(Variable("i"), IntLiteral(100)),
+                 Sequence(Assign(Variable("x"), Add(Variable("x"), Variable("x"))),
+                          Assign(Variable("i"), Add(Variable("i"), IntLiteral(1)))))
+    integers = Program(Assign(Variable("i"), IntLiteral(0)), Assign(Variable("x"), IntLiteral(1)), loop)
+    run_stimpl(integers)
+    # The same While node now sees a String for x and must not reuse the Integer trace.
+    strings = Program(Assign(Variable("i"), IntLiteral(90)), Assign(Variable("x"), StringLiteral("a")), loop)
+    check_equal(("a" * 1024, String()), run_stimpl(strings)[2].get_value("x"))
+
+
+def test_jit_prints_and_errors():
+    jit.reset_traces()
+    program = counting_loop(Print(Variable("i")), limit=100)
+    output = io.StringIO()
+    with redirect_stdout(output):
+        run_stimpl(program)
+    check_equal("".join(f"{i}\n" for i in range(100)), output.getvalue())
+
+    program = Program(
+        Assign(Variable("i"), IntLiteral(0)),
+        While(BooleanLiteral(True), Sequence(
+            Assign(Variable("x"), Divide(IntLiteral(1), Subtract(IntLiteral(100), Variable("i")))),
+            Assign(Variable("i"), Add(Variable("i"), IntLiteral(1))))))
+    check_program_raises(InterpMathError(), program)
+
+
+def test_jit_stops_at_interrupts():
+    jit.reset_traces()
+    spin = While(BooleanLiteral(True), Assign(Variable("i"), Add(Variable("i"), IntLiteral(1))))
+    program = Program(Assign(Variable("i"), IntLiteral(0)), spin)
+    previous = signal.signal(signal.SIGALRM, lambda signum, frame: interrupt(TimeoutError()))
+    try:
+        for enabled in (True, False):
+            jit.jit_enabled = enabled
+            signal.setitimer(signal.ITIMER_REAL, 0.05)
+            check_program_raises(TimeoutError(), program)
+    finally:
+        jit.jit_enabled = True
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+    check_equal(True, spin in jit._traces)
+    check_equal([], jit.pending_interrupts)
+    # The trace was interrupted between iterations, so it still runs other loops correctly.
+    jit.reset_traces()
+    program = counting_loop(Assign(Variable("total"), Add(Variable("total"), Variable("i"))))
+    check_equal((sum(range(500)), Integer()), run_stimpl(program)[:2])
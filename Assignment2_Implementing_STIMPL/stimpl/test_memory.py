@@ -0,0 +1,64 @@
+import io
+import tracemalloc
+from contextlib import redirect_stderr, redirect_stdout
+
+from stimpl.memory import MemoryReport
+from stimpl.runtime import run_stimpl
+from stimpl.expression import *
+from stimpl.types import *
+from stimpl.errors import *
+from stimpl.test import check_equal
+
+
+def test_memory_report():
+    s = Variable("s")
+    program = Program(
+        Assign(s, StringLiteral("a")),
+        Assign(Variable("i"), IntLiteral(1)),
+        Assign(s, Add(s, StringLiteral("b" * 1000))),
+        Assign(s, Add(s, StringLiteral("c"))),
+    )
+    _, _, state = run_stimpl(program)
+    report = MemoryReport(program, state)
+    check_equal((17, 4, 2), (report.ast_nodes, report.state_nodes, report.shadowed_bindings))
+    check_equal((3, 1), (report.variables["s"].bindings, report.variables["i"].bindings))
+    check_equal("s", report.largest_variables(1)[0].name)
+    # Both long strings are held by the history of s.
+    check_equal(True, report.variables["s"].history_bytes > 2000)
+    check_equal(True, report.variables["s"].live_bytes < report.variables["s"].history_bytes)
+    check_equal(True, report.string_bytes >= report.variables["s"].history_bytes)
+
+    # The report goes to stderr, not to the program output on stdout.
+    output, errors = io.StringIO(), io.StringIO()
+    with redirect_stdout(output), redirect_stderr(errors):
+        run_stimpl(Program(Print(StringLiteral("out")), *program.exprs), memory_report=True)
+    check_equal("out\n", output.getvalue())
+    lines = errors.getvalue().splitlines()
+    check_equal(True, lines[0].startswith("peak: "))
+    check_equal(True, lines[2].startswith("state: 4 bindings (2 shadowed)"))
+
+    # Failed runs are reported too, to a stream or to a function that gets the report.
+    failing = Program(Assign(s, StringLiteral("a")), Divide(IntLiteral(1), IntLiteral(0)))
+    stream, reports = io.StringIO(), []
+    for sink in (stream, reports.append):
+        try:
+            run_stimpl(failing, memory_report=sink)
+        except InterpMathError:
+            pass
+    check_equal("failed: InterpMathError: Cannot divide by zero", stream.getvalue().splitlines()[-1])
+    check_equal((True, 7), (isinstance(reports[0].error, InterpMathError), reports[0].ast_nodes))
+
+    # Inside the caller's tracemalloc session, the caller's peak is left alone.
+    tracemalloc.start()
+    try:
+        big = "x" * 1_000_000
+        del big
+        peak = tracemalloc.get_traced_memory()[1]
+        run_stimpl(program, memory_report=reports.append)
+        check_equal(True, tracemalloc.get_traced_memory()[1] >= peak)
+        check_equal(True, tracemalloc.is_tracing())
+    finally:
+        tracemalloc.stop()
+    # The run stayed below the earlier peak, so its own peak is only bounded.
+    check_equal(False, reports[-1].peak_exact)
+    check_equal(True, str(reports[-1]).startswith("peak: at most "))
@@ -0,0 +1,109 @@
+import gc
+import io
+import os
+import tempfile
+import threading
+import urllib.request
+from contextlib import redirect_stdout
+
+from stimpl.batch import BatchScheduler
+from stimpl.errors import InterpTypeError
+from stimpl.expression import *
+import stimpl.metrics
+from stimpl.metrics import MetricsExporter, reset, snapshot, write_metrics, write_metrics_file
+from stimpl.runtime import run_stimpl
+from stimpl.test import check_equal
+import stimpl.jit as jit
+
+
+def run_quietly(program):
+    with redirect_stdout(io.StringIO()):
+        try:
+            run_stimpl(program)
+        except InterpTypeError:
+            pass
+
+
+def test_metrics_recorded_by_runs():
+    reset()
+    i = Variable("i")
+    run_quietly(Program(Assign(i, IntLiteral(0)), Assign(i, Add(i, IntLiteral(1))), Print(StringLiteral("héllo"))))
+    run_quietly(Add(IntLiteral(1), StringLiteral("a")))
+    registered = len(stimpl.metrics._registered)
+    threads = [threading.Thread(target=run_quietly, args=(Print(IntLiteral(n)),)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # The threads are gone, and so are their Metrics; what they recorded is kept.
+    gc.collect()
+    check_equal(registered, len(stimpl.metrics._registered))
+
+    metrics = snapshot()
+    check_equal((6, 5, {"InterpTypeError": 1}), (metrics.runs_started, metrics.runs_finished, metrics.errors))
+    # "héllo\n" is 7 bytes in UTF-8, each digit and its newline 2.
+    check_equal(7 + 4 * 2, metrics.print_bytes)
+    check_equal(6, metrics.latency.count)
+    # Program, two Assigns, Print, Add, Variable and three literals; Add and two literals; Print and a literal each.
+    check_equal(9 + 3 + 4 * 2, metrics.evaluated_nodes)
+    # The four Print runs end with no bindings, the first run with two.
+    check_equal([4, 1], metrics.state_depth.counts[:2])
+
+    text = io.StringIO()
+    write_metrics(text, metrics)
+    lines = text.getvalue().splitlines()
+    check_equal(True, "stimpl_runs_started_total 6" in lines)
+    check_equal(True, 'stimpl_errors_total{type="InterpTypeError"} 1' in lines)
+    check_equal(True, 'stimpl_run_seconds_bucket{le="+Inf"} 6' in lines)
+    check_equal(True, 'stimpl_state_depth_bucket{le="+Inf"} 5' in lines)
+
+
+def test_metrics_count_jit_loops():
+    i = Variable("i")
+    measured = []
+    previous = jit.jit_enabled
+    try:
+        for enabled in (True, False):
+            jit.jit_enabled = enabled
+            jit.reset_traces()
+            reset()
+            # Kept in a variable, since traces are dropped with their loop.
+            program = Program(
+                Assign(i, IntLiteral(0)),
+                While(Lt(i, IntLiteral(500)), Sequence(
+                    Print(StringLiteral("ab")),
+                    If(Lt(i, IntLiteral(3)), Ren(), Assign(Variable("j"), i)),
+                    Assign(i, Add(i, IntLiteral(1))))))
+            run_quietly(program)
+            metrics = snapshot()
+            measured.append((metrics.print_bytes, metrics.evaluated_nodes))
+    finally:
+        jit.jit_enabled = previous
+    # A compiled trace records the same output and nodes as the interpreter.
+    check_equal((500 * 3, 8004), measured[0])
+    check_equal(measured[1], measured[0])
+
+
+def test_metrics_exporters():
+    reset()
+    scheduler = BatchScheduler(workers=2)
+    for n in range(3):
+        scheduler.submit(Print(IntLiteral(n)))
+    scheduler.run()
+    # The runs happened in worker processes.
+    metrics = snapshot()
+    check_equal((3, 3, 6), (metrics.runs_started, metrics.runs_finished, metrics.print_bytes))
+    check_equal(6, metrics.evaluated_nodes)
+
+    expected = io.StringIO()
+    write_metrics(expected)
+    with MetricsExporter() as exporter:
+        with urllib.request.urlopen(f"http://127.0.0.1:{exporter.port}/metrics") as response:
+            check_equal(expected.getvalue(), response.read().decode())
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "stimpl.prom")
+        write_metrics_file(path)
+        with open(path) as f:
+            check_equal(expected.getvalue(), f.read())
+        check_equal(["stimpl.prom"], os.listdir(directory))
@@ -0,0 +1,90 @@
+import io
+import time
+from contextlib import redirect_stdout
+
+from stimpl.errors import *
+from stimpl.expression import *
+from stimpl.parallel import pack, partition, read_write_sets, run_stimpl_parallel
+from stimpl.runtime import run_stimpl, state_bindings
+from stimpl.types import *
+from stimpl.test import check_equal
+
+
+def block(name, limit):
+    counter, total = Variable(f"{name}_i"), Variable(f"{name}_total")
+    return [
+        Assign(counter, IntLiteral(0)),
+        Assign(total, IntLiteral(0)),
+        While(Lt(counter, IntLiteral(limit)), Sequence(
+            Assign(total, Add(total, counter)),
+            Assign(counter, Add(counter, IntLiteral(1))))),
+        Print(total),
+    ]
+
+
+def run_with_output(run, program):
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            value, value_type, state = run(program)
+        except InterpError as e:
+            return (type(e), str(e)), output.getvalue()
+    return (value, value_type, state_bindings(state)), output.getvalue()
+
+
+def test_read_write_sets():
+    check_equal(
+        (frozenset({"j"}), frozenset({"i"})),
+        read_write_sets(Assign(Variable("i"), Add(Variable("j"), IntLiteral(1)))),
+    )
+    # A Variable object that is assigned and also read is still a read.
+    i = Variable("i")
+    check_equal(
+        (frozenset({"i"}), frozenset({"i"})),
+        read_write_sets(Sequence(Assign(i, IntLiteral(1)), Print(i))),
+    )
+    a, b = block("a", 3), block("b", 4)
+    # Interleave the blocks; the last expression joins them.
+    exprs = [a[0], b[0], a[1], b[1], a[2], b[2], a[3], b[3]]
+    check_equal([[0, 2, 4, 6], [1, 3, 5, 7]], partition(exprs))
+    check_equal([list(range(9))], partition(exprs + [Add(Variable("a_total"), Variable("b_total"))]))
+
+
+def test_parallel_matches_sequential():
+    a, b, c = block("a", 30), block("b", 40), block("c", 50)
+    program = Program(*[expr for exprs in zip(a, b, c) for expr in exprs], Variable("b_total"))
+    check_equal(run_with_output(run_stimpl, program), run_with_output(lambda p: run_stimpl_parallel(p, workers=2), program))
+
+    # The first error in program order wins, and only the output printed before it is kept.
+    program = Program(
+        Print(StringLiteral("before")),
+        Assign(Variable("x"), IntLiteral(1)),
+        Print(Assign(Variable("y"), Divide(IntLiteral(1), IntLiteral(0)))),
+        Assign(Variable("x"), StringLiteral("wrong type")),
+        Print(StringLiteral("after")),
+    )
+    check_equal(run_with_output(run_stimpl, program), run_with_output(lambda p: run_stimpl_parallel(p, workers=2), program))
+    check_equal(((InterpMathError, "Cannot divide by zero"), "before\n"), run_with_output(run_stimpl_parallel, program))
+
+
+def test_parallel_chunks_and_stops_early():
+    # Many small independent statements are packed into one chunk per worker.
+    segments = [[(index, Assign(Variable(f"v{index}"), IntLiteral(index)))] for index in range(100)]
+    chunks = pack(segments, 3)
+    check_equal(3, len(chunks))
+    check_equal(list(range(100)), sorted(segment[0][0] for chunk in chunks for segment in chunk))
+    check_equal(True, max(map(len, chunks)) - min(map(len, chunks)) <= 1)
+    program = Program(*(expr for segment in segments for _, expr in segment))
+    check_equal(run_with_output(run_stimpl, program), run_with_output(lambda p: run_stimpl_parallel(p, workers=3), program))
+
+    # An error stops the run without waiting for a later segment that never ends.
+    program = Program(
+        Print(StringLiteral("before")),
+        Assign(Variable("x"), Divide(IntLiteral(1), IntLiteral(0))),
+        While(BooleanLiteral(True), Assign(Variable("y"), IntLiteral(1))),
+    )
+    expected = ((InterpMathError, "Cannot divide by zero"), "before\n")
+    for workers in (1, 3):
+        start = time.perf_counter()
+        check_equal(expected, run_with_output(lambda p: run_stimpl_parallel(p, workers=workers), program))
+        check_equal(True, time.perf_counter() - start < 10)
@@ -0,0 +1,64 @@
+import io
+from contextlib import redirect_stdout
+
+from stimpl.expression import *
+from stimpl.runtime import EmptyState, run_stimpl, write_state
+from stimpl.types import *
+from stimpl.test import check_equal
+
+
+def test_expression_printer():
+    program = Program(
+        Assign(Variable("i"), IntLiteral(0)),
+        While(Gt(IntLiteral(3), Variable("i")), Sequence(
+            Assign(Variable("i"), Add(Variable("i"), IntLiteral(1))),
+            If(Not(BooleanLiteral(True)), Print(Variable("i")), Ren()))),
+    )
+    check_equal(
+        "Program: Variable i = literal value: 0;\n"
+        "while (literal value: 3 > Variable i) { Sequence: Variable i = Variable i + literal value: 1;\n"
+        "if (Not literal value: True) then { Print Variable i } else { Ren value } }",
+        repr(program),
+    )
+    check_equal("Program: None", repr(Program()))
+    check_equal("Program: ... = ...;\nwhile (...) { ... }", format_expression(program, max_depth=1))
+    check_equal("Program: Variable i = literal value: 0;\n... (1 more)", format_expression(program, max_items=1))
+    check_equal("Program: Variable...", format_expression(program, max_length=17))
+
+    deep = IntLiteral(1)
+    for _ in range(50000):
+        deep = Sequence(Not(deep))
+    check_equal("Sequence: Not Sequence: Not ...", format_expression(deep, max_length=28))
+    check_equal(True, repr(deep).endswith("Not literal value: 1"))
+    # Operators print without recursing too, so a deep chain of them is fine on its own.
+    chain = IntLiteral(1)
+    for _ in range(5000):
+        chain = Add(chain, IntLiteral(2))
+    check_equal("literal value: 1" + " + literal value: 2" * 5000, repr(chain))
+
+
+def test_state_printer():
+    state = EmptyState()
+    for i in range(100000):
+        state = state.set_value("i", i, Integer())
+    state = state.set_value("s", "x" * 1000, String())
+    check_equal(True, repr(state).startswith(f"s: ('{'x' * 1000}', String), i: (99999, Integer), i: (99998, Integer)"))
+
+    def written(**options):
+        stream = io.StringIO()
+        write_state(state, stream, **options)
+        return stream.getvalue()
+
+    check_equal(f"s: ('{'x' * 1000}', String), i: (99999, Integer), ", written(live_only=True))
+    check_equal(f"s: ('{'x' * 1000}', String), ...", written(max_bindings=1))
+    check_equal("s: ('xx...", written(max_length=7))
+
+    output = io.StringIO()
+    with redirect_stdout(output):
+        run_stimpl(Program(Assign(Variable("i"), IntLiteral(1)), Assign(Variable("i"), IntLiteral(2))), debug=True)
+    check_equal(
+        "program: Program: Variable i = literal value: 1;\nVariable i = literal value: 2\n"
+        "final_value: (2, Integer)\n"
+        "final_state: i: (2, Integer), \n",
+        output.getvalue(),
+    )
@@ -0,0 +1,82 @@
+import gc
+import io
+import threading
+import weakref
+
+from stimpl.expression import *
+from stimpl.profiler import Profiler
+from stimpl.runtime import run_stimpl
+from stimpl.test import check_equal
+import stimpl.jit as jit
+
+
+def summing_loop(n):
+    i, total = Variable("i"), Variable("total")
+    return Program(
+        Assign(i, IntLiteral(0)),
+        Assign(total, IntLiteral(0)),
+        While(Lt(i, IntLiteral(n)), Sequence(Assign(total, Add(total, i)), Assign(i, Add(i, IntLiteral(1))))),
+    )
+
+
+def profile(program, use_signal):
+    profiler = Profiler(interval=0.001, use_signal=use_signal)
+    with profiler:
+        # Run until there are enough samples, whatever the speed of the machine.
+        while profiler.samples < 20:
+            run_stimpl(program)
+    return profiler
+
+
+def test_profiler_maps_samples_to_nodes():
+    program = summing_loop(2000)
+    previous = jit.jit_enabled
+    jit.jit_enabled = False
+    try:
+        for use_signal in (True, False):
+            profiler = profile(program, use_signal)
+            stacks = [stack for stack, _ in profiler.top(100)]
+            check_equal(True, all(stack.startswith("Program") for stack in stacks))
+            check_equal(True, any(stack.startswith("Program > While#7 > Sequence > Assign(") for stack in stacks))
+            check_equal(profiler.samples, sum(samples for _, samples in profiler.top(100)))
+    finally:
+        jit.jit_enabled = previous
+
+    collapsed = io.StringIO()
+    profiler.write_collapsed(collapsed)
+    lines = collapsed.getvalue().splitlines()
+    check_equal(True, all(line.startswith("Program;") or line.startswith("Program ") for line in lines))
+    check_equal(profiler.samples, sum(int(line.rsplit(" ", 1)[1]) for line in lines))
+
+
+def test_profiler_marks_jit_samples():
+    profiler = profile(summing_loop(20000), True)
+    check_equal(True, any(stack.endswith("While#7 > [jit]") for stack, _ in profiler.top(100)))
+
+
+def test_profiler_samples_other_threads():
+    profilers = []
+
+    def worker():
+        profilers.append(profile(summing_loop(2000), None))
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    check_equal(True, profilers[0].samples >= 20)
+    check_equal(None, profilers[0].sampler)
+
+
+def test_profiler_keeps_no_nodes():
+    program = summing_loop(2000)
+    program_reference = weakref.ref(program)
+    previous = jit.jit_enabled
+    jit.jit_enabled = False
+    try:
+        profiler = profile(program, True)
+    finally:
+        jit.jit_enabled = previous
+    del program
+    gc.collect()
+    check_equal((None, 0), (program_reference(), len(profiler.node_ids)))
+    check_equal(True, any(stack.startswith("Program > While#7") for stack, _ in profiler.top(100)))
@@ -0,0 +1,65 @@
+import os
+import tempfile
+
+from stimpl.replay import EVAL, ERROR, WRITE, read_trace, replay
+from stimpl.runtime import run_stimpl
+from stimpl.expression import *
+from stimpl.types import *
+from stimpl.errors import *
+from stimpl.test import check_equal
+
+
+def test_trace_and_replay():
+    program = Program(
+        Assign(Variable("i"), IntLiteral(0)),
+        Assign(Variable("s"), StringLiteral("")),
+        While(Lt(Variable("i"), IntLiteral(3)), Sequence(
+            Assign(Variable("s"), Add(Variable("s"), StringLiteral("ab"))),
+            Assign(Variable("i"), Add(Variable("i"), IntLiteral(1))))),
+        Assign(Variable("f"), FloatingPointLiteral(-2.5)),
+        Assign(Variable("b"), BooleanLiteral(True)),
+        Assign(Variable("n"), IntLiteral(-(1 << 70))))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "trace.bin")
+        value, value_type, state = run_stimpl(program, trace=path)
+        events = list(read_trace(path))
+        check_equal(events[-1], replay(path)[1])
+        check_equal((value, value_type), (events[-1].value, events[-1].value_type))
+        check_equal("Program", events[-1].node_kind)
+        for name in ["i", "s", "f", "b", "n"]:
+            check_equal(state.get_value(name), replay(path)[0].get_value(name))
+
+        # The state part way through the loop.
+        writes = [event for event in events if event.kind == WRITE]
+        check_equal(("s", "abab"), (writes[4].variable_name, writes[4].value))
+        replayed_state, event = replay(path, writes[4].step)
+        check_equal(("abab", String()), replayed_state.get_value("s"))
+        check_equal((1, Integer()), replayed_state.get_value("i"))
+        check_equal(event, writes[4])
+
+
+def test_trace_records_errors():
+    program = Program(Assign(Variable("i"), IntLiteral(1)), Divide(Variable("i"), IntLiteral(0)))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "trace.bin")
+        try:
+            run_stimpl(program, trace=path)
+        except InterpMathError as e:
+            error = e
+        events = list(read_trace(path))
+        check_equal(events[-1].step, error.step)
+        check_equal(("Divide", Integer(), Integer()), (error.operator, error.left_type, error.right_type))
+        check_equal(ERROR, events[-1].kind)
+        check_equal(4, events[-1].node_id)
+        check_equal([WRITE, EVAL, EVAL, ERROR], [event.kind for event in events][1:])
+        check_equal((1, Integer()), replay(path)[0].get_value("i"))
+
+    # A node object used at two positions is recorded under the id of its first position.
+    i = Variable("i")
+    program = Program(Assign(i, IntLiteral(2)), Add(i, i))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "trace.bin")
+        run_stimpl(program, trace=path)
+        reads = [event for event in read_trace(path) if event.node_kind == "Variable"]
+        check_equal([2, 2], [event.node_id for event in reads])
+        check_equal(True, list(walk(program))[2] is i)
@@ -0,0 +1,28 @@
+from stimpl.robustness import ROBUSTNESS_CASES
+from stimpl.runner import ENGINES, collect, run_cases
+from stimpl.test import SANITY_CASES, check_equal
+
+
+def test_runner_runs_every_case_on_every_engine():
+    cases = collect(["sanity"])
+    check_equal(len(SANITY_CASES) * len(ENGINES), len(cases))
+    results = list(run_cases(cases, workers=2))
+    check_equal(sorted(cases), sorted((result.suite, result.case, result.engine) for result in results))
+    check_equal([], [result for result in results if not result.passed])
+
+    check_equal([("sanity", "while_loops", "jit")], collect(engines=["jit"], pattern="sanity::while*"))
+
+
+def test_runner_isolates_failures():
+    def failing_case():
+        raise AssertionError("expected failure")
+
+    ROBUSTNESS_CASES["failing"] = failing_case
+    try:
+        results = list(run_cases(collect(["robustness"], ["interpreter"]) + collect(["sanity"], ["interpreter"], "if_*"), workers=1))
+    finally:
+        del ROBUSTNESS_CASES["failing"]
+    check_equal(
+        [("failing", False, "AssertionError: expected failure"), ("if_expressions", True, None)],
+        [(result.case, result.passed, result.error) for result in results],
+    )
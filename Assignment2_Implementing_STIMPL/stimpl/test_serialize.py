@@ -0,0 +1,171 @@
+import io
+import os
+import pickle
+import tempfile
+import tracemalloc
+from contextlib import redirect_stdout
+
+from stimpl.serialize import (
+    load_lazy_program,
+    program_from_json,
+    program_to_json,
+    read_program_stream,
+    write_lazy_program,
+    write_program_stream,
+)
+from stimpl.runtime import run_stimpl, run_stimpl_stream
+from stimpl.expression import *
+from stimpl.types import *
+from stimpl.errors import *
+from stimpl.test import check_equal
+
+
+def test_serialize_round_trip():
+    program = Program(
+        Assign(Variable("i"), IntLiteral(0)),
+        Assign(Variable("s"), StringLiteral("a\n\"b\"")),
+        While(Lt(Variable("i"), IntLiteral(3)), Sequence(
+            If(Not(Eq(Variable("i"), IntLiteral(1))), Print(Variable("s")), Print(Ren())),
+            Assign(Variable("i"), Add(Variable("i"), IntLiteral(1))))),
+        And(BooleanLiteral(True), Gte(FloatingPointLiteral(1.0), FloatingPointLiteral(0.5))))
+    text = program_to_json(program)
+    check_equal(repr(program), repr(program_from_json(text)))
+    check_equal(text, program_to_json(program_from_json(text)))
+
+    for malformed in ['["Add", ["IntLiteral", 1]]', '["IntLiteral", "1"]', '["Exec", "x"]', '{}', '["Lazy", 0, 1, 1]']:
+        try:
+            program_from_json(malformed)
+        except (InterpSyntaxError, InterpTypeError):
+            continue
+        raise AssertionError(f"{malformed} should not decode")
+
+
+
+def test_program_stream():
+    program = Program(
+        Assign(Variable("i"), IntLiteral(0)),
+        Print(StringLiteral("first")),
+        While(Lt(Variable("i"), IntLiteral(3)), Assign(Variable("i"), Add(Variable("i"), IntLiteral(1)))),
+        Print(Variable("i")),
+        Variable("i"))
+    stream = io.StringIO()
+    write_program_stream(program.exprs, stream)
+    lines = stream.getvalue().splitlines(keepends=True)
+    check_equal(len(program.exprs), len(lines))
+
+    # Execution starts before the rest of the stream has been read.
+    output = io.StringIO()
+    output_when_read = []
+
+    def reader():
+        for line in lines:
+            output_when_read.append(output.getvalue())
+            yield line
+
+    with redirect_stdout(output):
+        value, value_type, state = run_stimpl_stream(read_program_stream(reader()))
+    check_equal("first\n3\n", output.getvalue())
+    check_equal(["", "", "first\n", "first\n", "first\n3\n"], output_when_read)
+    check_equal((3, Integer()), (value, value_type))
+    check_equal((3, Integer()), state.get_value("i"))
+
+
+def test_program_stream_memory():
+    statement = Print(Add(StringLiteral("x" * 100), StringLiteral("y")))
+    peaks = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "program.jsonl")
+        with open(path, "w") as stream:
+            write_program_stream([statement] * 5000, stream)
+        with open(os.devnull, "w") as null, redirect_stdout(null):
+            for run in [run_stimpl_stream, lambda exprs: run_stimpl(Program(*exprs))]:
+                with open(path) as stream:
+                    tracemalloc.start()
+                    run(read_program_stream(stream))
+                    peaks.append(tracemalloc.get_traced_memory()[1])
+                    tracemalloc.stop()
+    check_equal(True, peaks[0] * 10 < peaks[1])
+
+
+def test_lazy_program():
+    i, n = Variable("i"), Variable("n")
+    cold = Sequence(*[Print(StringLiteral(f"cold {k}")) for k in range(100)])
+    hot = Sequence(Print(i), Assign(i, Add(i, IntLiteral(1))), *[Ren() for _ in range(70)])
+    program = Program(
+        Assign(i, IntLiteral(0)),
+        Assign(n, IntLiteral(3)),
+        If(Gt(n, IntLiteral(5)), cold, While(Lt(i, n), If(Eq(i, IntLiteral(-1)), cold, hot))),
+        i)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "program.lazy")
+        with open(path, "wb") as stream:
+            write_lazy_program(program, stream)
+        lazy = load_lazy_program(path)
+        check_equal(program_to_json(program), program_to_json(load_lazy_program(path)))
+
+        loop_branch = lazy.exprs[2].false
+        check_equal(True, isinstance(loop_branch, Lazy))
+        check_equal(True, repr(lazy.exprs[2]).endswith(") then { <lazy 201 nodes> } else { <lazy 287 nodes> }"))
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            value, value_type, _ = run_stimpl(lazy)
+        check_equal(("0\n1\n2\n", 3, Integer()), (output.getvalue(), value, value_type))
+        # Only what ran was loaded.
+        check_equal(None, lazy.exprs[2].true.node)
+        loop = loop_branch.node
+        # The body of the loop is big enough to be lazy too, and so are both of its branches.
+        body = loop.body.node
+        check_equal((None, True), (body.true.node, isinstance(body.false.node, Sequence)))
+        check_equal(True, ") then { <lazy 201 nodes> } else { while (" in repr(lazy))
+        check_equal(True, ") then { <lazy 201 nodes> } else { Sequence: Print " in repr(loop))
+
+        # Lazy nodes can be sent to other processes, loaded or not.
+        copy = pickle.loads(pickle.dumps(lazy))
+        with redirect_stdout(io.StringIO()):
+            check_equal((3, Integer()), run_stimpl(copy)[:2])
+
+
+def test_lazy_program_stays_cold():
+    from stimpl.cache import ResultCache
+    from stimpl.replay import read_trace
+
+    i, n, c = Variable("i"), Variable("n"), Variable("c")
+    cold = Sequence(*[Assign(c, IntLiteral(k)) for k in range(100)])
+    hot = Sequence(Assign(i, Add(i, IntLiteral(1))), *[Ren() for _ in range(70)])
+    program = Program(
+        Assign(i, IntLiteral(0)),
+        Assign(n, IntLiteral(3)),
+        If(Gt(n, IntLiteral(5)), cold, While(Lt(i, n), If(Eq(i, IntLiteral(-1)), cold, hot))),
+        i)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "program.lazy")
+        with open(path, "wb") as stream:
+            write_lazy_program(program, stream)
+
+        # Keying and caching the program leaves the branches that never run on disk.
+        cache = ResultCache()
+        lazy = load_lazy_program(path)
+        check_equal(True, cache.key(lazy) is not None)
+        check_equal((3, Integer()), run_stimpl(lazy, cache=cache)[:2])
+        body = lazy.exprs[2].false.node.body.node
+        check_equal((None, None), (lazy.exprs[2].true.node, body.true.node))
+        check_equal(1, len(cache.entries))
+        fresh = load_lazy_program(path)
+        check_equal((3, Integer()), run_stimpl(fresh, cache=cache)[:2])
+        check_equal((1, None), (cache.hits, fresh.exprs[2].false.node))
+
+        # So does tracing it; the loop is numbered when it is loaded.
+        trace = os.path.join(directory, "program.trace")
+        lazy = load_lazy_program(path)
+        check_equal((3, Integer()), run_stimpl(lazy, trace=trace)[:2])
+        body = lazy.exprs[2].false.node.body.node
+        check_equal((None, None), (lazy.exprs[2].true.node, body.true.node))
+        numbered = sum(1 for _ in walk(load_lazy_program(path)))
+        events = list(read_trace(trace))
+        increments = [event.node_id for event in events if event.variable_name == "i"][1:]
+        check_equal(3, len(increments))
+        check_equal(True, min(increments) >= numbered and len(set(increments)) == 1)
+        check_equal((3, Integer()), (events[-1].value, events[-1].value_type))
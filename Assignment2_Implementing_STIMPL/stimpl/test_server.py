@@ -0,0 +1,102 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from stimpl.server import StimplClient, StimplServer
+from stimpl.expression import *
+from stimpl.test import check_equal
+
+
+@contextmanager
+def running_server(*options):
+    """Starts a server on a temporary socket and yields (server process, socket path)."""
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "stimpl.sock")
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "stimpl.server", "--socket", socket_path, *options],
+            cwd=package_root)
+        try:
+            # The socket file appears when it is bound, a moment before the server listens on it.
+            for _ in range(200):
+                try:
+                    with socket.socket(socket.AF_UNIX) as probe:
+                        probe.connect(socket_path)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+            yield server, socket_path
+        finally:
+            server.terminate()
+            server.wait(10)
+        check_equal(False, os.path.exists(socket_path))
+
+
+def child_pids(pid):
+    children = []
+    for name in os.listdir("/proc"):
+        if name.isdigit():
+            try:
+                with open(f"/proc/{name}/stat") as f:
+                    # The parent pid is the second field after the parenthesized command name.
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        children.append(int(name))
+            except (OSError, IndexError, ValueError):
+                pass
+    return children
+
+
+def test_server():
+    with running_server("--workers", "2") as (_, socket_path):
+        with StimplClient(socket_path) as client:
+            response = client.run(Program(Print(StringLiteral("hi")), Add(IntLiteral(1), IntLiteral(2))))
+            check_equal((3, "Integer", "hi\n"), (response["value"], response["type"], response["output"]))
+
+            # Pipelined requests, including an interpreter error and two blown budgets.
+            loop = While(BooleanLiteral(True), Print(StringLiteral("spin")))
+            ids = [client.send(Add(IntLiteral(1), StringLiteral("a"))),
+                   client.send(loop, timeout=0.2),
+                   client.send(loop, max_output=100),
+                   client.send(Multiply(FloatingPointLiteral(1.5), FloatingPointLiteral(2.0)))]
+            responses = {response["id"]: response for response in [client.receive() for _ in ids]}
+            check_equal("InterpTypeError", responses[ids[0]]["error"])
+            check_equal("BudgetExceeded", responses[ids[1]]["error"])
+            check_equal("BudgetExceeded", responses[ids[2]]["error"])
+            check_equal((3.0, "FloatingPoint"), (responses[ids[3]]["value"], responses[ids[3]]["type"]))
+
+    # Requests run arbitrary programs, so the server refuses to listen beyond this machine.
+    try:
+        StimplServer(host="0.0.0.0", port=7878)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("A server on 0.0.0.0 should be refused.")
+
+
+def test_server_recovers():
+    with running_server("--workers", "2", "--max-request-bytes", "4096") as (server, socket_path):
+        with StimplClient(socket_path) as client:
+            # A line over the limit gets an error and the connection carries on.
+            client.socket.sendall(b"x" * 100000 + b"\n")
+            check_equal("BadRequest", client.receive()["error"])
+            check_equal(3, client.run(Add(IntLiteral(1), IntLiteral(2)))["value"])
+
+            # A dead worker breaks the pool, which is started again.
+            for pid in child_pids(server.pid):
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            errors = []
+            for _ in range(5):
+                response = client.run(Add(IntLiteral(1), IntLiteral(2)))
+                if "error" not in response:
+                    break
+                errors.append(response["error"])
+            check_equal(3, response.get("value"))
+            check_equal(True, set(errors) <= {"BrokenProcessPool"})
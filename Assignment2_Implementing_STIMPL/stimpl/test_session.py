@@ -0,0 +1,65 @@
+import io
+from contextlib import redirect_stdout
+
+from stimpl.errors import *
+from stimpl.expression import *
+from stimpl.runtime import run_stimpl, state_bindings
+from stimpl.session import Session
+from stimpl.types import *
+from stimpl.test import check_equal
+
+
+def counting_program(limit):
+    i = Variable("i")
+    return [
+        Assign(i, IntLiteral(0)),
+        While(Lt(i, IntLiteral(100)), Assign(i, Add(i, IntLiteral(1)))),
+        Print(i),
+        Assign(Variable("j"), Multiply(i, IntLiteral(limit))),
+        Variable("j"),
+    ]
+
+
+def test_session_reuses_unchanged_prefix():
+    session = Session(echo=False)
+    exprs = counting_program(2)
+    value, value_type, state = session.run(exprs)
+    check_equal((200, Integer(), 0, 5), (value, value_type, session.reused, session.evaluated))
+    check_equal("100\n", session.output)
+
+    # Only the edited expression and the ones after it run again.
+    edited = counting_program(3)
+    value, value_type, state = session.run(edited)
+    check_equal((300, Integer(), 3, 2), (value, value_type, session.reused, session.evaluated))
+    check_equal("100\n", session.output)
+    output = io.StringIO()
+    with redirect_stdout(output):
+        expected_value, expected_type, expected_state = run_stimpl(Program(*edited))
+    check_equal((expected_value, expected_type, state_bindings(expected_state)), (value, value_type, state_bindings(state)))
+    check_equal(output.getvalue(), session.output)
+
+    session.append(Print(StringLiteral("done")))
+    check_equal((5, 1, "100\ndone\n"), (session.reused, session.evaluated, session.output))
+
+    # Expressions that are the same objects are not hashed to compare them.
+    other = Session(echo=False)
+    other.run(exprs)
+    other.append(Ren())
+    check_equal((5, 1), (other.reused, other.evaluated))
+    check_equal(False, any("fingerprint" in entry.__dict__ for entry in other.entries))
+
+    # A failing edit keeps the whole program, but only the states before it.
+    broken = Assign(Variable("j"), Add(Variable("i"), StringLiteral("not an integer")))
+    try:
+        session.edit(3, broken)
+        check_equal("an InterpTypeError", "no error")
+    except InterpTypeError:
+        pass
+    check_equal((3, 1, 3, 6), (session.reused, session.evaluated, len(session.entries), len(session.exprs)))
+    check_equal(True, session.exprs[3] is broken)
+    check_equal((100, Integer()), session.state.get_value("i"))
+
+    # Fixing it runs it and everything after it again.
+    session.edit(3, Assign(Variable("j"), Multiply(Variable("i"), IntLiteral(4))))
+    check_equal((3, 3, "100\ndone\n"), (session.reused, session.evaluated, session.output))
+    check_equal((400, Integer()), session.state.get_value("j"))
@@ -0,0 +1,83 @@
+import io
+from contextlib import redirect_stdout
+
+from stimpl.cache import program_key
+from stimpl.errors import *
+from stimpl.expression import *
+from stimpl.gen import generate_program
+from stimpl.runtime import run_stimpl, state_bindings
+from stimpl.specialize import specialize
+from stimpl.types import *
+from stimpl.test import check_equal
+
+
+def outcome(program, inputs):
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            value, value_type, state = run_stimpl(program, inputs=inputs)
+        except InterpError as e:
+            return (type(e), str(e)), output.getvalue()
+    live = {name: (value, value_type) for name, value, value_type in state_bindings(state)}
+    return (value, value_type, live), output.getvalue()
+
+
+def test_specialize_folds_known_inputs():
+    i, total, n, k = Variable("i"), Variable("total"), Variable("n"), Variable("k")
+    program = Program(
+        Assign(i, IntLiteral(0)),
+        Assign(total, IntLiteral(0)),
+        While(Lt(i, n), Sequence(
+            Assign(total, Add(total, Multiply(i, i))),
+            Assign(i, Add(i, IntLiteral(1))))),
+        Add(total, k),
+    )
+    residual = specialize(program, known={"n": 100}, inputs={"k"})
+    # The loop is gone; only the addition of the unknown input is left.
+    check_equal(
+        "Program: Variable n = literal value: 100;\nVariable i = literal value: 100;\n"
+        "Variable total = literal value: 328350;\nliteral value: 328350 + Variable k",
+        repr(residual),
+    )
+    check_equal(True, program_key(residual) is not None)
+    check_equal(outcome(program, {"n": 100, "k": 3}), outcome(residual, {"k": 3}))
+
+    # Loops past the unrolling limit, or with unknown conditions, stay in the residual program.
+    for known, inputs in (({"k": 2}, {"n": 50}), ({"n": 50}, {"k": 2})):
+        residual = specialize(program, known=known, max_unroll=10)
+        check_equal(True, any(isinstance(node, While) for node in walk(residual)))
+        check_equal(outcome(program, {**known, **inputs}), outcome(residual, inputs))
+
+
+def test_specialize_keeps_errors_and_output():
+    for program in (
+        Program(Print(StringLiteral("a")), Assign(Variable("x"), Divide(IntLiteral(1), IntLiteral(0))), Print(StringLiteral("b"))),
+        Program(Assign(Variable("x"), IntLiteral(1)), Print(Variable("x")), Assign(Variable("x"), StringLiteral("s"))),
+        Program(Print(IntLiteral(1)), If(IntLiteral(1), Ren(), Ren())),
+        Program(Print(Variable("undefined"))),
+    ):
+        check_equal(outcome(program, None), outcome(specialize(program), None))
+
+    # A variable the program assigns may still be an input of another type, whose type check fails before the Print.
+    x = Variable("x")
+    program = Program(Assign(x, IntLiteral(1)), Print(x), Assign(x, IntLiteral(2)))
+    for inputs in ({"x": "s"}, {"x": 5}, None):
+        check_equal(outcome(program, inputs), outcome(specialize(program), inputs))
+    check_equal(outcome(program, None), outcome(specialize(program, inputs=()), None))
+
+
+def test_specialize_generated_programs():
+    for seed in range(40):
+        generated = generate_program(
+            statements=15, loop_trips=5, seed=seed,
+            statement_weights={"assign": 6, "if": 2, "while": 1, "print": 1},
+        )
+        # Turn the initial assignments into inputs, half of them known.
+        inputs = {assign.variable.variable_name: assign.value.literal for assign in generated.exprs[:8]}
+        template = Program(*generated.exprs[8:])
+        known = {name: value for name, value in inputs.items() if name in ("v0", "v2", "v5", "v7")}
+        unknown = {name: value for name, value in inputs.items() if name not in known}
+        for max_unroll in (0, 2, 1000):
+            for names in (None, unknown):
+                residual = specialize(template, known=known, max_unroll=max_unroll, inputs=names)
+                check_equal(outcome(template, inputs), outcome(residual, unknown))
@@ -1,9 +1,71 @@
 from stimpl.expression import BooleanLiteral
 from stimpl.robustness import run_stimpl_robustness_tests
 from stimpl.test import run_stimpl_sanity_tests
+from stimpl.test_cache import test_program_key, test_result_cache, test_result_cache_byte_budget, test_result_cache_disk_tier
+from stimpl.test_checkpoint import test_checkpoint_and_resume, test_evaluation_hooks_are_per_thread
+from stimpl.test_cost import test_estimate_cost, test_batch_scheduler_runs_shortest_first
+from stimpl.test_errors import test_structured_errors
+from stimpl.test_gen import test_generated_programs_are_well_typed, test_generator_is_reproducible, test_scaling_curve
+from stimpl.test_jit import test_jit_matches_interpreter, test_jit_side_exit_on_other_branch, test_jit_guards_entry_types, test_jit_prints_and_errors, test_jit_stops_at_interrupts
+from stimpl.test_memory import test_memory_report
+from stimpl.test_metrics import test_metrics_recorded_by_runs, test_metrics_exporters, test_metrics_count_jit_loops
+from stimpl.test_parallel import test_read_write_sets, test_parallel_matches_sequential, test_parallel_chunks_and_stops_early
+from stimpl.test_pretty import test_expression_printer, test_state_printer
+from stimpl.test_profile import test_profiler_maps_samples_to_nodes, test_profiler_marks_jit_samples, test_profiler_samples_other_threads, test_profiler_keeps_no_nodes
+from stimpl.test_replay import test_trace_and_replay, test_trace_records_errors
+from stimpl.test_runner import test_runner_runs_every_case_on_every_engine, test_runner_isolates_failures
+from stimpl.test_serialize import test_serialize_round_trip, test_program_stream, test_program_stream_memory, test_lazy_program, test_lazy_program_stays_cold
+from stimpl.test_server import test_server, test_server_recovers
+from stimpl.test_session import test_session_reuses_unchanged_prefix
+from stimpl.test_specialize import test_specialize_folds_known_inputs, test_specialize_keeps_errors_and_output, test_specialize_generated_programs
 from stimpl.test_state import test_state_implementation
 
 if __name__=='__main__':
   test_state_implementation()
   run_stimpl_sanity_tests()
-  run_stimpl_robustness_tests()
\ No newline at end of file
+  run_stimpl_robustness_tests()
+  test_jit_matches_interpreter()
+  test_jit_side_exit_on_other_branch()
+  test_jit_guards_entry_types()
+  test_jit_prints_and_errors()
+  test_jit_stops_at_interrupts()
+  test_program_key()
+  test_result_cache()
+  test_result_cache_byte_budget()
+  test_result_cache_disk_tier()
+  test_trace_and_replay()
+  test_trace_records_errors()
+  test_checkpoint_and_resume()
+  test_evaluation_hooks_are_per_thread()
+  test_serialize_round_trip()
+  test_program_stream()
+  test_program_stream_memory()
+  test_server()
+  test_server_recovers()
+  test_generated_programs_are_well_typed()
+  test_generator_is_reproducible()
+  test_scaling_curve()
+  test_structured_errors()
+  test_runner_runs_every_case_on_every_engine()
+  test_runner_isolates_failures()
+  test_read_write_sets()
+  test_parallel_matches_sequential()
+  test_parallel_chunks_and_stops_early()
+  test_memory_report()
+  test_session_reuses_unchanged_prefix()
+  test_expression_printer()
+  test_state_printer()
+  test_specialize_folds_known_inputs()
+  test_specialize_keeps_errors_and_output()
+  test_specialize_generated_programs()
+  test_estimate_cost()
+  test_batch_scheduler_runs_shortest_first()
+  test_profiler_maps_samples_to_nodes()
+  test_profiler_marks_jit_samples()
+  test_profiler_samples_other_threads()
+  test_profiler_keeps_no_nodes()
+  test_metrics_recorded_by_runs()
+  test_metrics_count_jit_loops()
+  test_metrics_exporters()
+  test_lazy_program()
+  test_lazy_program_stays_cold()